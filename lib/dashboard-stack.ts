@@ -143,6 +143,36 @@ export class MonitoringDashboard extends Stack {
       period: Duration.minutes(1),      
     });    
 
+    // Stage durations emitted by the detector functions as CloudWatch Embedded Metric Format log lines
+    const stageLatency = (service: string, stage: string) => new cw.Metric({
+      metricName: stage,
+      namespace: "PPEVideoAnalytics",
+      dimensions: {
+        service: service,
+      },
+      statistic: 'p95',
+      period: Duration.minutes(1),
+      label: `${stage} p95`,
+    });
+
+    const ppeDetectorStages = ["download", "decode", "rekognition", "filter", "draw", "resize", "encode", "upload"]
+      .map((stage) => stageLatency("ppe-detector", stage));
+
+    const faceDetectorStages = ["download", "decode", "crop", "rekognition", "draw", "encode", "upload", "mutation"]
+      .map((stage) => stageLatency("face-detector", stage));
+
+    // Time from the start of the video of a stream to the analysis of its first frame, rolled up over the cameras
+    const firstFrameLatency = ["p50", "p95", "max"].map((statistic) => new cw.Metric({
+      metricName: "firstFrameLatency",
+      namespace: "PPEVideoAnalytics",
+      dimensions: {
+        service: "ppe-detector",
+      },
+      statistic: statistic,
+      period: Duration.minutes(5),
+      label: `firstFrameLatency ${statistic}`,
+    }));
+
     const frameParserErrorFilter = new logs.MetricFilter(this, "FrameParserErrorCount", {
       logGroup: props.frameParserLogGroup,
       filterPattern: {
@@ -245,5 +275,38 @@ export class MonitoringDashboard extends Stack {
       }),
     );
 
+    dashboard.addWidgets(
+      new cw.GraphWidget({
+        title: "PPE-Detector-Stage-Latency",
+        left: ppeDetectorStages,
+        liveData: true,
+        width: 12,
+        leftYAxis: {
+          label: "ms",
+        },
+      }),
+      new cw.GraphWidget({
+        title: "Face-Detector-Stage-Latency",
+        left: faceDetectorStages,
+        liveData: true,
+        width: 12,
+        leftYAxis: {
+          label: "ms",
+        },
+      }),
+    );
+
+    dashboard.addWidgets(
+      new cw.GraphWidget({
+        title: "First-Frame-Latency",
+        left: firstFrameLatency,
+        liveData: true,
+        width: 12,
+        leftYAxis: {
+          label: "s",
+        },
+      }),
+    );
+
   }
 }
@@ -84,12 +84,23 @@ export class FrameParserStack extends cdk.Stack {
         SUBNET_TWO: props.privateSubnets.subnets ? props.privateSubnets.subnets[1].subnetId : "",
         TASK_DEF_ARN: frameParserTaskDef.taskDefinitionArn,
         TASK_MAPPING_TABLE: consumerMappingTable.tableName,
+        CONTAINER_NAME: kvsFrameParserContainer.containerName,
+        PLACEMENT_MODE: "single",
+        TASK_CAPACITY_MBPS: "4",
+        TASK_MAX_STREAMS: "10",
+        PLACEMENT_HYSTERESIS: "0.2",
+        MERGE_MIN_AGE_MINUTES: "60",
+        WARM_POOL: "false",
+        WARM_POOL_MIN: "1",
+        WARM_POOL_MAX: "10",
       },
       timeout: cdk.Duration.seconds(10)
     });
 
     this.fargateAutoScalerFunction = parserAutoScaler;
     consumerMappingTable.grantReadWriteData(parserAutoScaler);
+    // Warm pool tasks read their stream assignment from the mapping table
+    consumerMappingTable.grantReadData(frameParserTaskDef.taskRole);
 
     parserAutoScaler.addToRolePolicy(new iam.PolicyStatement({
       effect: iam.Effect.ALLOW,
@@ -15,7 +15,6 @@ import * as appsync from "@aws-cdk/aws-appsync";
 import * as sns from "@aws-cdk/aws-sns";
 import * as sub from "@aws-cdk/aws-sns-subscriptions";
 import * as sqs from "@aws-cdk/aws-sqs";
-import * as events from "@aws-cdk/aws-lambda-event-sources";
 import * as firehose from "@aws-cdk/aws-kinesisfirehose";
 
 export interface FrameProcessorStackProps extends StackProps {
@@ -40,6 +39,12 @@ export class FrameProcessorStack extends Stack {
     super(scope, id, props);
 
     const detectHelmet: boolean = false;
+    // Number of frames delivered to the PPE processor per invocation, all processed concurrently
+    const frameBatchSize: number = 8;
+    // DetectProtectiveEquipment calls per second of the account, shared by the concurrent PPE processor containers.
+    // The Rekognition budget of the processor is per container, it holds across the function through this concurrency
+    const rekognitionPpeTps: number = 5;
+    const ppeProcessorConcurrency: number = 5;
 
     // Create S3 bucket for storing raw image frame extracted from KVS
     const rawFrameBucket = new s3.Bucket(this, "RawFrameBucket", {
@@ -123,7 +128,7 @@ export class FrameProcessorStack extends Stack {
         tracing: lambda.Tracing.ACTIVE,
         retryAttempts: 0,
         layers: [pythonDetectorLayer, props.pythonGQLLayer],
-        reservedConcurrentExecutions: 5,
+        reservedConcurrentExecutions: ppeProcessorConcurrency,
         environment: {
           GRAPHQL_API_ENDPOINT: props.targetGqlApi.graphqlUrl,
           PROCESSED_S3_BUCKET: processedFrameBucket.bucketName,
@@ -132,10 +137,12 @@ export class FrameProcessorStack extends Stack {
           TARGET_IMAGE_HEIGHT: "320",
           SNS_TOPIC_ARN: violationAlarmTopic.topicArn,
           FIREHOSE_STREAM: props.firehoseStream.ref,
-          DETECT_HELMET: detectHelmet ? "true" : "false"
+          DETECT_HELMET: detectHelmet ? "true" : "false",
+          BATCH_WORKERS: frameBatchSize.toString(),
+          BUDGET_CONTAINER_TPS: (rekognitionPpeTps / ppeProcessorConcurrency).toString(),
         },
         maxEventAge: Duration.seconds(60),
-        memorySize: 256,
+        memorySize: 512,
       }
     );
 
@@ -152,15 +159,20 @@ export class FrameProcessorStack extends Stack {
 
     ppeProcessorFunction.addToRolePolicy(new iam.PolicyStatement({
       effect: iam.Effect.ALLOW,
-      actions: ["firehose:PutRecord"],
+      actions: ["firehose:PutRecord", "firehose:PutRecordBatch"],
       resources: [props.firehoseStream.getAtt('Arn').toString()]
     }));
 
     this.frameProcessorFunction = ppeProcessorFunction;
 
-    ppeProcessorFunction.addEventSource(new events.SqsEventSource(newFrameQueue, {
-      batchSize: 1,
-    }));
+    // Report failed frames individually so that one bad frame does not make the whole batch retry
+    const newFrameEventSource = new lambda.EventSourceMapping(this, "NewFrameEventSource", {
+      target: ppeProcessorFunction,
+      eventSourceArn: newFrameQueue.queueArn,
+      batchSize: frameBatchSize,
+    });
+    (newFrameEventSource.node.defaultChild as lambda.CfnEventSourceMapping).addPropertyOverride(
+      "FunctionResponseTypes", ["ReportBatchItemFailures"]);
 
     // Grant PPE processor function to call PPE API
     const ppeDetectorPolicyStmt = new iam.PolicyStatement({
@@ -185,6 +197,8 @@ export class FrameProcessorStack extends Stack {
         MIN_CONFIDENCE_THRESHOLD: '90',
         FACE_COLLECTION_ID: 'test-collection-01',
         DETECT_HELMET: "false",
+        FACE_SEARCH_WORKERS: "4",
+        FACE_SEARCH_TPS: "5",
       }
     });
 
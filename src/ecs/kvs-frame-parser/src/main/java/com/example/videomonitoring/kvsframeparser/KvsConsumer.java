@@ -2,7 +2,11 @@ package com.example.videomonitoring.kvsframeparser;
 
 import java.io.IOException;
 import java.io.InputStream;
+import java.util.LinkedHashMap;
+import java.util.Map;
 import java.util.Optional;
+import java.util.concurrent.ExecutorService;
+import java.util.concurrent.Executors;
 
 import com.amazonaws.auth.AWSCredentialsProvider;
 import com.amazonaws.auth.DefaultAWSCredentialsProviderChain;
@@ -25,10 +29,16 @@ import software.amazon.awssdk.services.s3.S3AsyncClient;
 
 public class KvsConsumer {
     public static void main(String[] args) {
-        final String videoStreamName = System.getenv("CAMERA_NAME");
         final String bucketName = System.getenv("S3_BUCKET_NAME");
         final String region = System.getenv("AWS_DEFAULT_REGION");
         final int processFPS = Integer.valueOf(System.getenv("PROCESS_RATE_IN_FPS")).intValue();
+        final Map<String, Long> streams = readStreams(region);
+        final String[] videoStreamNames = streams.keySet().toArray(new String[0]);
+        for (Map.Entry<String, Long> stream : streams.entrySet()) {
+            if (stream.getValue() > 0) {
+                KvsS3Processor.expectFirstFrame(stream.getKey(), stream.getValue());
+            }
+        }
         
         final AWSCredentialsProvider credentialsProvider = new DefaultAWSCredentialsProviderChain();
         final AmazonKinesisVideo amazonKinesisVideo = AmazonKinesisVideoClientBuilder.standard().withRegion(region)
@@ -36,6 +46,42 @@ public class KvsConsumer {
 
         final S3AsyncClient s3Client = S3AsyncClient.builder().region(Region.of(region)).build();
 
+        // One long running worker per stream
+        final ExecutorService executor = Executors.newFixedThreadPool(videoStreamNames.length);
+        for (String videoStreamName : videoStreamNames) {
+            executor.submit(createWorker(videoStreamName, bucketName, region, processFPS, credentialsProvider,
+                    amazonKinesisVideo, s3Client));
+        }
+        executor.shutdown();
+    }
+
+    /**
+     * Streams to consume, with the epoch milliseconds their video started at, 0 when unknown.
+     * A warm pool task waits for its streams in the mapping table, other tasks read the comma separated
+     * CAMERA_NAME and CAMERA_STARTED_AT set by the autoscaler.
+     */
+    private static Map<String, Long> readStreams(String region) {
+        final String warmPoolTable = System.getenv("WARM_POOL_TABLE");
+        if (warmPoolTable != null && !warmPoolTable.isEmpty()) {
+            try {
+                return WarmPoolAssignment.await(warmPoolTable, region);
+            } catch (IOException | InterruptedException e) {
+                throw new RuntimeException("Failed to wait for a warm pool assignment", e);
+            }
+        }
+        final String[] names = System.getenv("CAMERA_NAME").split(",");
+        final String startedAt = System.getenv("CAMERA_STARTED_AT");
+        final String[] startTimes = startedAt != null && !startedAt.isEmpty() ? startedAt.split(",") : new String[0];
+        final Map<String, Long> streams = new LinkedHashMap<String, Long>();
+        for (int i = 0; i < names.length; i++) {
+            streams.put(names[i].trim(), i < startTimes.length ? Long.valueOf(startTimes[i].trim()) : 0L);
+        }
+        return streams;
+    }
+
+    private static ContinuousGetMediaWorker createWorker(String videoStreamName, String bucketName, String region,
+            int processFPS, AWSCredentialsProvider credentialsProvider, AmazonKinesisVideo amazonKinesisVideo,
+            S3AsyncClient s3Client) {
         GetMediaResponseStreamConsumerFactory consumerFactory = new GetMediaResponseStreamConsumerFactory() {
             @Override
             public GetMediaResponseStreamConsumer createConsumer() throws IOException {
@@ -53,11 +99,8 @@ public class KvsConsumer {
             }
         };
 
-        ContinuousGetMediaWorker getMediaWorker = ContinuousGetMediaWorker.create(Regions.fromName(region),
+        return ContinuousGetMediaWorker.create(Regions.fromName(region),
                 credentialsProvider, videoStreamName, new StartSelector().withStartSelectorType(StartSelectorType.NOW),
                 amazonKinesisVideo, consumerFactory);
-
-        // Long running task
-        getMediaWorker.run();
     }
 }
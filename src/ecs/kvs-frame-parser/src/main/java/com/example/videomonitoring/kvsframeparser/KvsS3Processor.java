@@ -6,6 +6,7 @@ import java.util.HashMap;
 import java.util.Map;
 import java.util.Optional;
 import java.util.concurrent.CompletableFuture;
+import java.util.concurrent.ConcurrentHashMap;
 import javax.imageio.ImageIO;
 import java.io.ByteArrayOutputStream;
 import java.awt.image.BufferedImage;
@@ -33,7 +34,10 @@ public class KvsS3Processor extends H264FrameDecoder {
     final String videoStreamName;
     final String bucketName;
     final int processFPS;
-    static long lastProcessedFrameTimeStamp = 0;
+    // Timestamp of the last processed frame of each stream, kept across GetMedia reconnections
+    static final Map<String, Long> lastProcessedFrameTimeStamps = new ConcurrentHashMap<String, Long>();
+    // Epoch milliseconds the video of a stream started at, sent with its first uploaded frame only
+    static final Map<String, Long> streamStartTimes = new ConcurrentHashMap<String, Long>();
 
     public KvsS3Processor(S3AsyncClient s3Client, String videoStreamName, String bucketName, int processFPS) {
         this.s3Client = s3Client;
@@ -42,6 +46,14 @@ public class KvsS3Processor extends H264FrameDecoder {
         this.processFPS = processFPS;
     }
 
+    /**
+     * Tag the first frame uploaded for the stream with the time its video started, so that the PPE detector
+     * can measure the latency from the first byte to the first analysed frame
+     */
+    public static void expectFirstFrame(String videoStreamName, long startedAt) {
+        streamStartTimes.put(videoStreamName, startedAt);
+    }
+
     @Override
     public void process(Frame frame, MkvTrackMetadata trackMetadata, Optional<FragmentMetadata> fragmentMetadata,
             Optional<MkvTagProcessor> tagProcessor) throws FrameProcessException {
@@ -53,8 +65,9 @@ public class KvsS3Processor extends H264FrameDecoder {
 
         // Process frame at specified fps, ignore frame that is 1000/fps ms from latest
         // processed timestamp
+        long lastProcessedFrameTimeStamp = lastProcessedFrameTimeStamps.getOrDefault(this.videoStreamName, 0L);
         if (frameTimeStamp > lastProcessedFrameTimeStamp + 1000 / processFPS) {
-            lastProcessedFrameTimeStamp = frameTimeStamp;
+            lastProcessedFrameTimeStamps.put(this.videoStreamName, frameTimeStamp);
 
             // Obtain size of the frame
             int frameWidth = trackMetadata.getPixelWidth().get().intValue();
@@ -91,6 +104,10 @@ public class KvsS3Processor extends H264FrameDecoder {
         objMetadata.put("timestamp", String.valueOf(frameTimeStamp));
         objMetadata.put("frame-height", String.valueOf(frameHeight));
         objMetadata.put("frame-width", String.valueOf(frameWidth));
+        Long streamStartedAt = streamStartTimes.remove(this.videoStreamName);
+        if (streamStartedAt != null) {
+            objMetadata.put("stream-started-at", String.valueOf(streamStartedAt));
+        }
 
         PutObjectRequest s3PutRequest = PutObjectRequest.builder().bucket(this.bucketName).key(objKey)
                 .metadata(objMetadata).build();
@@ -0,0 +1,71 @@
+package com.example.videomonitoring.kvsframeparser;
+
+import java.io.IOException;
+import java.io.InputStream;
+import java.net.HttpURLConnection;
+import java.net.URL;
+import java.util.HashMap;
+import java.util.LinkedHashMap;
+import java.util.Map;
+import java.util.Scanner;
+import java.util.regex.Matcher;
+import java.util.regex.Pattern;
+
+import software.amazon.awssdk.regions.Region;
+import software.amazon.awssdk.services.dynamodb.DynamoDbClient;
+import software.amazon.awssdk.services.dynamodb.model.AttributeValue;
+import software.amazon.awssdk.services.dynamodb.model.GetItemRequest;
+import software.amazon.awssdk.services.dynamodb.model.GetItemResponse;
+
+/**
+ * Wait, as an idle task of the warm pool, until the autoscaler assigns streams to this task in the mapping table
+ */
+public class WarmPoolAssignment {
+    private static final org.slf4j.Logger log = org.slf4j.LoggerFactory.getLogger(WarmPoolAssignment.class);
+    // Must match WORKER_KEY_PREFIX of the autoscaler
+    static final String WORKER_KEY_PREFIX = "#worker/";
+    static final long POLL_INTERVAL_MILLIS = 2000;
+    static final Pattern TASK_ARN_PATTERN = Pattern.compile("\"TaskARN\"\\s*:\\s*\"([^\"]+)\"");
+
+    /**
+     * @return the assigned streams, with the epoch milliseconds their video started at
+     */
+    public static Map<String, Long> await(String tableName, String region) throws IOException, InterruptedException {
+        final String taskArn = readTaskArn();
+        final DynamoDbClient ddbClient = DynamoDbClient.builder().region(Region.of(region)).build();
+        final Map<String, AttributeValue> key = new HashMap<String, AttributeValue>();
+        key.put("cameraId", AttributeValue.builder().s(WORKER_KEY_PREFIX.concat(taskArn)).build());
+        final GetItemRequest request = GetItemRequest.builder().tableName(tableName).key(key)
+                .consistentRead(true).build();
+        log.info("Waiting for streams as warm pool task " + taskArn);
+
+        while (true) {
+            GetItemResponse response = ddbClient.getItem(request);
+            if (response.hasItem() && response.item().containsKey("streams")) {
+                Map<String, Long> streams = new LinkedHashMap<String, Long>();
+                for (Map.Entry<String, AttributeValue> entry : response.item().get("streams").m().entrySet()) {
+                    streams.put(entry.getKey(), Long.valueOf(entry.getValue().n()));
+                }
+                ddbClient.close();
+                log.info("Assigned streams " + streams.keySet());
+                return streams;
+            }
+            Thread.sleep(POLL_INTERVAL_MILLIS);
+        }
+    }
+
+    private static String readTaskArn() throws IOException {
+        // Task metadata endpoint version 4, available to every Fargate task on platform 1.4.0
+        final URL url = new URL(System.getenv("ECS_CONTAINER_METADATA_URI_V4").concat("/task"));
+        final HttpURLConnection connection = (HttpURLConnection) url.openConnection();
+        try (InputStream body = connection.getInputStream(); Scanner scanner = new Scanner(body, "UTF-8")) {
+            Matcher matcher = TASK_ARN_PATTERN.matcher(scanner.useDelimiter("\\A").next());
+            if (!matcher.find()) {
+                throw new IOException("No task ARN in the task metadata");
+            }
+            return matcher.group(1);
+        } finally {
+            connection.disconnect();
+        }
+    }
+}
@@ -0,0 +1,205 @@
+"""
+Measure the cold start of the handler in fresh interpreters: the time to import `index`, to create the AWS clients
+and to run the first and second invocation of one alarm, with S3 and Rekognition replaced by in-process fakes and
+AppSync by a local HTTP server, all answering at once. One more run under `python -X importtime` lists the slowest
+imports.
+
+Usage: python -m benchmark.bench_cold_start [--runs 5] [--top 15] [--env FACE_TRACKER=true ...]
+"""
+import argparse
+import importlib
+import io
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import threading
+import timeit
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FUNCTION_DIR = os.path.join(os.path.dirname(__file__), '..')
+DEFAULT_FRAME = os.path.join(os.path.dirname(__file__), '../../ppe-detector-function/test/data/1480.png')
+SERVICES = ['s3', 'rekognition']
+
+# Settings the handler reads at import
+HANDLER_ENV = {
+    "FRAME_BUCKET_NAME": "processed-frames",
+    "FACE_COLLECTION_ID": "workers",
+    "MIN_CONFIDENCE_THRESHOLD": "80",
+    "DETECT_HELMET": "false",
+    "AWS_REGION": "us-east-1",
+    "AWS_DEFAULT_REGION": "us-east-1",
+    "AWS_ACCESS_KEY_ID": "AKID",
+    "AWS_SECRET_ACCESS_KEY": "secret",
+    "LOG_LEVEL": "WARNING",
+    "STAGE_METRICS": "false",
+    # No rate limit, the invocations measure the work of the handler and not the wait for Rekognition tokens
+    "FACE_SEARCH_TPS": "0",
+}
+
+IMPORTED_MARKER = '--- index imported ---'
+
+MODES = {
+    "default": {},
+    "tracingDisabled": {"POWERTOOLS_TRACE_DISABLED": "true"},
+}
+
+FACE_RESPONSE = {
+    "SearchedFaceBoundingBox": {"Width": 0.3, "Height": 0.4, "Left": 0.2, "Top": 0.2},
+    "FaceMatches": [{"Face": {"FaceId": '5fec5fae-9f92-401e-ac43-df1283ea5f12'}}]
+}
+
+
+class FakeS3:
+    def __init__(self, frame_bytes: bytes):
+        self.frame_bytes = frame_bytes
+
+    def get_object(self, Bucket, Key, **kwargs):
+        return {"Body": io.BytesIO(self.frame_bytes)}
+
+    def put_object(self, **kwargs):
+        return {"ETag": '"fake"'}
+
+
+class FakeRekognition:
+    def search_faces_by_image(self, **kwargs):
+        return json.loads(json.dumps(FACE_RESPONSE))
+
+
+class AppSyncStub(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        fields = re.findall(r'(alarm\d+):\s*newAlarm', payload["query"]) or ["newAlarm"]
+        body = json.dumps({"data": {field: {"persons": []} for field in fields}}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def alarm_event(camera_id: str) -> dict:
+    persons = [
+        {"id": idx, "missingMask": True, "boundingBox": {"width": 0.2, "height": 0.5, "left": 0.1 + 0.3 * idx, "top": 0.2}}
+        for idx in range(3)
+    ]
+    message = {
+        "cameraId": camera_id,
+        "ts": '1611744890532',
+        "s3url": f'processed-frames/{camera_id}-2021-01-27-10:54:50:532000.webp',
+        "ppeViolationCount": len(persons),
+        "ppeResult": {"personsWithoutRequiredEquipment": persons, "personsWithRequiredEquipment": []},
+    }
+    return {"Records": [{"Sns": {"Message": json.dumps(message)}}]}
+
+
+def child() -> None:
+    start = timeit.default_timer()
+    index = importlib.import_module('index')
+    import_ms = (timeit.default_timer() - start) * 1000
+    # Imports after the marker happen during the invocations, `slowest_imports` leaves them out
+    print(IMPORTED_MARKER, file=sys.stderr, flush=True)
+
+    from detectors_common import client_registry
+    start = timeit.default_timer()
+    for service in SERVICES:
+        client_registry.get_client(service)
+    clients_ms = (timeit.default_timer() - start) * 1000
+
+    import logging
+    logging.getLogger(index.logger.service).setLevel(logging.WARNING)
+    with open(DEFAULT_FRAME, 'rb') as fd:
+        client_registry.register_client('s3', FakeS3(fd.read()))
+    client_registry.register_client('rekognition', FakeRekognition())
+
+    calls_ms = []
+    # Alarms of different cameras, the second one is not answered by the face tracker
+    for camera_id in ('camera-0', 'camera-1'):
+        start = timeit.default_timer()
+        index.handler(alarm_event(camera_id), None)
+        calls_ms.append((timeit.default_timer() - start) * 1000)
+    print(json.dumps({"importMs": import_ms, "clientsMs": clients_ms,
+                      "firstCallMs": calls_ms[0], "secondCallMs": calls_ms[1]}))
+
+
+def child_env(settings: dict, endpoint: str) -> dict:
+    env = dict(os.environ, **HANDLER_ENV, GRAPHQL_API_ENDPOINT=endpoint)
+    env.pop("POWERTOOLS_TRACE_DISABLED", None)
+    env.update(settings)
+    return env
+
+
+def run_child(env: dict, importtime: bool = False) -> subprocess.CompletedProcess:
+    command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + [
+        '-m', 'benchmark.bench_cold_start', '--child']
+    return subprocess.run(command, cwd=FUNCTION_DIR, env=env, capture_output=True, text=True, check=True)
+
+
+def slowest_imports(stderr: str, top: int) -> dict:
+    """
+    Slowest packages imported along with `index`, by the largest cumulative import time of one of their modules,
+    in milliseconds. Packages importing each other count the same modules twice.
+    """
+    cumulative = {}
+    for line in stderr.split(IMPORTED_MARKER)[0].splitlines():
+        match = re.match(r'import time:\s+\d+ \|\s+(\d+) \| *(\S+)$', line)
+        if match:
+            package = match.group(2).split('.')[0]
+            cumulative[package] = max(cumulative.get(package, 0), int(match.group(1)) / 1000)
+    for own in ('index', 'main', 'benchmark', 'site', 'encodings'):
+        cumulative.pop(own, None)
+    slowest = sorted(cumulative.items(), key=lambda item: -item[1])[:top]
+    return {name: round(ms, 1) for name, ms in slowest}
+
+
+def summarise(samples: list) -> dict:
+    return {
+        name: round(statistics.median(sample[name] for sample in samples), 1)
+        for name in ("importMs", "clientsMs", "firstCallMs", "secondCallMs")
+    }
+
+
+def parse_env(text: str):
+    name, _, value = text.partition('=')
+    return name, value
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m benchmark.bench_cold_start')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--runs', type=int, default=5, help='fresh interpreters per mode')
+    parser.add_argument('--top', type=int, default=15, help='number of slowest imports listed')
+    parser.add_argument('--env', action='append', type=parse_env, default=[], metavar='NAME=VALUE',
+                        help='handler setting applied to every mode, e.g. FACE_TRACKER=true')
+    args = parser.parse_args()
+    if args.child:
+        child()
+        return
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), AppSyncStub)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    endpoint = f'http://127.0.0.1:{server.server_address[1]}/graphql'
+
+    results = {}
+    for mode, settings in MODES.items():
+        env = child_env(dict(settings, **dict(args.env)), endpoint)
+        # Warm the file system cache, the first interpreter reads every library from disk
+        run_child(env)
+        samples = [json.loads(run_child(env).stdout.splitlines()[-1]) for _ in range(args.runs)]
+        results[mode] = dict(summarise(samples), slowestImportsMs=slowest_imports(
+            run_child(env, importtime=True).stderr, args.top))
+    server.shutdown()
+    print(json.dumps({"runs": args.runs, "settings": dict(args.env), "modes": results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
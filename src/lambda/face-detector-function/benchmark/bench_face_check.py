@@ -0,0 +1,43 @@
+"""
+CPU cost of the local face check per person crop, at several crop sizes, against the SearchFacesByImage round
+trip, crop encode included, that a crop without a face avoids.
+
+Usage: python -m benchmark.bench_face_check [frame.png] [rekognition_latency_ms] [backend]
+"""
+import json
+import os
+import sys
+
+from benchmark.timing import measure
+
+import cv2
+
+from main.facedetection.face_check import create_detector
+
+DEFAULT_FRAME = os.path.join(os.path.dirname(__file__), '../../ppe-detector-function/test/data/1480.png')
+# Person crops as (width, height) in pixels of the 640x480 frame the handler crops from
+CROP_SIZES = [(64, 160), (128, 320), (256, 480)]
+
+
+def main(path: str, rekognition_ms: float, backend: str):
+    frame = cv2.resize(cv2.imread(path), dsize=(640, 480), interpolation=cv2.INTER_LINEAR)
+    detector = create_detector(backend)
+    results = []
+    for width, height in CROP_SIZES:
+        crop = frame[:height, :width]
+        timing = measure(lambda: detector.has_face(crop), number=20)
+        results.append({
+            "crop": f'{width}x{height}',
+            "faceFound": detector.has_face(crop),
+            "check": timing,
+            "cropEncode": measure(lambda: cv2.imencode('.png', crop), number=20),
+            "rekognition_call_ms": rekognition_ms,
+            "check_cost_fraction_of_call": round(timing["median_ms"] / rekognition_ms, 5),
+        })
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_FRAME,
+         float(sys.argv[2]) if len(sys.argv) > 2 else 300,
+         sys.argv[3] if len(sys.argv) > 3 else 'haar')
@@ -0,0 +1,69 @@
+"""
+Alarm latency of the face searches for 10 persons: the previous PIL crops searched in sequence against
+view crops searched on a thread pool, with and without the per container TPS limit.
+Rekognition is replaced by a stub answering after a fixed latency.
+
+Usage: python -m benchmark.bench_face_search [latency_ms]
+"""
+import json
+import sys
+import time
+
+from benchmark.timing import measure
+
+import numpy as np
+from PIL import Image
+
+from main.facedetection import detector
+from main.image_ops import cropper
+from main.utils.rate_limiter import RateLimiter
+
+PERSONS = 10
+WORKERS = [1, 4, 8]
+TPS = [0, 5, 20]
+
+
+class StubRekognition:
+    class exceptions:
+        class InvalidParameterException(Exception):
+            pass
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def search_faces_by_image(self, **kwargs):
+        time.sleep(self.latency)
+        return {"FaceMatches": [], "SearchedFaceBoundingBox": {}}
+
+
+def legacy_crop(frame, box):
+    img_height, img_width = frame.shape[:2]
+    left, top = int(box["left"] * img_width), int(box["top"] * img_height)
+    right = min(left + int(box["width"] * img_width), img_width)
+    bottom = min(top + int(box["height"] * img_height), img_height)
+    return np.asarray(Image.fromarray(frame, 'RGB').crop((left, top, right, bottom)))
+
+
+def main(latency_ms: float):
+    rekognition = StubRekognition(latency_ms / 1000)
+    frame = np.random.default_rng(0).integers(0, 255, (480, 640, 3), dtype=np.uint8)
+    boxes = [{"width": 0.1, "height": 0.5, "left": idx * 0.09, "top": 0.2} for idx in range(PERSONS)]
+
+    def legacy():
+        for box in boxes:
+            detector.submit_job.__wrapped__(legacy_crop(frame, box), 90, rekognition, 'faces')
+
+    results = {"latency_ms": latency_ms, "persons": PERSONS,
+               "sequential_pil_crops": measure(legacy, number=1, repeat=3)}
+    for tps in TPS:
+        for workers in WORKERS:
+            def concurrent():
+                crops = [cropper.crop_image.__wrapped__(frame, box)[0] for box in boxes]
+                # A fresh limiter per run, as a container would have after being idle for a second
+                detector.search_faces.__wrapped__(crops, 90, rekognition, 'faces', workers, '.png', RateLimiter(tps))
+            results[f'view_crops_workers_{workers}_tps_{tps or "unlimited"}'] = measure(concurrent, number=1, repeat=3)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main(float(sys.argv[1]) if len(sys.argv) > 1 else 250)
@@ -0,0 +1,98 @@
+"""
+Compare the per-alarm latency of the previous make_mutation, which built its signer, transport
+and client and parsed the mutation on every call, with the persistent executor, one alarm per request
+and several alarms per request. AppSync is replaced by a local HTTP server answering immediately,
+so the numbers are the client side overhead only, the saved TLS handshakes come on top of it.
+
+Usage: python -m benchmark.bench_mutation_executor
+"""
+import json
+import os
+import re
+import threading
+from collections import namedtuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmark.timing import measure
+
+from gql import gql
+from gql.client import Client
+from gql.transport.requests import RequestsHTTPTransport
+from requests_aws4auth import AWS4Auth
+
+from main.graphql import mutation_preparer
+from main.graphql.mutation_executor import MutationExecutor, HEADERS
+
+BATCH_SIZES = [2, 5, 10]
+
+Credentials = namedtuple('Credentials', ['access_key', 'secret_key', 'token'])
+
+ALARM = {
+    "cameraId": 'test-laptop-01',
+    "ts": '1611744890532',
+    "persons": [{"id": 0, "missingMask": True, "faceId": '5fec5fae-9f92-401e-ac43-df1283ea5f12'}],
+    "s3url": 'frames/test-laptop-01-2021-01-27-10:54:50:532000.webp',
+    "status": 'ACTIVE'
+}
+
+
+class AppSyncStub(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately, Nagle would hold the body until the client acks the headers
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        fields = re.findall(r'(alarm\d+):\s*newAlarm', payload["query"]) or ["newAlarm"]
+        body = json.dumps({"data": {field: {"persons": []} for field in fields}}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def legacy_make_mutation(mutation: str, variables: dict, gql_endpoint: str):
+    auth = AWS4Auth(
+        os.environ["AWS_ACCESS_KEY_ID"],
+        os.environ["AWS_SECRET_ACCESS_KEY"],
+        os.environ["AWS_REGION"],
+        'appsync',
+        session_token=os.environ["AWS_SESSION_TOKEN"],
+    )
+    transport = RequestsHTTPTransport(url=gql_endpoint, headers=HEADERS, auth=auth)
+    client = Client(transport=transport, fetch_schema_from_transport=False)
+    return client.execute(gql(mutation), variable_values=variables)
+
+
+def main():
+    for name, value in [("AWS_ACCESS_KEY_ID", "AKID"), ("AWS_SECRET_ACCESS_KEY", "secret"),
+                        ("AWS_SESSION_TOKEN", "token"), ("AWS_REGION", "us-east-1")]:
+        os.environ.setdefault(name, value)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), AppSyncStub)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    endpoint = f'http://127.0.0.1:{server.server_port}/graphql'
+
+    executor = MutationExecutor(endpoint, 'us-east-1', lambda: Credentials('AKID', 'secret', 'token'))
+    mutation = mutation_preparer.NEW_ALARM_MUTATION
+    results = {
+        "legacy_per_alarm": measure(lambda: legacy_make_mutation(mutation, ALARM, endpoint), number=20),
+        "executor_per_alarm": measure(lambda: executor.execute(mutation, ALARM), number=20),
+    }
+    for size in BATCH_SIZES:
+        alarms = [ALARM] * size
+        timing = measure(lambda: executor.execute_alarms(alarms), number=20)
+        results[f'executor_batch_{size}_per_alarm'] = {key: round(value / size, 3) for key, value in timing.items()}
+    results["saved_per_alarm_ms"] = round(
+        results["legacy_per_alarm"]["median_ms"] - results["executor_per_alarm"]["median_ms"], 3)
+    executor.close()
+    server.shutdown()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Compare the previous file based frame path of the handler (download to /tmp, convert to PNG, imread,
+draw to PNG, convert to WebP, upload from file) with the in-memory path (decode, draw, encode once).
+S3 and Rekognition are left out: the file path writes the downloaded bytes to /tmp and reads the
+converted file back, as download_file and upload_file do.
+
+Usage: python -m benchmark.bench_pipeline [frame.png]
+"""
+import json
+import os
+import sys
+import tempfile
+
+from benchmark.timing import measure
+
+import cv2
+
+from main.image_ops import codec, converter, drawer, resizer
+
+SOURCE_IMAGE_WIDTH = 640
+SOURCE_IMAGE_HEIGHT = 480
+FRAME_SIZES = [(640, 480), (1280, 720), (1920, 1080)]
+DEFAULT_FRAME = os.path.join(os.path.dirname(__file__), '../../ppe-detector-function/test/data/1480.png')
+
+FACE_RES = [{
+    "SearchedFaceBoundingBox": {"Width": 0.3, "Height": 0.4, "Left": 0.2, "Top": 0.2},
+    "FaceMatches": [{"Face": {"FaceId": '5fec5fae-9f92-401e-ac43-df1283ea5f12'}}]
+}]
+SIZE_LIST = [(240, 320)]
+
+
+def file_path(frame_bytes: bytes, workdir: str) -> bytes:
+    downloaded = os.path.join(workdir, 'frame.webp')
+    with open(downloaded, 'wb') as fd:
+        fd.write(frame_bytes)
+    converted = converter.convert_frame.__wrapped__(downloaded, '.png')
+    frame = cv2.imread(converted)
+    resized = resizer.resize_image.__wrapped__(frame, SOURCE_IMAGE_WIDTH, SOURCE_IMAGE_HEIGHT)
+    drawn = os.path.join(workdir, 'drawn.png')
+    drawer.draw_bounding_box.__wrapped__(FACE_RES, SIZE_LIST, resized, drawn)
+    output = converter.convert_frame.__wrapped__(drawn, '.webp')
+    with open(output, 'rb') as fd:
+        return fd.read()
+
+
+def memory_path(frame_bytes: bytes) -> bytes:
+    frame = codec.decode_frame.__wrapped__(frame_bytes)
+    resized = resizer.resize_image.__wrapped__(frame, SOURCE_IMAGE_WIDTH, SOURCE_IMAGE_HEIGHT)
+    drawer.draw_bounding_box.__wrapped__(FACE_RES, SIZE_LIST, resized)
+    return codec.encode_frame.__wrapped__(resized)
+
+
+def main(path: str):
+    source = cv2.imread(path)
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for width, height in FRAME_SIZES:
+            frame_bytes = codec.encode_frame(cv2.resize(source, dsize=(width, height)))
+            results.append({
+                "size": f'{width}x{height}',
+                "file_path": measure(lambda: file_path(frame_bytes, workdir), number=5, repeat=5),
+                "memory_path": measure(lambda: memory_path(frame_bytes), number=5, repeat=5),
+                "file_path_output_bytes": len(file_path(frame_bytes, workdir)),
+                "memory_path_output_bytes": len(memory_path(frame_bytes)),
+            })
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_FRAME)
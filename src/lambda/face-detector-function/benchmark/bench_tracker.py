@@ -0,0 +1,81 @@
+"""
+Simulate a busy site and count the face searches the tracker saves: cameras raising an alarm every few
+seconds for workers who mostly stand still, drift around and now and then leave or arrive.
+
+Usage: python -m benchmark.bench_tracker [minutes]
+"""
+import json
+import sys
+
+from benchmark.timing import measure
+
+import numpy as np
+
+from main.facedetection.tracker import FaceTracker
+
+CAMERAS = 8
+ALARM_INTERVAL_SECONDS = 2.0
+WORKERS_PER_CAMERA = (2, 8)
+DRIFT = 0.005
+WALK_PROBABILITY = 0.02
+TURNOVER_PROBABILITY = 0.01
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def new_worker(rng):
+    return [rng.uniform(0.0, 0.85), rng.uniform(0.0, 0.6)]
+
+
+def simulate(minutes: float, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    clock = Clock()
+    tracker = FaceTracker(clock=clock)
+    workers = {f'camera-{idx}': [new_worker(rng) for _ in range(rng.integers(*WORKERS_PER_CAMERA))]
+               for idx in range(CAMERAS)}
+    alarms = 0
+    persons = 0
+    for step in range(int(minutes * 60 / ALARM_INTERVAL_SECONDS)):
+        clock.now = step * ALARM_INTERVAL_SECONDS
+        for camera_name, positions in workers.items():
+            for idx, position in enumerate(positions):
+                if rng.random() < TURNOVER_PROBABILITY:
+                    positions[idx] = new_worker(rng)
+                elif rng.random() < WALK_PROBABILITY:
+                    position[0] = float(np.clip(position[0] + rng.uniform(-0.2, 0.2), 0.0, 0.85))
+                else:
+                    position[0] = float(np.clip(position[0] + rng.normal(0, DRIFT), 0.0, 0.85))
+                    position[1] = float(np.clip(position[1] + rng.normal(0, DRIFT), 0.0, 0.6))
+            boxes = [{"left": left, "top": top, "width": 0.12, "height": 0.35} for left, top in positions]
+            for (track_id, cached), box in zip(tracker.associate(camera_name, boxes), boxes):
+                if cached is None:
+                    tracker.record(camera_name, track_id, box, {"FaceMatches": []})
+            alarms += 1
+            persons += len(boxes)
+    return alarms, persons, tracker
+
+
+def main(minutes: float):
+    alarms, persons, tracker = simulate(minutes)
+    stats = tracker.stats()
+    clock = Clock()
+    busy = FaceTracker(clock=clock)
+    boxes = [{"left": idx * 0.1, "top": 0.2, "width": 0.08, "height": 0.35} for idx in range(10)]
+    print(json.dumps({
+        "alarms": alarms,
+        "searches_without_tracker": persons,
+        "searches_with_tracker": stats["faceTrackerSearches"],
+        "reduction": round(persons / max(stats["faceTrackerSearches"], 1), 1),
+        "tracker": stats,
+        "associate_10_persons": measure(lambda: busy.associate('camera-1', boxes), number=100),
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main(float(sys.argv[1]) if len(sys.argv) > 1 else 10)
@@ -0,0 +1,17 @@
+import os
+import timeit
+from typing import Callable, Dict
+
+# Benchmarks run the Lambda modules outside of Lambda, without X-Ray and per-stage log lines
+os.environ.setdefault("POWERTOOLS_TRACE_DISABLED", "1")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), '../test/data')
+
+
+def measure(fn: Callable[[], object], number: int = 10, repeat: int = 5) -> Dict[str, float]:
+    """
+    Time a callable, returning the best and median duration of one call in milliseconds
+    """
+    runs = sorted(t / number * 1000 for t in timeit.repeat(fn, number=number, repeat=repeat))
+    return {"best_ms": round(runs[0], 3), "median_ms": round(runs[len(runs) // 2], 3)}
@@ -1,16 +1,15 @@
 import json
 import os
-import cv2
 from typing import Any, Dict
-import botocore
 
 from aws_lambda_powertools.logging import Logger
-from aws_lambda_powertools.tracing import Tracer
 from aws_lambda_powertools.utilities.typing import LambdaContext
 
 from main.utils import frame_downloader, frame_uploader
-from main.image_ops import converter, resizer, cropper, drawer
-from main.facedetection import detector
+from detectors_common import client_registry, stage_metrics, tracing
+from main.utils.rate_limiter import RateLimiter
+from main.image_ops import codec, resizer, cropper, drawer
+from main.facedetection import detector, face_check, tracker
 from main.graphql import mutation_preparer, mutation_executor
 
 FRAME_BUCKET_NAME = os.environ["FRAME_BUCKET_NAME"]
@@ -18,6 +17,25 @@ GRAPHQL_API_ENDPOINT = os.environ["GRAPHQL_API_ENDPOINT"]
 FACE_COLLECTION_ID = os.environ["FACE_COLLECTION_ID"]
 MIN_CONFIDENCE_THRESHOLD = int(os.environ["MIN_CONFIDENCE_THRESHOLD"])
 DETECT_HELMET = os.environ["DETECT_HELMET"]
+# Number of persons of one alarm whose face is searched concurrently, 1 searches them in sequence
+FACE_SEARCH_WORKERS = int(os.environ.get("FACE_SEARCH_WORKERS", "4"))
+# SearchFacesByImage calls per second allowed to one container, 0 disables the limit
+FACE_SEARCH_TPS = float(os.environ.get("FACE_SEARCH_TPS", "5"))
+# Format the cropped persons are sent to Rekognition in, '.png' or '.jpg'
+FACE_CROP_FORMAT = os.environ.get("FACE_CROP_FORMAT", ".png")
+# Reuse the face found for a person tracked across the alarms of a camera instead of searching it again
+FACE_TRACKER = os.environ.get("FACE_TRACKER", "false")
+FACE_TRACKER_MAX_AGE_SECONDS = float(os.environ.get("FACE_TRACKER_MAX_AGE_SECONDS", "60"))
+FACE_TRACKER_MAX_SHIFT = float(os.environ.get("FACE_TRACKER_MAX_SHIFT", "0.15"))
+FACE_TRACKER_MAX_CAMERAS = int(os.environ.get("FACE_TRACKER_MAX_CAMERAS", "64"))
+# Skip the face search of crops in which a local face detector finds no face
+FACE_CHECK = os.environ.get("FACE_CHECK", "false")
+FACE_CHECK_BACKEND = os.environ.get("FACE_CHECK_BACKEND", "haar")
+FACE_CHECK_MIN_NEIGHBORS = int(os.environ.get("FACE_CHECK_MIN_NEIGHBORS", "3"))
+FACE_CHECK_MIN_SIZE = int(os.environ.get("FACE_CHECK_MIN_SIZE", "20"))
+# Stage timings, byte and person counts of an invocation are emitted as one CloudWatch EMF log line
+STAGE_METRICS = os.environ.get("STAGE_METRICS", "true")
+METRICS_NAMESPACE = os.environ.get("METRICS_NAMESPACE", stage_metrics.NAMESPACE)
 
 SOURCE_IMAGE_WIDTH = 640
 SOURCE_IMAGE_HEIGHT = 480
@@ -25,37 +43,114 @@ SOURCE_IMAGE_HEIGHT = 480
 rek_client = None
 s3_client = None
 
+# Seconds an alarm may wait on one AWS request, retries included, well within the function timeout
+AWS_CALL_BUDGET_SECONDS = 30
+# (connect timeout, read timeout) in seconds per service
+AWS_SERVICE_TIMEOUTS = {
+    'rekognition': (2, 10),
+    's3': (2, 5),
+}
+
+client_registry.configure(
+    service='face-detector', call_budget_seconds=AWS_CALL_BUDGET_SECONDS, service_timeouts=AWS_SERVICE_TIMEOUTS,
+    default_timeouts=(2, 10), max_pool_connections=max(10, FACE_SEARCH_WORKERS))
+face_search_limiter = RateLimiter(FACE_SEARCH_TPS)
+stage_metrics.configure(service='face-detector', namespace=METRICS_NAMESPACE, enabled=STAGE_METRICS == "true")
+
+face_tracker = None
+if FACE_TRACKER == "true":
+    face_tracker = tracker.FaceTracker(
+        max_age=FACE_TRACKER_MAX_AGE_SECONDS, max_shift=FACE_TRACKER_MAX_SHIFT, max_cameras=FACE_TRACKER_MAX_CAMERAS)
+
+crop_face_check = None
+if FACE_CHECK == "true":
+    crop_face_check = face_check.FaceCheck(face_check.create_detector(
+        FACE_CHECK_BACKEND, FACE_CHECK_MIN_NEIGHBORS, FACE_CHECK_MIN_SIZE))
+
 logger = Logger(service='face-detector', level='INFO')
-tracer = Tracer(service='face-detector')
+tracer = tracing.get_tracer('face-detector')
+
+
+def prepare_alarm(msg: Dict[str, Any]) -> dict:
+    """
+    Search the faces of the persons of an alarm, upload its annotated frame and prepare its newAlarm mutation
+    :param `msg` alarm published by the PPE detector
+    :returns: variables of the newAlarm mutation
+    """
+    frame_key = msg["s3url"].split('/')[1]
+    # The frame stays in memory from download to upload, decoded once and encoded once
+    frame_bytes = frame_downloader.download_frame_bytes(FRAME_BUCKET_NAME, frame_key, s3_client)
+    src_frame = codec.decode_frame(frame_bytes)
+    resized_src_frame = resizer.resize_image(src_frame, SOURCE_IMAGE_WIDTH, SOURCE_IMAGE_HEIGHT)
+    persons = msg["ppeResult"]["personsWithoutRequiredEquipment"]
+    boxes = [ppl["boundingBox"] for ppl in persons]
+    stage_metrics.count('persons', len(boxes))
+    if face_tracker:
+        matches = face_tracker.associate(msg["cameraId"], boxes)
+    else:
+        matches = [(None, None)] * len(boxes)
+    face_results = [face_res for _, face_res in matches]
+    sub_frame_size_list = []
+    search_idx = []
+    crops = []
+    for idx, box in enumerate(boxes):
+        sub_image, sub_frame_size = cropper.crop_image(resized_src_frame, box)
+        sub_frame_size_list.append(sub_frame_size)
+        if face_results[idx] is None:
+            search_idx.append(idx)
+            crops.append(sub_image)
+    # Crops are views of the frame, they are all searched before anything is drawn on it
+    searched = detector.search_faces(
+        crops, MIN_CONFIDENCE_THRESHOLD, rek_client, FACE_COLLECTION_ID,
+        FACE_SEARCH_WORKERS, FACE_CROP_FORMAT, face_search_limiter, crop_face_check)
+    faceless = []
+    for idx, face_res in zip(search_idx, searched):
+        if face_res is detector.NO_FACE:
+            # Not tracked, the person may turn to the camera by the next alarm
+            faceless.append(idx)
+            face_res = None
+        face_results[idx] = face_res
+        if face_tracker:
+            face_tracker.record(msg["cameraId"], matches[idx][0], boxes[idx], face_res)
+    # Keep the sizes and person indexes aligned with the persons whose face was found
+    found = [idx for idx, res in enumerate(face_results) if res is not None]
+    resp_list = [face_results[idx] for idx in found]
+    sub_frame_size_list = [sub_frame_size_list[idx] for idx in found]
+    violation_list = drawer.draw_bounding_box(resp_list, sub_frame_size_list, resized_src_frame)
+    output_frame_bytes = codec.encode_frame(resized_src_frame)
+    frame_uploader.upload_frame_bytes(FRAME_BUCKET_NAME, frame_key, output_frame_bytes, s3_client)
+    _, variables = mutation_preparer.prepare_mutation(msg, resp_list, True, DETECT_HELMET, faceless, found)
+    return variables
+
 
 @tracer.capture_lambda_handler
 def handler(event: Dict[str, Any], context: LambdaContext):
+    # Alarms of all records are sent to AppSync together once the frames are processed
+    alarm_variables = []
     for record in event['Records']:
         message = record["Sns"]["Message"]
         print(message)
         msg = json.loads(message)
         if msg["ppeViolationCount"] != 0:
-            old_frame_key = msg["s3url"].split('/')[1]
-            old_frame_filepath, s3_client = frame_downloader.download_frame(FRAME_BUCKET_NAME, old_frame_key, None)
-            converted_frame_filepath = converter.convert_frame(old_frame_filepath, '.png')
-            converted_src_frame = cv2.imread(converted_frame_filepath)
-            resized_src_frame = resizer.resize_image(converted_src_frame, SOURCE_IMAGE_WIDTH, SOURCE_IMAGE_HEIGHT)
-            resp_list = []
-            sub_frame_size_list = []
-            for ppl in msg["ppeResult"]["personsWithoutRequiredEquipment"]:
-                sub_image, sub_frame_size = cropper.crop_image(resized_src_frame, ppl["boundingBox"])
-                sub_frame_size_list.append(sub_frame_size)
-                face_detection_res = detector.submit_job(sub_image, MIN_CONFIDENCE_THRESHOLD, rek_client, FACE_COLLECTION_ID)
-                if face_detection_res == None:
-                    continue
-                else:   
-                    resp_list.append(face_detection_res)
-            drawn_frame_path = '/tmp/' + old_frame_key.split('.')[0] + '.png'
-            violation_list = drawer.draw_bounding_box(resp_list, sub_frame_size_list, resized_src_frame, drawn_frame_path)
-            output_frame_filepath = converter.convert_frame(drawn_frame_path, '.webp')
-            frame_uploader.upload_frame(FRAME_BUCKET_NAME, old_frame_key, output_frame_filepath, s3_client)
-            mutation, variables = mutation_preparer.prepare_mutation(msg, resp_list, True, DETECT_HELMET)
-            mutation_executor.make_mutation(mutation, variables, GRAPHQL_API_ENDPOINT)
+            # A failing record does not hold back the alarms of the others
+            try:
+                alarm_variables.append(prepare_alarm(msg))
+            except Exception:
+                logger.exception(f'Failed processing alarm of camera {msg.get("cameraId")} at {msg.get("ts")}')
         else:
             logger.info("No PPE violation in alert, exiting...")
+    if len(alarm_variables) == 1:
+        mutation_executor.make_mutation(mutation_preparer.NEW_ALARM_MUTATION, alarm_variables[0], GRAPHQL_API_ENDPOINT)
+    elif alarm_variables:
+        mutation_executor.make_alarm_mutations(alarm_variables, GRAPHQL_API_ENDPOINT)
+    # Counters of the container are sent along the stage metrics, as properties of the same log line
+    stats = client_registry.connection_stats()
+    if face_tracker:
+        stats.update(face_tracker.stats())
+    if crop_face_check:
+        stats.update(crop_face_check.stats())
+    if STAGE_METRICS == "true":
+        stage_metrics.flush(stats)
+    else:
+        logger.info(stats)
         
\ No newline at end of file
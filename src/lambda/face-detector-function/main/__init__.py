@@ -0,0 +1,9 @@
+import os
+import sys
+
+# Modules shared by the detector functions ship in the detectors-common layer, found under /opt/python on Lambda.
+# Elsewhere, in tests, benchmarks and the backfill, they are imported from the layer sources of the repository.
+try:
+    import detectors_common  # noqa: F401
+except ImportError:
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'layers', 'detectors-common'))
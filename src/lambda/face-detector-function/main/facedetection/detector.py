@@ -1,36 +1,83 @@
 # Submit detection job to Rekognition Face Detection
-import timeit
-import boto3
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
 
 from aws_lambda_powertools.logging import Logger
-from aws_lambda_powertools.tracing import Tracer
 import cv2
 from numpy import ndarray
 
+from main.facedetection.face_check import FaceCheck
+from detectors_common import client_registry, stage_metrics, tracing
+from main.utils.rate_limiter import RateLimiter
+
 
 logger = Logger(service='face-detector', child=True)
-tracer = Tracer(service='face-detector')
+tracer = tracing.get_tracer('face-detector')
+
+# Result of a crop in which the local face check finds no face, not sent to Rekognition
+NO_FACE = {"FaceVisible": False}
 
 @tracer.capture_method(capture_response=False)
-def submit_job(img: ndarray, min_confidence: int, rek_client: None, face_collection) -> dict:
-    start_time = timeit.default_timer()
-    img_str = cv2.imencode('.png', img)[1].tostring()
+def submit_job(img: ndarray, min_confidence: int, rek_client: None, face_collection,
+               image_format: str = '.png', rate_limiter: Optional[RateLimiter] = None,
+               face_check: Optional[FaceCheck] = None) -> dict:
+    if face_check and not face_check.has_face(img):
+        return NO_FACE
+    with stage_metrics.stage('cropEncode'):
+        img_str = cv2.imencode(image_format, img)[1].tobytes()
     if not rek_client:
-        rek_client = boto3.client("rekognition")
+        rek_client = client_registry.get_client("rekognition")
+    if rate_limiter:
+        with stage_metrics.stage('rateLimitWait'):
+            rate_limiter.acquire()
 
     try:
-        face_res = rek_client.search_faces_by_image(
-            CollectionId=face_collection,
-            Image={
-                'Bytes': img_str
-            },
-            MaxFaces=1,
-            FaceMatchThreshold=float(min_confidence/100)
-        )
+        with stage_metrics.stage('rekognition'):
+            face_res = rek_client.search_faces_by_image(
+                CollectionId=face_collection,
+                Image={
+                    'Bytes': img_str
+                },
+                MaxFaces=1,
+                FaceMatchThreshold=float(min_confidence/100)
+            )
     except rek_client.exceptions.InvalidParameterException as e:
         logger.warn("No faces detected in image")
         return None
-    logger.info(
-        f'Rekognition face search completed after: {timeit.default_timer() - start_time}')
-        
+
     return face_res
+
+
+@tracer.capture_method(capture_response=False)
+def search_faces(crops: List[ndarray], min_confidence: int, rek_client: None, face_collection,
+                 max_workers: int = 1, image_format: str = '.png',
+                 rate_limiter: Optional[RateLimiter] = None,
+                 face_check: Optional[FaceCheck] = None) -> List[Optional[dict]]:
+    """
+    Search the face of every cropped person, encoding the crops and calling Rekognition on a bounded thread pool
+    :param `crops` cropped persons, in the order of the alarm
+    :param `max_workers` maximum number of searches in flight, 1 searches the crops in sequence
+    :param `rate_limiter` optional limiter keeping the calls under the Rekognition TPS quota
+    :param `face_check` optional local check, crops without a face it can see are not searched
+    :returns: face search response of each crop in the order of `crops`, `NO_FACE` when the face check finds no
+        face in the crop, None when Rekognition found no face or the search failed
+    """
+    if not rek_client:
+        rek_client = client_registry.get_client("rekognition")
+
+    def search(crop: ndarray) -> Optional[dict]:
+        try:
+            return submit_job(crop, min_confidence, rek_client, face_collection, image_format, rate_limiter, face_check)
+        except Exception:
+            logger.exception("Error searching face in Rekognition collection")
+            return None
+
+    if max_workers <= 1 or len(crops) <= 1:
+        results = [search(crop) for crop in crops]
+    else:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(crops))) as executor:
+            results = list(executor.map(search, crops))
+
+    stage_metrics.count('faceSearches', len(crops))
+    stage_metrics.count('facesFound', sum(1 for result in results if result is not None and result is not NO_FACE))
+    return results
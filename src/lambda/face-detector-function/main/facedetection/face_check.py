@@ -0,0 +1,136 @@
+from abc import ABC, abstractmethod
+from typing import Dict
+import os
+import threading
+import cv2
+import numpy as np
+
+from aws_lambda_powertools.logging import Logger
+
+from detectors_common import stage_metrics
+
+
+logger = Logger(service='face-detector', child=True)
+
+# Crops are downscaled to this width at most, a face keeps enough pixels for the detectors in a person crop
+MAX_CROP_WIDTH = 256
+
+
+class LocalFaceDetector(ABC):
+    """
+    Detector telling whether a cropped person shows a face, run on the crop before the Rekognition face search
+    :param `min_neighbors` overlapping detections needed to keep a face, lower values find more faces
+    :param `min_size` smallest face side in pixels, in the crop downscaled to `MAX_CROP_WIDTH`
+    """
+
+    def __init__(self, min_neighbors: int = 3, min_size: int = 20):
+        self.min_neighbors = min_neighbors
+        self.min_size = min_size
+
+    @staticmethod
+    def prepare(crop: np.ndarray) -> np.ndarray:
+        """
+        Grayscale crop, downscaled to `MAX_CROP_WIDTH` at most
+        :param `crop`: BGR person crop in numpy array
+        """
+        if crop.shape[1] > MAX_CROP_WIDTH:
+            height = max(1, round(crop.shape[0] * MAX_CROP_WIDTH / crop.shape[1]))
+            crop = cv2.resize(crop, (MAX_CROP_WIDTH, height), interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+
+    @abstractmethod
+    def has_face(self, crop: np.ndarray) -> bool:
+        """
+        :param `crop`: BGR person crop in numpy array
+        :returns: whether the crop shows a face
+        """
+
+
+class HaarFaceDetector(LocalFaceDetector):
+    """
+    Haar cascades shipped with opencv-python, frontal faces then profiles (turned left and, on the mirrored
+    crop, right)
+    """
+
+    CASCADES = ('haarcascade_frontalface_default.xml', 'haarcascade_profileface.xml')
+
+    def __init__(self, min_neighbors: int = 3, min_size: int = 20):
+        super().__init__(min_neighbors, min_size)
+        # Cascades are loaded once per face search worker thread
+        self._local = threading.local()
+
+    @staticmethod
+    def load(name: str):
+        """
+        :param `name`: file name of the cascade in the data of opencv-python
+        :raises FileNotFoundError: when opencv-python ships no such cascade or fails to load it
+        """
+        data = getattr(getattr(cv2, 'data', None), 'haarcascades', None)
+        if data is None:
+            raise FileNotFoundError(f'Haar cascade {name}: this OpenCV build ships no cascade data (cv2.data)')
+        path = os.path.join(data, name)
+        cascade = cv2.CascadeClassifier(path) if os.path.isfile(path) else None
+        if cascade is None or cascade.empty():
+            raise FileNotFoundError(f'Haar cascade {name} could not be loaded from {path}')
+        return cascade
+
+    @property
+    def cascades(self):
+        if not hasattr(self._local, 'cascades'):
+            self._local.cascades = [self.load(name) for name in self.CASCADES]
+        return self._local.cascades
+
+    def _detect(self, cascade, gray: np.ndarray) -> bool:
+        faces = cascade.detectMultiScale(
+            gray, scaleFactor=1.1, minNeighbors=self.min_neighbors, minSize=(self.min_size, self.min_size))
+        return len(faces) > 0
+
+    def has_face(self, crop: np.ndarray) -> bool:
+        gray = self.prepare(crop)
+        frontal, profile = self.cascades
+        return self._detect(frontal, gray) or self._detect(profile, gray) or self._detect(profile, cv2.flip(gray, 1))
+
+
+# Local face detectors by the name of FACE_CHECK_BACKEND, all taking the min_neighbors and min_size arguments
+BACKENDS = {
+    "haar": HaarFaceDetector,
+}
+
+
+def create_detector(backend: str, min_neighbors: int = 3, min_size: int = 20) -> LocalFaceDetector:
+    if backend not in BACKENDS:
+        raise ValueError(f'Unknown face detector {backend}, expected one of {", ".join(sorted(BACKENDS))}')
+    return BACKENDS[backend](min_neighbors, min_size)
+
+
+class FaceCheck:
+    """
+    Skip the face search of crops in which the local detector finds no face
+    :param `detector` local face detector, one of `BACKENDS`
+    """
+
+    def __init__(self, detector: LocalFaceDetector):
+        self.detector = detector
+        self.skipped = 0
+        self.passed = 0
+        self._lock = threading.Lock()
+
+    def has_face(self, crop: np.ndarray) -> bool:
+        """
+        :param `crop`: BGR person crop in numpy array
+        :returns: whether the crop has to be searched
+        """
+        with stage_metrics.stage('faceCheck'):
+            found = self.detector.has_face(crop)
+        with self._lock:
+            if found:
+                self.passed += 1
+            else:
+                self.skipped += 1
+        return found
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "faceCheckSkippedSearches": self.skipped,
+            "faceCheckPassedCrops": self.passed
+        }
@@ -0,0 +1,175 @@
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+import itertools
+import threading
+import time
+
+import numpy as np
+
+from aws_lambda_powertools.logging import Logger
+
+
+logger = Logger(service='face-detector', child=True)
+
+
+def box_array(boxes: List[Dict[str, float]]) -> np.ndarray:
+    """
+    Stack bounding boxes relative to the frame size as (left, top, width, height) rows
+    """
+    return np.array([(box["left"], box["top"], box["width"], box["height"]) for box in boxes],
+                    dtype=np.float64).reshape(len(boxes), 4)
+
+
+def iou_matrix(boxes: np.ndarray, others: np.ndarray) -> np.ndarray:
+    """
+    Intersection over union of every box of `boxes` with every box of `others`
+    """
+    left = np.maximum(boxes[:, None, 0], others[None, :, 0])
+    top = np.maximum(boxes[:, None, 1], others[None, :, 1])
+    right = np.minimum(boxes[:, None, 0] + boxes[:, None, 2], others[None, :, 0] + others[None, :, 2])
+    bottom = np.minimum(boxes[:, None, 1] + boxes[:, None, 3], others[None, :, 1] + others[None, :, 3])
+    intersection = np.clip(right - left, 0, None) * np.clip(bottom - top, 0, None)
+    union = (boxes[:, None, 2] * boxes[:, None, 3]) + (others[None, :, 2] * others[None, :, 3]) - intersection
+    return np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
+
+
+def centroid_distance(boxes: np.ndarray, others: np.ndarray) -> np.ndarray:
+    """
+    Distance between the centres of every box of `boxes` and every box of `others`, in frame units
+    """
+    centres = boxes[:, :2] + boxes[:, 2:] / 2
+    other_centres = others[:, :2] + others[:, 2:] / 2
+    return np.linalg.norm(centres[:, None, :] - other_centres[None, :, :], axis=2)
+
+
+class Track:
+    """
+    One person followed across the alarms of a camera
+    """
+
+    __slots__ = ('box', 'last_seen', 'face_res', 'searched_box', 'searched_at')
+
+    def __init__(self, box: np.ndarray, last_seen: float):
+        self.box = box
+        self.last_seen = last_seen
+        self.face_res = None
+        self.searched_box = None
+        self.searched_at = float('-inf')
+
+
+class FaceTracker:
+    """
+    Associate the persons of successive alarms of a camera and reuse the face search result of their track
+    :param `iou_threshold` smallest overlap for a box to continue a track
+    :param `max_centroid_distance` boxes overlapping less still continue the nearest track whose centre is this close
+    :param `max_age` seconds after which the face of a track is searched again
+    :param `max_shift` distance the centre of a box may move from where its face was searched before it is searched again
+    :param `track_ttl` seconds after which a track not seen in any alarm is dropped
+    :param `max_tracks` number of tracks kept per camera, the least recently seen track is evicted first
+    :param `max_cameras` number of cameras kept, the least recently seen camera is evicted first
+    """
+
+    def __init__(self, iou_threshold: float = 0.3, max_centroid_distance: float = 0.05, max_age: float = 60.0,
+                 max_shift: float = 0.15, track_ttl: float = 30.0, max_tracks: int = 32, max_cameras: int = 64,
+                 clock: Callable[[], float] = time.monotonic):
+        self.iou_threshold = iou_threshold
+        self.max_centroid_distance = max_centroid_distance
+        self.max_age = max_age
+        self.max_shift = max_shift
+        self.track_ttl = track_ttl
+        self.max_tracks = max_tracks
+        self.max_cameras = max_cameras
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._cameras: "OrderedDict[str, OrderedDict[int, Track]]" = OrderedDict()
+        self._track_ids = itertools.count()
+        self._lock = threading.Lock()
+
+    def associate(self, camera_name: str, boxes: List[Dict[str, float]]) -> List[Tuple[int, Optional[dict]]]:
+        """
+        Match the boxes of an alarm with the tracks of the camera
+        :param `boxes` bounding boxes of the persons without required equipment, relative to the frame size
+        :returns: track id of each box with the face search result to reuse, None when the face has to be searched
+        """
+        now = self.clock()
+        current = box_array(boxes)
+        with self._lock:
+            tracks = self._camera_tracks(camera_name, now)
+            assigned = self._match(tracks, current)
+
+            matches = []
+            for idx, track_id in enumerate(assigned):
+                if track_id is None:
+                    track_id = next(self._track_ids)
+                    tracks[track_id] = Track(current[idx], now)
+                track = tracks[track_id]
+                track.box = current[idx]
+                track.last_seen = now
+                tracks.move_to_end(track_id)
+
+                if track.face_res is not None and now - track.searched_at <= self.max_age \
+                        and centroid_distance(track.searched_box[None], current[idx][None])[0, 0] <= self.max_shift:
+                    self.hits += 1
+                    matches.append((track_id, track.face_res))
+                else:
+                    self.misses += 1
+                    matches.append((track_id, None))
+
+            while len(tracks) > self.max_tracks:
+                tracks.popitem(last=False)
+        return matches
+
+    def record(self, camera_name: str, track_id: int, box: Dict[str, float], face_res: Optional[dict]) -> None:
+        """
+        Remember the face found for a track, persons without a face are searched again in the next alarm
+        """
+        if face_res is None:
+            return
+        with self._lock:
+            track = self._cameras.get(camera_name, {}).get(track_id)
+            if track is not None:
+                track.face_res = face_res
+                track.searched_box = box_array([box])[0]
+                track.searched_at = self.clock()
+
+    def _camera_tracks(self, camera_name: str, now: float) -> "OrderedDict[int, Track]":
+        tracks = self._cameras.get(camera_name)
+        if tracks is None:
+            tracks = OrderedDict()
+            self._cameras[camera_name] = tracks
+        self._cameras.move_to_end(camera_name)
+        while len(self._cameras) > self.max_cameras:
+            self._cameras.popitem(last=False)
+        for track_id in [track_id for track_id, track in tracks.items() if now - track.last_seen > self.track_ttl]:
+            del tracks[track_id]
+        return tracks
+
+    def _match(self, tracks: "OrderedDict[int, Track]", current: np.ndarray) -> List[Optional[int]]:
+        # Greedy association, best overlapping pairs first, then the closest centres
+        assigned: List[Optional[int]] = [None] * len(current)
+        if not tracks or not len(current):
+            return assigned
+        track_ids = list(tracks)
+        previous = np.stack([tracks[track_id].box for track_id in track_ids])
+        iou = iou_matrix(previous, current)
+        distance = centroid_distance(previous, current)
+        candidates = np.argwhere((iou >= self.iou_threshold) | (distance <= self.max_centroid_distance))
+        order = sorted(candidates.tolist(), key=lambda pair: (-iou[pair[0], pair[1]], distance[pair[0], pair[1]]))
+        used_tracks = set()
+        for track_idx, box_idx in order:
+            if track_idx in used_tracks or assigned[box_idx] is not None:
+                continue
+            assigned[box_idx] = track_ids[track_idx]
+            used_tracks.add(track_idx)
+        return assigned
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "faceTrackerReusedSearches": self.hits,
+            "faceTrackerSearches": self.misses,
+            "faceTrackerHitRate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "faceTrackerTracks": sum(len(tracks) for tracks in self._cameras.values()),
+            "faceTrackerCameras": len(self._cameras)
+        }
@@ -1,63 +1,164 @@
 import os
-import json
-import timeit
-from requests_aws4auth import AWS4Auth
-from boto3 import Session
-from gql import gql
-from gql.client import Client
-from gql.transport.requests import RequestsHTTPTransport
+import threading
+from typing import Any, Callable, Dict, List, Optional
 
 from aws_lambda_powertools.logging import Logger
-from aws_lambda_powertools.tracing import Tracer
+
+from main.graphql import mutation_preparer
+from detectors_common import stage_metrics, tracing
 
 
 logger = Logger(service='face-detector', child=True)
-tracer = Tracer(service='face-detector')
+tracer = tracing.get_tracer('face-detector')
+
+HEADERS = {
+    'Accept': 'application/json',
+    'Content-Type': 'application/json'
+}
+# Statuses of AppSync a mutation request is sent again on
+RETRY_STATUSES = (500, 502, 503, 504)
+
+
+class MutationExecutor:
+    """
+    Run AppSync mutations over one signed HTTP session kept alive across invocations.
+    gql, requests and the SigV4 signer are imported by the first executor, not when the function loads.
+    :param `gql_endpoint` URL of the AppSync GraphQL API
+    :param `region` region of the API, the AWS_REGION of the function when None
+    :param `credentials_provider` callable returning botocore credentials, the default session credentials when None
+    :param `timeout` seconds to wait for AppSync
+    :param `retries` number of times a request failing with a 5xx status or a connection error is sent again
+    """
+
+    def __init__(self, gql_endpoint: str, region: Optional[str] = None,
+                 credentials_provider: Optional[Callable[[], Any]] = None, timeout: float = 10, retries: int = 2):
+        from boto3 import Session
+        from gql.transport.requests import RequestsHTTPTransport
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        self.gql_endpoint = gql_endpoint
+        self.region = region if region else os.environ["AWS_REGION"]
+        self.credentials_provider = credentials_provider if credentials_provider else Session().get_credentials
+        self.transport = RequestsHTTPTransport(url=gql_endpoint, headers=HEADERS, timeout=timeout)
+        if retries > 0:
+            # The Retry of the transport leaves out POST, the only method mutations are sent with
+            adapter = HTTPAdapter(max_retries=Retry(
+                total=retries, backoff_factor=0.1, status_forcelist=RETRY_STATUSES,
+                allowed_methods=frozenset(['POST']), raise_on_status=False))
+            for prefix in "http://", "https://":
+                self.transport.session.mount(prefix, adapter)
+        self._documents: Dict[str, Any] = {}
+        self._credentials_key = None
+        self._lock = threading.Lock()
+
+    def document(self, mutation: str):
+        """
+        Return the parsed document of a mutation, parsing each mutation text only once
+        """
+        document = self._documents.get(mutation)
+        if document is None:
+            from gql import gql
+            document = gql(mutation)
+            self._documents[mutation] = document
+        return document
+
+    def _refresh_auth(self) -> None:
+        # Frozen credentials are refreshed by botocore when they are about to expire,
+        # the request signer only has to be rebuilt when they actually changed
+        credentials = self.credentials_provider()
+        if hasattr(credentials, 'get_frozen_credentials'):
+            credentials = credentials.get_frozen_credentials()
+        credentials_key = (credentials.access_key, credentials.secret_key, credentials.token)
+        if credentials_key != self._credentials_key:
+            from requests_aws4auth import AWS4Auth
+            self.transport.auth = AWS4Auth(
+                credentials.access_key,
+                credentials.secret_key,
+                self.region,
+                'appsync',
+                session_token=credentials.token,
+            )
+            self._credentials_key = credentials_key
+            logger.info('AppSync request signer created')
+
+    def _request(self, mutation: str, variables: dict):
+        """
+        :returns: GraphQL result of the request, None when it failed
+        """
+        document = self.document(mutation)
+        with self._lock:
+            try:
+                self._refresh_auth()
+                return self.transport.execute(document, variable_values=variables)
+            except Exception:
+                logger.exception("Error making AppSync mutation")
+                return None
+
+    def execute(self, mutation: str, variables: dict) -> Optional[dict]:
+        """
+        Run a mutation
+        :returns: data of the response, None when the mutation failed
+        """
+        result = self._request(mutation, variables)
+        if result is None:
+            return None
+        if result.errors:
+            logger.error(f'AppSync mutation failed: {result.errors}')
+            return None
+        return result.data
+
+    def execute_alarms(self, variables_list: List[dict]) -> List[Optional[dict]]:
+        """
+        Run several newAlarm mutations in one request
+        :param `variables_list` variables returned by `mutation_preparer.prepare_mutation` for each alarm
+        :returns: result of each newAlarm field, None for the fields that failed
+        """
+        if not variables_list:
+            return []
+        mutation, variables = mutation_preparer.prepare_batch_mutation(variables_list)
+        result = self._request(mutation, variables)
+        if result is None:
+            return [None] * len(variables_list)
+        aliases = [f'alarm{idx}' for idx in range(len(variables_list))]
+        failed = set()
+        for error in result.errors or []:
+            path = error.get('path') if isinstance(error, dict) else None
+            # An error outside of any field, e.g. a validation error, fails the whole request
+            failed.update(path[:1] if path else aliases)
+        if failed:
+            logger.error(f'AppSync mutations {", ".join(sorted(failed))} failed: {result.errors}')
+        data = result.data or {}
+        return [None if alias in failed else data.get(alias) for alias in aliases]
+
+    def close(self) -> None:
+        self.transport.close()
+
+
+_executors: Dict[str, MutationExecutor] = {}
+
+
+def get_executor(gql_endpoint: str) -> MutationExecutor:
+    """
+    Return the executor of an endpoint, created on first use and kept for the warm container
+    """
+    executor = _executors.get(gql_endpoint)
+    if executor is None:
+        executor = MutationExecutor(gql_endpoint)
+        _executors[gql_endpoint] = executor
+    return executor
+
 
 @tracer.capture_method(capture_response=False)
-def make_mutation(mutation: dict, variables: dict, gql_endpoint: str) -> str:
-    start_time = timeit.default_timer()
-
-    headers = {
-        'Accept': 'application/json',
-        'Content-Type': 'application/json'
-    }
-
-    aws = Session(
-        aws_access_key_id=os.environ["AWS_ACCESS_KEY_ID"],
-        aws_secret_access_key=os.environ["AWS_SECRET_ACCESS_KEY"],
-        aws_session_token=os.environ["AWS_SESSION_TOKEN"],
-        region_name=os.environ["AWS_REGION"]
-    )
-
-    credentials = aws.get_credentials().get_frozen_credentials()
-
-    auth = AWS4Auth(
-        os.environ["AWS_ACCESS_KEY_ID"],
-        os.environ["AWS_SECRET_ACCESS_KEY"],
-        os.environ["AWS_REGION"],
-        'appsync',
-        session_token=os.environ["AWS_SESSION_TOKEN"],
-    )
-
-    transport = RequestsHTTPTransport(
-        url=os.environ["GRAPHQL_API_ENDPOINT"],
-        headers=headers,
-        auth=auth
-    )
-
-    client = Client(transport=transport, fetch_schema_from_transport=False)
-
-    try:
-        resp = client.execute(gql(mutation), variable_values=(json.dumps({
-            "cameraId": variables["cameraId"],
-            "ts": variables["ts"],
-            "persons": variables["persons"],
-            "s3url": variables["s3url"],
-            "status": variables["status"]
-        })))
-    except Exception:
-        logger.exception("Error making AppSync mutation")
-    
-    logger.info(
-        f'GraphQL mutation execution completed after: {timeit.default_timer() - start_time}')
+@stage_metrics.timed('mutation')
+def make_mutation(mutation: str, variables: dict, gql_endpoint: str) -> Optional[dict]:
+    return get_executor(gql_endpoint).execute(mutation, variables)
+
+
+@tracer.capture_method(capture_response=False)
+@stage_metrics.timed('mutation')
+def make_alarm_mutations(variables_list: List[dict], gql_endpoint: str) -> List[Optional[dict]]:
+    resp = get_executor(gql_endpoint).execute_alarms(variables_list)
+
+    logger.info(f'{len(variables_list)} newAlarm mutations completed in one request')
+    return resp
@@ -1,61 +1,93 @@
-import timeit
-from typing import Tuple
+import functools
+from typing import List, Optional, Sequence, Tuple
 
 from aws_lambda_powertools.logging import Logger
-from aws_lambda_powertools.tracing import Tracer
+
+from detectors_common import stage_metrics, tracing
 
 
 logger = Logger(service='face-detector', child=True)
-tracer = Tracer(service='face-detector')
+tracer = tracing.get_tracer('face-detector')
 
-@tracer.capture_method(capture_response=False)
-def prepare_mutation(message: dict, face_res: list, persons_detected: bool, detect_helmet: str) -> Tuple[dict, dict]:
-    start_time = timeit.default_timer()
-
-    mutation = """
-        mutation NewAlarm(
-            $cameraId: String!,
-            $ts: String!,
-            $persons: [PersonInput],
-            $s3url: String,
-            $status: String) {
-                newAlarm(
-                    cameraId: $cameraId,
-                    ts: $ts,
-                    persons: $persons,
-                    s3url: $s3url,
-                    status: $status
-                ) {
-                    persons {
-                        faceId
-                    }
+NEW_ALARM_MUTATION = """
+    mutation NewAlarm(
+        $cameraId: String!,
+        $ts: String!,
+        $persons: [PersonInput],
+        $s3url: String,
+        $status: String) {
+            newAlarm(
+                cameraId: $cameraId,
+                ts: $ts,
+                persons: $persons,
+                s3url: $s3url,
+                status: $status
+            ) {
+                persons {
+                    faceId
                 }
             }
+        }
+"""
+
+# Variables of one newAlarm operation, suffixed with the operation index in batched documents
+NEW_ALARM_VARIABLES = (
+    ("cameraId", "String!"),
+    ("ts", "String!"),
+    ("persons", "[PersonInput]"),
+    ("s3url", "String"),
+    ("status", "String"),
+)
+
+
+@tracer.capture_method(capture_response=False)
+@stage_metrics.timed('mutationPrepare')
+def prepare_mutation(message: dict, face_res: list, persons_detected: bool, detect_helmet: str,
+                     faceless: Sequence[int] = (), found: Optional[Sequence[int]] = None) -> Tuple[dict, dict]:
+    """
+    :param `face_res` face search responses of the persons whose face was found
+    :param `faceless` indexes, in personsWithoutRequiredEquipment, of the persons showing no face to the local face
+        check. They are added with `faceVisible` false and their PPE bounding box
+    :param `found` indexes, in personsWithoutRequiredEquipment, of the persons of `face_res`, the first ones when None
+    Persons keep their index in personsWithoutRequiredEquipment as id
     """
+    mutation = NEW_ALARM_MUTATION
 
     cameraId = message["cameraId"]
     ts = message["ts"]
     persons = []
-    person_count = 0
+    if found is None:
+        found = range(len(face_res))
 
     if persons_detected:
         sts = "ACTIVE" 
-        for detected_face in face_res:
+        ppe_persons = message["ppeResult"]["personsWithoutRequiredEquipment"]
+        for idx, detected_face in zip(found, face_res):
             person = {
-                "id": person_count,
+                "id": idx,
                 "boundingBox": {
                     "width": detected_face["SearchedFaceBoundingBox"]["Width"],
                     "height": detected_face["SearchedFaceBoundingBox"]["Height"],
                     "left": detected_face["SearchedFaceBoundingBox"]["Left"],
                     "top": detected_face["SearchedFaceBoundingBox"]["Top"],
                 },
-                "missingMask": message["ppeResult"]["personsWithoutRequiredEquipment"][person_count]["missingMask"],
+                "missingMask": ppe_persons[idx]["missingMask"],
                 "faceId": detected_face["FaceMatches"][0]["Face"]["FaceId"]
             }
             if detect_helmet == 'true':
-                person["missingHelmet"] = message["ppeResult"]["personsWithoutRequiredEquipment"][person_count]["missingHelmet"]
+                person["missingHelmet"] = ppe_persons[idx]["missingHelmet"]
             persons.append(person)
-            person_count += 1
+        for idx in faceless:
+            person = {
+                "id": idx,
+                "boundingBox": ppe_persons[idx]["boundingBox"],
+                "missingMask": ppe_persons[idx]["missingMask"],
+                "faceVisible": False
+            }
+            if detect_helmet == 'true':
+                person["missingHelmet"] = ppe_persons[idx]["missingHelmet"]
+            persons.append(person)
+        persons.sort(key=lambda person: person["id"])
     else:
         sts = "PENDING_REVIEW"
 
@@ -67,7 +99,32 @@ def prepare_mutation(message: dict, face_res: list, persons_detected: bool, dete
         "status": sts
     }
 
-    logger.info(
-        f'Mutation preparation completed after: {timeit.default_timer() - start_time}')
-    
     return mutation, variables
+
+
+@functools.lru_cache(maxsize=16)
+def batch_mutation_document(count: int) -> str:
+    """
+    Build a document running `count` newAlarm operations in one request, as the fields alarm0, alarm1...
+    The text only depends on the count so that the executor parses it once per batch size
+    """
+    definitions = []
+    fields = []
+    for idx in range(count):
+        definitions.extend(f'${name}{idx}: {type_}' for name, type_ in NEW_ALARM_VARIABLES)
+        arguments = ", ".join(f'{name}: ${name}{idx}' for name, _ in NEW_ALARM_VARIABLES)
+        fields.append(f'alarm{idx}: newAlarm({arguments}) {{ persons {{ faceId }} }}')
+    return 'mutation NewAlarms(' + ', '.join(definitions) + ') {\n    ' + '\n    '.join(fields) + '\n}'
+
+
+def prepare_batch_mutation(variables_list: List[dict]) -> Tuple[str, dict]:
+    """
+    Merge the variables of several newAlarm operations into one aliased mutation
+    :param `variables_list` variables returned by `prepare_mutation` for each alarm
+    :returns: mutation text and its variables, the result of alarm i is under the field alarm<i>
+    """
+    variables = {}
+    for idx, alarm_variables in enumerate(variables_list):
+        for name, _ in NEW_ALARM_VARIABLES:
+            variables[f'{name}{idx}'] = alarm_variables[name]
+    return batch_mutation_document(len(variables_list)), variables
@@ -0,0 +1,44 @@
+import numpy as np
+import cv2
+
+from aws_lambda_powertools.logging import Logger
+
+from detectors_common import stage_metrics, tracing
+
+
+logger = Logger(service='face-detector', child=True)
+tracer = tracing.get_tracer('face-detector')
+
+# Same quality as the PIL WebP encoder used by `converter.convert_frame`
+WEBP_QUALITY = 80
+
+
+@tracer.capture_method(capture_response=False)
+@stage_metrics.timed('decode')
+def decode_frame(frame_bytes: bytes) -> np.ndarray:
+    """
+    Decode an encoded frame (WebP, PNG, JPEG...) straight from memory
+    :param `frame_bytes`: content of the image file
+    :returns: BGR frame data in numpy array, without alpha channel
+    """
+
+    frame = cv2.imdecode(np.frombuffer(frame_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if frame is None:
+        raise ValueError('Frame could not be decoded')
+    return frame
+
+
+@tracer.capture_method(capture_response=False)
+@stage_metrics.timed('encode')
+def encode_frame(frame: np.ndarray, quality: int = WEBP_QUALITY) -> bytes:
+    """
+    Encode a frame as WebP in memory
+    :param `frame`: BGR frame data in numpy array
+    :param `quality`: WebP quality from 1 to 100
+    """
+
+    ok, encoded = cv2.imencode('.webp', frame, [cv2.IMWRITE_WEBP_QUALITY, quality])
+    if not ok:
+        raise ValueError('Frame could not be encoded')
+    stage_metrics.count('encodedBytes', encoded.size, 'Bytes')
+    return encoded.tobytes()
@@ -5,11 +5,12 @@ import timeit
 import cv2
 
 from aws_lambda_powertools.logging import Logger
-from aws_lambda_powertools.tracing import Tracer
+
+from detectors_common import tracing
 
 
 logger = Logger(service='face-detector', child=True)
-tracer = Tracer(service='face-detector')
+tracer = tracing.get_tracer('face-detector')
 
 @tracer.capture_method(capture_response=False)
 def convert_frame(old_frame_file: str, format: str) -> str:
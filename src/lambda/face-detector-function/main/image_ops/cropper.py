@@ -1,46 +1,36 @@
 from typing import Dict, Tuple
 import numpy as np
-import timeit
-from PIL import Image
 
 from aws_lambda_powertools.logging import Logger
-from aws_lambda_powertools.tracing import Tracer
+
+from detectors_common import stage_metrics, tracing
 
 
 logger = Logger(service='face-detector', child=True)
-tracer = Tracer(service='face-detector')
+tracer = tracing.get_tracer('face-detector')
 
 @tracer.capture_method(capture_response=False)
+@stage_metrics.timed('crop')
 def crop_image(frame: np.ndarray, bounding_box: Dict[str, float]) -> Tuple[np.ndarray, Tuple[int, int]]:
     """
-    Crop an image given a bounding box, encode it as string
+    Crop an image given a bounding box, without copying it
     :param `frame`: frame data in numpy array
     :param `bounding_box`: dictionary of the bounding box (width, height, left, top)
-    :returns: Tuple of encoded image string and image size (height, width) for cropped image
+    :returns: Tuple of the cropped image, a view sharing the memory of the frame, and its shape (height, width, channels)
     """
 
-    start_time = timeit.default_timer()
-
     img_height, img_width = frame.shape[:2]
 
     width = int(bounding_box["width"] * img_width)
     height = int(bounding_box["height"] * img_height)
-    left = int(bounding_box["left"] * img_width)
-    top = int(bounding_box["top"] * img_height)
-
-    if left + width <= img_width:
-        right = left + width
-    else:
-        right = img_width
+    left = max(int(bounding_box["left"] * img_width), 0)
+    top = max(int(bounding_box["top"] * img_height), 0)
 
-    if top + height <= img_height:
-        bottom = top + height
-    else:
-        bottom = img_height
+    right = min(left + width, img_width)
+    bottom = min(top + height, img_height)
 
-    old_frame = Image.fromarray(frame, 'RGB')
-    new_frame = np.asarray(old_frame.crop((left, top, right, bottom)))
+    # Drawing on the frame changes the crop too, crops have to be used before the frame is annotated
+    new_frame = frame[top:bottom, left:right]
     new_frame_size = new_frame.shape
 
-    logger.info(f'Resized frame after: {timeit.default_timer() - start_time}')
     return new_frame, new_frame_size
@@ -1,13 +1,13 @@
-import timeit
 import cv2
 import numpy as np
 
 from aws_lambda_powertools.logging import Logger
-from aws_lambda_powertools.tracing import Tracer
+
+from detectors_common import stage_metrics, tracing
 
 
 logger = Logger(service='face-detector', child=True)
-tracer = Tracer(service='face-detector')
+tracer = tracing.get_tracer('face-detector')
 
 color_mapping = {
     0: (153, 0, 0),
@@ -28,17 +28,16 @@ color_mapping = {
 }
 
 @tracer.capture_method(capture_response=False)
-def draw_bounding_box(face_res: list, size_list: list, frame: np.ndarray, filepath: str) -> list:
+@stage_metrics.timed('draw')
+def draw_bounding_box(face_res: list, size_list: list, frame: np.ndarray, filepath: str = None) -> list:
     """
     Draw bounding box on the frame based on the detected faces' bounding box coordinates
     :param: `face_res` List containing the Rekognition face search
     :param: `size_list` List containing the size of each cropped frame, in same order as the face response
-    :param: `frame` The original uncropped frame
-    :param: The path to drawn frame
+    :param: `frame` The original uncropped frame, drawn in place
+    :param: `filepath` Optional path the drawn frame is written to
     """
 
-    start_time = timeit.default_timer()
-
     ppl_count = 0
     ppl_list = []
 
@@ -70,8 +69,7 @@ def draw_bounding_box(face_res: list, size_list: list, frame: np.ndarray, filepa
         ppl_list.append(faceId)
         ppl_count += 1
 
-    cv2.imwrite(filepath, frame)
+    if filepath:
+        cv2.imwrite(filepath, frame)
 
-    logger.info(
-        f'Image drawing completed after: {timeit.default_timer() - start_time}')
     return ppl_list
@@ -1,27 +1,43 @@
 from typing import Any, Tuple
-import boto3
-import timeit
 
 from aws_lambda_powertools.logging import Logger
-from aws_lambda_powertools.tracing import Tracer
+
+from detectors_common import client_registry, stage_metrics, tracing
 
 logger = Logger(service='face-detector', child=True)
-tracer = Tracer(service='face-detector')
+tracer = tracing.get_tracer('face-detector')
 
 
 @tracer.capture_method(capture_response=False)
+@stage_metrics.timed('download')
 def download_frame(bucket_name: str, key: str, s3_client: None) -> Tuple[str, Any]:
 
-    start_time = timeit.default_timer()
     if s3_client == None:
-        s3_client = boto3.client('s3')
+        s3_client = client_registry.get_client('s3')
 
     try:
         filename = '/tmp/' + key
         s3_client.download_file(bucket_name, key, filename)
-
-        logger.info(
-            f'Frame downloaded from S3 completed after: {timeit.default_timer() - start_time}') 
         return filename, s3_client
     except(Exception):
         logger.exception("Error downloading frame from S3")
+
+
+@tracer.capture_method(capture_response=False)
+@stage_metrics.timed('download')
+def download_frame_bytes(bucket_name: str, key: str, s3_client: None) -> bytes:
+    """
+    Read a frame from S3 into memory
+    """
+
+    if s3_client == None:
+        s3_client = client_registry.get_client('s3')
+
+    resp = s3_client.get_object(
+        Bucket=bucket_name,
+        Key=key
+    )
+    frame_bytes = resp["Body"].read()
+
+    stage_metrics.count('frameBytes', len(frame_bytes), 'Bytes')
+    return frame_bytes
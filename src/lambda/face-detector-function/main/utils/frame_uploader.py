@@ -1,23 +1,44 @@
-import boto3
-import timeit
 import io
 
 from aws_lambda_powertools.logging import Logger
-from aws_lambda_powertools.tracing import Tracer
+
+from detectors_common import client_registry, stage_metrics, tracing
 
 
 logger = Logger(service='face-detector', child=True)
-tracer = Tracer(service='face-detector')
+tracer = tracing.get_tracer('face-detector')
 
 @tracer.capture_method(capture_response=False)
+@stage_metrics.timed('upload')
 def upload_frame(bucket_name: str, key: str, filepath: str, s3_client: None):
-    start_time = timeit.default_timer()
 
     if s3_client == None:
-        s3_client = boto3.client('s3')
+        s3_client = client_registry.get_client('s3')
     try:
         s3_client.upload_file(filepath, bucket_name, key)
-        logger.info(
-            f'Frame uploaded to S3 after: {timeit.default_timer() - start_time}') 
     except Exception:
         logger.exception("Error uploading frame to S3")
+
+
+@tracer.capture_method(capture_response=False)
+@stage_metrics.timed('upload')
+def upload_frame_bytes(bucket_name: str, key: str, frame_bytes: bytes, s3_client: None,
+                       content_type: str = "image/webp") -> bool:
+    """
+    Upload an encoded frame from memory
+    :returns: whether the frame was uploaded
+    """
+    if s3_client == None:
+        s3_client = client_registry.get_client('s3')
+    try:
+        s3_client.put_object(
+            Body=frame_bytes,
+            Bucket=bucket_name,
+            Key=key,
+            ContentType=content_type
+        )
+        stage_metrics.count('uploadedBytes', len(frame_bytes), 'Bytes')
+        return True
+    except Exception:
+        logger.exception("Error uploading frame to S3")
+        return False
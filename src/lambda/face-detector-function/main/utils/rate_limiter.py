@@ -0,0 +1,33 @@
+from typing import Callable
+import threading
+import time
+
+
+class RateLimiter:
+    """
+    Space calls evenly so that they stay under a number of transactions per second, across threads
+    :param `rate` calls allowed per second, 0 or less disables the limit
+    """
+
+    def __init__(self, rate: float, clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.clock = clock
+        self.sleep = sleep
+        self.waited = 0.0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """
+        Block until the caller may send its call
+        """
+        if not self.interval:
+            return
+        with self._lock:
+            now = self.clock()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            self.waited += slot - now
+            self.sleep(slot - now)
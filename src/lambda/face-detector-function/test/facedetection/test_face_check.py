@@ -0,0 +1,73 @@
+import os
+import cv2
+import numpy as np
+import pytest
+
+from main.facedetection.face_check import FaceCheck, HaarFaceDetector, LocalFaceDetector, create_detector
+
+
+class FixedDetector(LocalFaceDetector):
+    def __init__(self, found):
+        super().__init__()
+        self.found = found
+        self.crops = []
+
+    def has_face(self, crop):
+        self.crops.append(self.prepare(crop).shape)
+        return self.found
+
+
+def test_counts_skipped_searches():
+    detector = FixedDetector(False)
+    check = FaceCheck(detector)
+    crop = np.zeros((600, 512, 3), dtype=np.uint8)
+
+    assert check.has_face(crop) is False
+    detector.found = True
+    assert check.has_face(crop) is True
+    # Large crops are downscaled to grayscale before detection
+    assert detector.crops[0] == (300, 256)
+    assert check.stats() == {"faceCheckSkippedSearches": 1, "faceCheckPassedCrops": 1}
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        create_detector('yunet')
+
+
+def test_detectors_implement_has_face():
+    class NoCheck(LocalFaceDetector):
+        pass
+
+    with pytest.raises(TypeError):
+        NoCheck()
+
+
+def test_missing_cascade_fails_at_load():
+    with pytest.raises(FileNotFoundError, match='haarcascade_missing.xml'):
+        HaarFaceDetector.load('haarcascade_missing.xml')
+
+
+# Frame shared with the PPE detector tests, the third person of its response faces the camera
+FRAME = os.path.join(os.path.dirname(__file__), '../../../ppe-detector-function/test/data/1480.png')
+PERSON = {"Width": 0.1948, "Height": 0.8661, "Left": 0.5065, "Top": 0.0739}
+
+haar_cascades = pytest.mark.skipif(
+    not hasattr(cv2, 'CascadeClassifier') or not hasattr(cv2, 'data'), reason='OpenCV built without the Haar cascades')
+
+
+@haar_cascades
+def test_haar_finds_the_face_of_a_person():
+    frame = cv2.imread(FRAME)
+    height, width = frame.shape[:2]
+    left, top = int(PERSON["Left"] * width), int(PERSON["Top"] * height)
+    crop = frame[top:top + int(PERSON["Height"] * height), left:left + int(PERSON["Width"] * width)]
+
+    assert create_detector('haar').has_face(crop) is True
+
+
+@haar_cascades
+def test_haar_finds_no_face_in_a_blank_crop():
+    detector = create_detector('haar')
+    assert isinstance(detector, HaarFaceDetector)
+    assert detector.has_face(np.full((240, 120, 3), 90, dtype=np.uint8)) is False
@@ -0,0 +1,104 @@
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from main.facedetection.detector import NO_FACE, search_faces
+from main.facedetection.face_check import FaceCheck, LocalFaceDetector
+from main.image_ops.cropper import crop_image
+from main.utils.rate_limiter import RateLimiter
+
+
+class FakeRekognition:
+    class exceptions:
+        class InvalidParameterException(Exception):
+            pass
+
+    def __init__(self, latency=0.05):
+        self.latency = latency
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def search_faces_by_image(self, CollectionId, Image, MaxFaces, FaceMatchThreshold):
+        crop = cv2.imdecode(np.frombuffer(Image["Bytes"], dtype=np.uint8), cv2.IMREAD_COLOR)
+        marker = int(crop[crop.shape[0] // 2, crop.shape[1] // 2, 0])
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        # Later persons answer first, results still have to come back in person order
+        time.sleep(self.latency * (1 + (255 - marker) / 255))
+        with self._lock:
+            self.in_flight -= 1
+        if marker == 0:
+            raise self.exceptions.InvalidParameterException()
+        if marker == 1:
+            raise RuntimeError('Rekognition unavailable')
+        return {"FaceMatches": [{"Face": {"FaceId": f'face-{marker}'}}], "SearchedFaceBoundingBox": {}}
+
+
+def make_crops(markers):
+    frame = np.zeros((100, 100 * len(markers), 3), dtype=np.uint8)
+    for idx, marker in enumerate(markers):
+        frame[:, idx * 100:(idx + 1) * 100] = marker
+    box_width = 1 / len(markers)
+    return [crop_image(frame, {"width": box_width, "height": 1.0, "left": idx * box_width, "top": 0.0})[0]
+            for idx in range(len(markers))]
+
+
+def test_results_keep_person_order():
+    rekognition = FakeRekognition()
+    markers = [10, 60, 110, 160, 210, 250]
+    results = search_faces(make_crops(markers), 90, rekognition, 'faces', max_workers=3)
+    assert [res["FaceMatches"][0]["Face"]["FaceId"] for res in results] == [f'face-{m}' for m in markers]
+    assert rekognition.max_in_flight == 3
+
+
+def test_failed_searches_are_none():
+    results = search_faces(make_crops([10, 0, 1, 20]), 90, FakeRekognition(0.001), 'faces', max_workers=4)
+    assert [res is not None for res in results] == [True, False, False, True]
+
+
+class MarkerFaceDetector(LocalFaceDetector):
+    # Crops with an even marker show no face
+    def has_face(self, crop):
+        return int(crop[0, 0, 0]) % 2 == 1
+
+
+def test_crops_without_a_face_are_not_searched():
+    rekognition = FakeRekognition(0.001)
+    results = search_faces(make_crops([11, 20, 31]), 90, rekognition, 'faces', max_workers=2,
+                           face_check=FaceCheck(MarkerFaceDetector()))
+    assert results[1] is NO_FACE
+    assert [res["FaceMatches"][0]["Face"]["FaceId"] for res in (results[0], results[2])] == ['face-11', 'face-31']
+    assert rekognition.max_in_flight <= 2
+
+
+def test_jpeg_crops_and_sequential_search():
+    rekognition = FakeRekognition(0.001)
+    results = search_faces(make_crops([30, 40]), 90, rekognition, 'faces', max_workers=1, image_format='.jpg')
+    assert len(results) == 2 and all(results)
+    assert rekognition.max_in_flight == 1
+
+
+def test_rate_limiter_spaces_calls():
+    now = [0.0]
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+
+    limiter = RateLimiter(5, clock=lambda: now[0], sleep=sleep)
+    for _ in range(3):
+        limiter.acquire()
+    assert sleeps == [0.2, 0.4]
+
+    now[0] = 10.0
+    limiter.acquire()
+    assert len(sleeps) == 2
+
+    unlimited = RateLimiter(0, sleep=sleep)
+    unlimited.acquire()
+    unlimited.acquire()
+    assert len(sleeps) == 2
@@ -0,0 +1,89 @@
+import numpy as np
+
+from main.facedetection.tracker import FaceTracker, iou_matrix, box_array
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def box(left, top, width=0.1, height=0.3):
+    return {"left": left, "top": top, "width": width, "height": height}
+
+
+def face(face_id):
+    return {"FaceMatches": [{"Face": {"FaceId": face_id}}]}
+
+
+def search_all(tracker, camera_name, boxes, faces):
+    matches = tracker.associate(camera_name, boxes)
+    for (track_id, cached), b, f in zip(matches, boxes, faces):
+        if cached is None:
+            tracker.record(camera_name, track_id, b, f)
+    return matches
+
+
+def test_iou_matrix():
+    boxes = box_array([box(0.0, 0.0, 0.2, 0.2), box(0.5, 0.5, 0.2, 0.2)])
+    iou = iou_matrix(boxes, box_array([box(0.1, 0.0, 0.2, 0.2)]))
+    assert np.allclose(iou[:, 0], [1 / 3, 0.0])
+
+
+def test_reuses_face_of_a_track():
+    clock = FakeClock()
+    tracker = FaceTracker(clock=clock)
+    search_all(tracker, 'camera-1', [box(0.1, 0.2), box(0.6, 0.2)], [face('a'), face('b')])
+
+    clock.now = 5.0
+    # Persons moved a little and come in another order
+    matches = tracker.associate('camera-1', [box(0.61, 0.21), box(0.11, 0.2)])
+    assert [cached["FaceMatches"][0]["Face"]["FaceId"] for _, cached in matches] == ['b', 'a']
+    assert tracker.stats()["faceTrackerReusedSearches"] == 2
+    assert tracker.stats()["faceTrackerHitRate"] == 0.5
+
+
+def test_searches_again_when_new_old_or_moved():
+    clock = FakeClock()
+    tracker = FaceTracker(max_age=60, max_shift=0.15, clock=clock)
+    first = search_all(tracker, 'camera-1', [box(0.1, 0.2)], [face('a')])
+
+    clock.now = 10.0
+    # A new person, and the tracked one drifting slowly further than max_shift from where it was searched
+    matches = tracker.associate('camera-1', [box(0.14, 0.2), box(0.7, 0.2)])
+    assert matches[0] == (first[0][0], face('a'))
+    assert matches[1][1] is None
+    for step in range(1, 5):
+        matches = tracker.associate('camera-1', [box(0.14 + 0.04 * step, 0.2)])
+    assert matches[0][0] == first[0][0] and matches[0][1] is None
+
+    clock.now = 100.0
+    matches = tracker.associate('camera-1', [box(0.3, 0.2)])
+    assert matches[0][1] is None
+
+
+def test_no_face_is_not_cached():
+    tracker = FaceTracker(clock=FakeClock())
+    search_all(tracker, 'camera-1', [box(0.1, 0.2)], [None])
+    assert tracker.associate('camera-1', [box(0.1, 0.2)])[0][1] is None
+
+
+def test_bounds_tracks_and_cameras():
+    clock = FakeClock()
+    tracker = FaceTracker(max_tracks=2, max_cameras=2, track_ttl=30, clock=clock)
+    search_all(tracker, 'camera-1', [box(0.0, 0.0), box(0.3, 0.0), box(0.6, 0.0)], [face('a'), face('b'), face('c')])
+    assert tracker.stats()["faceTrackerTracks"] == 2
+
+    search_all(tracker, 'camera-2', [box(0.0, 0.0)], [face('d')])
+    search_all(tracker, 'camera-3', [box(0.0, 0.0)], [face('e')])
+    assert tracker.stats()["faceTrackerCameras"] == 2
+    assert tracker.associate('camera-1', [box(0.6, 0.0)])[0][1] is None
+
+    # Tracks not seen for track_ttl are dropped when their camera sends its next alarm
+    clock.now = 31.0
+    tracker.associate('camera-3', [])
+    assert tracker.stats()["faceTrackerTracks"] == 1
+    assert tracker.associate('camera-3', [box(0.0, 0.0)])[0][1] is None
@@ -0,0 +1,152 @@
+import json
+import re
+import threading
+from collections import namedtuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from main.graphql import mutation_executor, mutation_preparer
+from main.graphql.mutation_executor import MutationExecutor
+
+Credentials = namedtuple('Credentials', ['access_key', 'secret_key', 'token'])
+
+ALARM = {
+    "cameraId": 'test-laptop-01',
+    "ts": '1611744890532',
+    "persons": [{"id": 0, "missingMask": True, "faceId": '5fec5fae-9f92-401e-ac43-df1283ea5f12'}],
+    "s3url": 'frames/test-laptop-01-2021-01-27-10:54:50:532000.webp',
+    "status": 'ACTIVE'
+}
+
+
+class AppSyncStub(BaseHTTPRequestHandler):
+    """
+    Answer every newAlarm field of a request with the persons of its variables
+    """
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately, Nagle would hold the body until the client acks the headers
+    disable_nagle_algorithm = True
+    requests = []
+    # Statuses answered to the next requests before a GraphQL result, and fields answered with an error
+    statuses = []
+    failing_fields = []
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.requests.append({
+            "port": self.client_address[1],
+            "authorization": self.headers.get('Authorization', ''),
+            "payload": payload
+        })
+        status = self.statuses.pop(0) if self.statuses else 200
+        fields = re.findall(r'(alarm\d+):\s*newAlarm', payload["query"])
+        if fields:
+            data = {field: {"persons": payload["variables"][f'persons{field[5:]}']} for field in fields}
+        else:
+            data = {"newAlarm": {"persons": payload["variables"]["persons"]}}
+        result = {"data": data}
+        if self.failing_fields:
+            result["errors"] = [{"message": 'DynamoDB error', "path": [field]} for field in self.failing_fields]
+            data.update({field: None for field in self.failing_fields})
+        body = json.dumps(result if status == 200 else {"message": 'Internal error'}).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def appsync():
+    AppSyncStub.requests = []
+    AppSyncStub.statuses = []
+    AppSyncStub.failing_fields = []
+    server = ThreadingHTTPServer(('127.0.0.1', 0), AppSyncStub)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_port}/graphql'
+    server.shutdown()
+
+
+def test_execute_reuses_connection_and_document(appsync):
+    executor = MutationExecutor(appsync, 'us-east-1', lambda: Credentials('AKID', 'secret', 'token'))
+    for _ in range(3):
+        data = executor.execute(mutation_preparer.NEW_ALARM_MUTATION, ALARM)
+        assert data["newAlarm"]["persons"][0]["faceId"] == ALARM["persons"][0]["faceId"]
+    executor.close()
+
+    assert len(AppSyncStub.requests) == 3
+    assert len({request["port"] for request in AppSyncStub.requests}) == 1
+    assert len(executor._documents) == 1
+    assert all('Credential=AKID/' in request["authorization"] for request in AppSyncStub.requests)
+    assert AppSyncStub.requests[0]["payload"]["variables"] == ALARM
+
+
+def test_signer_follows_credentials(appsync):
+    credentials = [Credentials('AKID1', 'secret', 'token')]
+    executor = MutationExecutor(appsync, 'us-east-1', lambda: credentials[0])
+    executor.execute(mutation_preparer.NEW_ALARM_MUTATION, ALARM)
+    auth = executor.transport.auth
+    executor.execute(mutation_preparer.NEW_ALARM_MUTATION, ALARM)
+    assert executor.transport.auth is auth
+
+    credentials[0] = Credentials('AKID2', 'secret', 'token2')
+    executor.execute(mutation_preparer.NEW_ALARM_MUTATION, ALARM)
+    executor.close()
+    assert executor.transport.auth is not auth
+    assert 'Credential=AKID2/' in AppSyncStub.requests[-1]["authorization"]
+
+
+def test_execute_alarms_in_one_request(appsync):
+    executor = MutationExecutor(appsync, 'us-east-1', lambda: Credentials('AKID', 'secret', 'token'))
+    variables_list = [dict(ALARM, ts=str(ts), persons=[{"id": 0, "faceId": f'face-{ts}'}]) for ts in range(3)]
+    results = executor.execute_alarms(variables_list)
+    executor.close()
+
+    assert len(AppSyncStub.requests) == 1
+    assert [result["persons"][0]["faceId"] for result in results] == ['face-0', 'face-1', 'face-2']
+    variables = AppSyncStub.requests[0]["payload"]["variables"]
+    assert variables["ts2"] == '2' and variables["cameraId0"] == ALARM["cameraId"]
+
+
+def test_partial_errors_fail_their_alarm_only(appsync):
+    AppSyncStub.failing_fields = ['alarm1']
+    executor = MutationExecutor(appsync, 'us-east-1', lambda: Credentials('AKID', 'secret', 'token'))
+    variables_list = [dict(ALARM, ts=str(ts), persons=[{"id": 0, "faceId": f'face-{ts}'}]) for ts in range(3)]
+    results = executor.execute_alarms(variables_list)
+    executor.close()
+
+    assert results[1] is None
+    assert [results[0]["persons"][0]["faceId"], results[2]["persons"][0]["faceId"]] == ['face-0', 'face-2']
+
+
+def test_mutation_is_sent_again_on_server_error(appsync):
+    AppSyncStub.statuses = [503, 500]
+    executor = MutationExecutor(appsync, 'us-east-1', lambda: Credentials('AKID', 'secret', 'token'), retries=2)
+    data = executor.execute(mutation_preparer.NEW_ALARM_MUTATION, ALARM)
+    executor.close()
+
+    assert len(AppSyncStub.requests) == 3
+    assert data["newAlarm"]["persons"] == ALARM["persons"]
+
+
+def test_failed_mutation_returns_none():
+    executor = MutationExecutor('http://127.0.0.1:9/graphql', 'us-east-1',
+                                lambda: Credentials('AKID', 'secret', 'token'), timeout=1, retries=0)
+    assert executor.execute(mutation_preparer.NEW_ALARM_MUTATION, ALARM) is None
+    assert executor.execute_alarms([ALARM, ALARM]) == [None, None]
+
+
+def test_make_mutation_keeps_executor(appsync, monkeypatch):
+    monkeypatch.setenv('AWS_REGION', 'us-east-1')
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'AKID')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'secret')
+    mutation_executor.make_mutation(mutation_preparer.NEW_ALARM_MUTATION, ALARM, appsync)
+    mutation_executor.make_alarm_mutations([ALARM, ALARM], appsync)
+    executor = mutation_executor.get_executor(appsync)
+    executor.close()
+    assert len({request["port"] for request in AppSyncStub.requests}) == 1
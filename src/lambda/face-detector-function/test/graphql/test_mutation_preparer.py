@@ -25,3 +25,62 @@ def test_prepare_mutation():
     assert variables["ts"] == 'das'
     assert variables["cameraId"] == camera_name
     assert variables["persons"][0]["faceId"] == res["FaceMatches"][0]["Face"]["FaceId"]
+
+
+def test_faceless_persons_are_marked():
+    persons = [
+        {"id": idx, "missingMask": bool(idx % 2), "missingHelmet": False,
+         "boundingBox": {"width": 0.2, "height": 0.5, "left": 0.1 + 0.3 * idx, "top": 0.2}}
+        for idx in range(3)
+    ]
+    msg = {
+        "cameraId": 'camera-1',
+        "ts": '1611744890532',
+        "s3url": 'processed-frames/camera-1-2021-01-27-10:54:50:532000.webp',
+        "ppeResult": {"personsWithoutRequiredEquipment": persons, "personsWithRequiredEquipment": []},
+    }
+    face = {
+        "SearchedFaceBoundingBox": {"Width": 0.3, "Height": 0.4, "Left": 0.2, "Top": 0.2},
+        "FaceMatches": [{"Face": {"FaceId": 'face-0'}}]
+    }
+
+    mutation, variables = prepare_mutation(msg, [face], True, 'true', faceless=[2])
+
+    assert len(variables["persons"]) == 2
+    assert variables["persons"][0]["faceId"] == 'face-0'
+    assert "faceVisible" not in variables["persons"][0]
+    assert variables["persons"][1] == {
+        "id": 2,
+        "boundingBox": persons[2]["boundingBox"],
+        "missingMask": False,
+        "missingHelmet": False,
+        "faceVisible": False
+    }
+
+
+def test_persons_keep_their_index():
+    persons = [
+        {"id": idx, "missingMask": idx == 2, "missingHelmet": idx == 0,
+         "boundingBox": {"width": 0.2, "height": 0.5, "left": 0.1 + 0.3 * idx, "top": 0.2}}
+        for idx in range(3)
+    ]
+    msg = {
+        "cameraId": 'camera-1',
+        "ts": '1611744890532',
+        "s3url": 'processed-frames/camera-1-2021-01-27-10:54:50:532000.webp',
+        "ppeResult": {"personsWithoutRequiredEquipment": persons, "personsWithRequiredEquipment": []},
+    }
+    face = {
+        "SearchedFaceBoundingBox": {"Width": 0.3, "Height": 0.4, "Left": 0.2, "Top": 0.2},
+        "FaceMatches": [{"Face": {"FaceId": 'face-2'}}]
+    }
+
+    # The first person shows no face, the second one was not found in the collection
+    mutation, variables = prepare_mutation(msg, [face], True, 'true', faceless=[0], found=[2])
+
+    assert [person["id"] for person in variables["persons"]] == [0, 2]
+    assert variables["persons"][0]["faceVisible"] is False
+    assert variables["persons"][0]["missingHelmet"] is True
+    assert variables["persons"][1]["faceId"] == 'face-2'
+    assert variables["persons"][1]["missingMask"] is True
+    assert variables["persons"][1]["missingHelmet"] is False
@@ -0,0 +1,53 @@
+import cv2
+import numpy as np
+import pytest
+
+from main.image_ops.codec import decode_frame, encode_frame
+from main.image_ops.drawer import draw_bounding_box
+from main.image_ops.resizer import resize_image
+
+
+def make_frame(width=1280, height=720):
+    frame = np.zeros((height, width, 3), dtype=np.uint8)
+    frame[:, :, 0] = np.linspace(0, 255, width, dtype=np.uint8)
+    frame[:, :, 2] = np.linspace(255, 0, height, dtype=np.uint8)[:, None]
+    return frame
+
+
+def test_decode_matches_imread(tmp_path):
+    frame = make_frame()
+    webp_bytes = encode_frame(frame)
+    path = tmp_path / 'frame.webp'
+    path.write_bytes(webp_bytes)
+
+    decoded = decode_frame(webp_bytes)
+    assert decoded.shape == (720, 1280, 3)
+    assert np.array_equal(decoded, cv2.imread(str(path)))
+    # Lossy, but the channel order has to be preserved
+    assert np.abs(decoded.astype(int) - frame.astype(int)).mean() < 4
+
+
+def test_decode_drops_alpha():
+    bgra = np.dstack([make_frame(64, 48), np.full((48, 64), 128, dtype=np.uint8)])
+    png_bytes = cv2.imencode('.png', bgra)[1].tobytes()
+    assert decode_frame(png_bytes).shape == (48, 64, 3)
+
+
+def test_decode_rejects_garbage():
+    with pytest.raises(ValueError):
+        decode_frame(b'not an image')
+
+
+def test_draw_and_encode_in_memory(tmp_path):
+    frame = resize_image(decode_frame(encode_frame(make_frame())), 640, 480)
+    face_res = {
+        "SearchedFaceBoundingBox": {"Width": 0.3, "Height": 0.4, "Left": 0.2, "Top": 0.2},
+        "FaceMatches": [{"Face": {"FaceId": 'face-1'}}]
+    }
+    before = frame.copy()
+    assert draw_bounding_box([face_res], [(240, 320)], frame) == ['face-1']
+    assert not np.array_equal(frame, before)
+    assert not list(tmp_path.iterdir())
+
+    webp_bytes = encode_frame(frame)
+    assert webp_bytes[:4] == b'RIFF' and webp_bytes[8:12] == b'WEBP'
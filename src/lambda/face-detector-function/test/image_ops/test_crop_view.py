@@ -0,0 +1,17 @@
+import numpy as np
+
+from main.image_ops.cropper import crop_image
+
+
+def test_crop_is_a_view():
+    frame = np.arange(480 * 640 * 3, dtype=np.uint32).reshape(480, 640, 3).astype(np.uint8)
+    crop, size = crop_image(frame, {"width": 0.5, "height": 0.25, "left": 0.25, "top": 0.5})
+    assert size == (120, 320, 3)
+    assert np.shares_memory(crop, frame)
+    assert np.array_equal(crop, frame[240:360, 160:480])
+
+
+def test_crop_is_clipped_to_the_frame():
+    frame = np.zeros((480, 640, 3), dtype=np.uint8)
+    crop, size = crop_image(frame, {"width": 0.5, "height": 0.5, "left": 0.75, "top": -0.1})
+    assert size == (240, 160, 3)
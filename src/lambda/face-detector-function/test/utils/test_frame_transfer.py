@@ -0,0 +1,27 @@
+import io
+
+from main.utils.frame_downloader import download_frame_bytes
+from main.utils.frame_uploader import upload_frame_bytes
+
+
+class FakeS3:
+    def __init__(self):
+        self.objects = {}
+
+    def get_object(self, Bucket, Key):
+        return {"Body": io.BytesIO(self.objects[(Bucket, Key)])}
+
+    def put_object(self, Body, Bucket, Key, ContentType):
+        self.objects[(Bucket, Key)] = Body
+        self.content_type = ContentType
+
+
+def test_frame_round_trip_in_memory():
+    s3 = FakeS3()
+    assert upload_frame_bytes('frames', 'camera-1.webp', b'RIFF0000WEBP', s3)
+    assert s3.content_type == 'image/webp'
+    assert download_frame_bytes('frames', 'camera-1.webp', s3) == b'RIFF0000WEBP'
+
+
+def test_upload_failure_is_reported():
+    assert not upload_frame_bytes('frames', 'camera-1.webp', b'', object())
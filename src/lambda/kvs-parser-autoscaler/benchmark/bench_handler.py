@@ -0,0 +1,129 @@
+"""
+Run time of one autoscaler pass against the stream count, with stubbed clients answering each call after
+a fixed latency: the previous handler (one GetMetricData and up to two GetItem per stream) against the
+batched one (paginated listing, 500 queries per GetMetricData, BatchGetItem and BatchWriteItem).
+
+The fleet is in steady state: most streams have a worker, a few cameras come online or go offline.
+
+Usage: python -m benchmark.bench_handler [latency_ms]
+"""
+import contextlib
+import io
+import json
+import sys
+from collections import Counter
+from datetime import datetime, timedelta
+
+from benchmark.fakes import FakeCloudWatch, FakeDynamoDB, FakeECS, FakeKinesisVideo
+from benchmark.timing import load_autoscaler, measure
+
+autoscaler = load_autoscaler()
+
+STREAM_COUNTS = [50, 200, 500, 1000]
+LEGACY_MAX_STREAMS = 500
+
+
+def legacy_check_task_mapping(camera_id):
+    task_mapping_resp = autoscaler.ddb.get_item(
+        TableName=autoscaler.ddb_table,
+        Key={'cameraId': {'S': camera_id}}
+    )
+    if 'Item' not in task_mapping_resp:
+        return 'NoWorker'
+    return task_mapping_resp['Item']['currentWorker']['S']
+
+
+def legacy_update_task_mapping(camera_id, task_id):
+    autoscaler.ddb.put_item(
+        TableName=autoscaler.ddb_table,
+        Item={'cameraId': {'S': camera_id}, 'currentWorker': {'S': task_id}}
+    )
+
+
+def legacy_check_kvs_metric(stream_name):
+    # One GetMetricData request per stream
+    queries = [
+        autoscaler.metric_query('kvsProducerByte', 'PutMedia.IncomingBytes', stream_name),
+        autoscaler.metric_query('kvsConsumerByte', 'GetMedia.OutgoingBytes', stream_name),
+    ]
+    cw_response = autoscaler.cw.get_metric_data(
+        MetricDataQueries=queries,
+        StartTime=datetime.utcnow() - timedelta(minutes=2),
+        EndTime=datetime.utcnow() - timedelta(minutes=1),
+        ScanBy='TimestampDescending',
+        MaxDatapoints=3
+    )
+    byte_counts = {}
+    for metric in cw_response["MetricDataResults"]:
+        if metric["StatusCode"] == "InternalError":
+            raise Exception(f"CloudWatch Error: {metric['Messages'][0]['Value']}")
+        byte_counts[metric["Id"]] = metric["Values"][0] if metric["Values"] else 0
+    return byte_counts.get('kvsProducerByte'), byte_counts.get('kvsConsumerByte')
+
+
+def legacy_handler(event, context):
+    for kvs_stream in autoscaler.list_kvs_streams():
+        stream_name = kvs_stream["StreamName"]
+        producerByteCount, consumerByteCount = legacy_check_kvs_metric(stream_name)
+        if producerByteCount > 0 and consumerByteCount == 0:
+            current_worker = legacy_check_task_mapping(stream_name)
+            if current_worker == "NoWorker":
+                current_worker = autoscaler.start_ecs_task([stream_name])
+                legacy_update_task_mapping(stream_name, current_worker)
+        if producerByteCount == 0:
+            current_worker = legacy_check_task_mapping(stream_name)
+            if current_worker != "NoWorker":
+                autoscaler.stop_ecs_task(current_worker)
+                legacy_update_task_mapping(stream_name, "NoWorker")
+
+
+def install_fleet(count: int, latency: float):
+    streams = {}
+    ddb = FakeDynamoDB(latency)
+    for idx in range(count):
+        name = f'camera-{idx:04d}'
+        if idx % 20 == 0:
+            streams[name] = (0, 0)              # offline camera
+        elif idx % 20 == 1:
+            streams[name] = (250000, 0)         # camera coming online, needs a worker
+        else:
+            streams[name] = (250000, 250000)    # camera already consumed by its worker
+            ddb.set_worker(name, f'task-{idx}')
+    autoscaler.kvs = FakeKinesisVideo(streams, latency)
+    autoscaler.cw = FakeCloudWatch(streams, latency)
+    autoscaler.ddb = ddb
+    autoscaler.ecs = FakeECS(latency)
+    return streams, ddb
+
+
+def run(handler, count: int, latency: float):
+    _, ddb = install_fleet(count, latency)
+    initial_items = dict(ddb.items)
+
+    def one_pass():
+        # Every pass starts from the same fleet state
+        ddb.items = dict(initial_items)
+        with contextlib.redirect_stdout(io.StringIO()):
+            handler({}, None)
+
+    timing = measure(one_pass, number=1, repeat=3)
+    clients = [autoscaler.kvs, autoscaler.cw, autoscaler.ddb, autoscaler.ecs]
+    for client in clients:
+        client.calls.clear()
+    one_pass()
+    calls = sum((client.calls for client in clients), Counter())
+    return {"run": timing, "calls_per_pass": dict(sorted(calls.items()))}
+
+
+def main(latency_ms: float):
+    results = []
+    for count in STREAM_COUNTS:
+        result = {"streams": count, "batched": run(autoscaler.handler, count, latency_ms / 1000)}
+        if count <= LEGACY_MAX_STREAMS:
+            result["legacy"] = run(legacy_handler, count, latency_ms / 1000)
+        results.append(result)
+    print(json.dumps({"latency_ms": latency_ms, "results": results}, indent=2))
+
+
+if __name__ == '__main__':
+    main(float(sys.argv[1]) if len(sys.argv) > 1 else 10)
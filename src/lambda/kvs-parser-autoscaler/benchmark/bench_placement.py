@@ -0,0 +1,67 @@
+"""
+Parser tasks and restarts of the single and binpack placement modes, running the autoscaler over a fleet of
+cameras with mixed bitrates for a number of passes. Every pass the bitrates wobble by up to 15%, and a few
+cameras go offline or come back.
+
+Usage: python -m benchmark.bench_placement [streams] [passes]
+"""
+import contextlib
+import io
+import json
+import random
+import sys
+
+from benchmark.fakes import FakeCloudWatch, FakeDynamoDB, FakeECS, FakeKinesisVideo
+from benchmark.timing import load_autoscaler
+
+autoscaler = load_autoscaler()
+
+# Bitrates in Mbps of the cameras of the fleet: many low bitrate cameras, a few HD ones
+BITRATES = [0.25, 0.5, 0.5, 1, 1, 1.5, 2, 4]
+PASS_MINUTES = 2
+
+
+def run(mode: str, stream_count: int, passes: int, seed: int = 7):
+    rng = random.Random(seed)
+    nominal = {f'camera-{idx:04d}': rng.choice(BITRATES) * 1000000 / 8 * 60 for idx in range(stream_count)}
+    streams = {}
+    autoscaler.kvs = FakeKinesisVideo(streams)
+    autoscaler.cw = FakeCloudWatch(streams)
+    autoscaler.ddb = FakeDynamoDB()
+    autoscaler.ecs = ecs = FakeECS()
+    autoscaler.placement_mode = mode
+
+    online = set(nominal)
+    tasks, task_minutes = [], 0
+    for _ in range(passes):
+        for name in rng.sample(sorted(nominal), max(1, stream_count // 50)):
+            online ^= {name}
+        for name, per_minute in nominal.items():
+            producer = int(per_minute * rng.uniform(0.85, 1.15)) if name in online else 0
+            consumed = any(name in task_streams for task_streams in ecs.running.values())
+            streams[name] = (producer, producer if consumed else 0)
+        with contextlib.redirect_stdout(io.StringIO()):
+            autoscaler.handler({}, None)
+        tasks.append(len(ecs.running))
+        task_minutes += len(ecs.running) * PASS_MINUTES
+    return {
+        "streams_online_final": len(online),
+        "tasks_final": tasks[-1],
+        "tasks_max": max(tasks),
+        "task_minutes": task_minutes,
+        "task_launches": ecs.calls['run_task'],
+        "task_stops": ecs.calls['stop_task'],
+    }
+
+
+def main(stream_count: int, passes: int):
+    print(json.dumps({
+        "streams": stream_count,
+        "passes": passes,
+        "single": run('single', stream_count, passes),
+        "binpack": run('binpack', stream_count, passes),
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200, int(sys.argv[2]) if len(sys.argv) > 2 else 30)
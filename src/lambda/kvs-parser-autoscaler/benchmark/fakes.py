@@ -0,0 +1,149 @@
+"""
+In-process stand-ins for the KVS, CloudWatch, DynamoDB and ECS clients of the autoscaler
+Every call sleeps for a fixed latency, roughly the round trip of the real API, and is counted
+"""
+import itertools
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Callable
+
+
+class FakeClient:
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = Counter()
+
+    def _call(self, name: str) -> None:
+        self.calls[name] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+
+class FakeKinesisVideo(FakeClient):
+    """
+    :param `streams` dictionary of stream name to (producer bytes, consumer bytes) of the last minute
+    """
+
+    def __init__(self, streams: dict, latency: float = 0.0, page_size: int = 100):
+        super().__init__(latency)
+        self.streams = streams
+        self.page_size = page_size
+
+    def list_streams(self, NextToken: str = None, **kwargs):
+        self._call('list_streams')
+        names = sorted(self.streams)
+        start = int(NextToken) if NextToken else 0
+        resp = {"StreamInfoList": [{"StreamName": name} for name in names[start:start + self.page_size]]}
+        if start + self.page_size < len(names):
+            resp["NextToken"] = str(start + self.page_size)
+        return resp
+
+
+class FakeCloudWatch(FakeClient):
+    def __init__(self, streams: dict, latency: float = 0.0, clock: Callable[[], float] = time.time):
+        super().__init__(latency)
+        self.streams = streams
+        self.clock = clock
+
+    def now(self) -> datetime:
+        return datetime.fromtimestamp(self.clock(), timezone.utc)
+
+    def get_metric_data(self, MetricDataQueries, **kwargs):
+        self._call('get_metric_data')
+        assert len(MetricDataQueries) <= 500
+        results = []
+        for query in MetricDataQueries:
+            metric = query["MetricStat"]["Metric"]
+            producer, consumer = self.streams.get(metric["Dimensions"][0]["Value"], (0, 0))
+            value = producer if metric["MetricName"] == 'PutMedia.IncomingBytes' else consumer
+            results.append({
+                "Id": query["Id"], "StatusCode": "Complete",
+                "Values": [value] if value else [], "Timestamps": [self.now()] if value else []
+            })
+        return {"MetricDataResults": results, "Messages": []}
+
+
+class FakeDynamoDB(FakeClient):
+    """
+    Mapping table holding its items as DynamoDB attribute dictionaries, keyed by cameraId
+    """
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__(latency)
+        self.items = {}
+
+    def set_worker(self, camera_id: str, worker: str) -> None:
+        self.items[camera_id] = {'cameraId': {'S': camera_id}, 'currentWorker': {'S': worker}}
+
+    def worker(self, camera_id: str) -> str:
+        item = self.items.get(camera_id)
+        return item['currentWorker']['S'] if item else 'NoWorker'
+
+    def get_item(self, TableName, Key):
+        self._call('get_item')
+        item = self.items.get(Key['cameraId']['S'])
+        return {"Item": item} if item else {}
+
+    def put_item(self, TableName, Item):
+        self._call('put_item')
+        self.items[Item['cameraId']['S']] = Item
+
+    def batch_get_item(self, RequestItems):
+        self._call('batch_get_item')
+        (table, request), = RequestItems.items()
+        assert len(request['Keys']) <= 100
+        found = [key['cameraId']['S'] for key in request['Keys'] if key['cameraId']['S'] in self.items]
+        return {"Responses": {table: [self.items[camera_id] for camera_id in found]}, "UnprocessedKeys": {}}
+
+    def batch_write_item(self, RequestItems):
+        self._call('batch_write_item')
+        (table, requests), = RequestItems.items()
+        assert len(requests) <= 25
+        for request in requests:
+            if 'PutRequest' in request:
+                item = request['PutRequest']['Item']
+                self.items[item['cameraId']['S']] = item
+            else:
+                self.items.pop(request['DeleteRequest']['Key']['cameraId']['S'], None)
+        return {"UnprocessedItems": {}}
+
+
+class FakeECS(FakeClient):
+    def __init__(self, latency: float = 0.0, clock: Callable[[], float] = time.time):
+        super().__init__(latency)
+        self.clock = clock
+        # Running task ARN to the streams of its CAMERA_NAME override
+        self.running = {}
+        self.created_at = {}
+        self._task_ids = itertools.count()
+
+    def run_task(self, count=1, overrides=None, **kwargs):
+        self._call('run_task')
+        streams = []
+        for container in (overrides or {}).get('containerOverrides', []):
+            for variable in container.get('environment', []):
+                if variable['name'] == 'CAMERA_NAME' and variable['value']:
+                    streams = variable['value'].split(',')
+        tasks = []
+        for _ in range(count):
+            task_arn = f'arn:aws:ecs:us-east-1:123456789012:task/parser/{next(self._task_ids)}'
+            self.running[task_arn] = streams
+            self.created_at[task_arn] = self.clock()
+            tasks.append({"taskArn": task_arn, "lastStatus": "PROVISIONING"})
+        return {"tasks": tasks, "failures": []}
+
+    def stop_task(self, task, **kwargs):
+        self._call('stop_task')
+        self.running.pop(task, None)
+        return {"task": {"taskArn": task, "desiredStatus": "STOPPED"}}
+
+    def describe_tasks(self, tasks, **kwargs):
+        self._call('describe_tasks')
+        assert len(tasks) <= 100
+        return {"tasks": [
+            {"taskArn": task, "lastStatus": "RUNNING" if task in self.running else "STOPPED",
+             "desiredStatus": "RUNNING" if task in self.running else "STOPPED",
+             "createdAt": datetime.fromtimestamp(self.created_at.get(task, self.clock()), timezone.utc)}
+            for task in tasks
+        ]}
@@ -0,0 +1,30 @@
+import importlib
+import os
+import timeit
+from typing import Callable, Dict
+
+AUTOSCALER_ENV = {
+    "FARGATE_CLUSTER_NAME": "parser-cluster",
+    "TASK_DEF_ARN": "arn:aws:ecs:us-east-1:123456789012:task-definition/parser:1",
+    "SUBNET_ONE": "subnet-1",
+    "SUBNET_TWO": "subnet-2",
+    "TASK_MAPPING_TABLE": "task-mapping",
+    "AWS_DEFAULT_REGION": "us-east-1",
+}
+
+
+def load_autoscaler():
+    """
+    Import the autoscaler module, whose file name is a Python keyword, with the environment it expects
+    """
+    for name, value in AUTOSCALER_ENV.items():
+        os.environ.setdefault(name, value)
+    return importlib.import_module('lambda')
+
+
+def measure(fn: Callable[[], object], number: int = 10, repeat: int = 5) -> Dict[str, float]:
+    """
+    Time a callable, returning the best and median duration of one call in milliseconds
+    """
+    runs = sorted(t / number * 1000 for t in timeit.repeat(fn, number=number, repeat=repeat))
+    return {"best_ms": round(runs[0], 3), "median_ms": round(runs[len(runs) // 2], 3)}
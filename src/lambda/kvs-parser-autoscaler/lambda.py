@@ -1,7 +1,12 @@
+from collections import namedtuple
 from datetime import datetime, timedelta
 import os
+import time
 import boto3
 
+from placement import Plan, plan_placement
+from warm_pool import POOL_KEY, WarmPool, worker_key
+
 ecs = boto3.client('ecs')
 cw = boto3.client('cloudwatch')
 kvs = boto3.client('kinesisvideo')
@@ -12,41 +17,99 @@ fargate_task_def_arn = os.environ["TASK_DEF_ARN"]
 subnet1 = os.environ["SUBNET_ONE"]
 subnet2 = os.environ["SUBNET_TWO"]
 ddb_table = os.environ["TASK_MAPPING_TABLE"]
+container_name = os.environ.get("CONTAINER_NAME", "kvs-parse-frame")
+# "single" runs one parser task per stream, "binpack" packs several streams per task by bitrate
+placement_mode = os.environ.get("PLACEMENT_MODE", "single")
+task_capacity = float(os.environ.get("TASK_CAPACITY_MBPS", "4")) * 1000000 / 8
+task_max_streams = int(os.environ.get("TASK_MAX_STREAMS", "10"))
+placement_hysteresis = float(os.environ.get("PLACEMENT_HYSTERESIS", "0.2"))
+# Tasks are merged to save cost once they ran this long, merging restarts their live streams
+merge_min_age = float(os.environ.get("MERGE_MIN_AGE_MINUTES", "60")) * 60
+# Keep idle parser tasks that take streams as soon as their assignment is written to the mapping table
+warm_pool_enabled = os.environ.get("WARM_POOL", "false") == "true"
+warm_pool_min = int(os.environ.get("WARM_POOL_MIN", "1"))
+warm_pool_max = int(os.environ.get("WARM_POOL_MAX", "10"))
+warm_pool_window = float(os.environ.get("WARM_POOL_WINDOW_MINUTES", "30")) * 60
+warm_pool_lead_time = float(os.environ.get("WARM_POOL_LEAD_MINUTES", "4")) * 60
+
+# Service limits of one request
+MAX_METRIC_QUERIES = 500
+MAX_BATCH_GET_KEYS = 100
+MAX_BATCH_WRITE_ITEMS = 25
+MAX_UNPROCESSED_RETRIES = 5
+MAX_RUN_TASK_COUNT = 10
+MAX_DESCRIBE_TASKS = 100
+
+# Metrics of one stream over the last minute, `since` is the epoch milliseconds of the producer datapoint
+StreamMetrics = namedtuple('StreamMetrics', ['producer', 'consumer', 'rate', 'since'])
+# Changes of one run to write to the mapping table, recorded as each ECS call succeeds: task mappings by stream,
+# warm pool assignments by task and stopped tasks
+Changes = namedtuple('Changes', ['updates', 'worker_rows', 'stopped'])
 
 
 def list_kvs_streams():
-    kvs_resp = kvs.list_streams()
-    return kvs_resp["StreamInfoList"]
+    streams = []
+    kwargs = {}
+    while True:
+        kvs_resp = kvs.list_streams(**kwargs)
+        streams.extend(kvs_resp["StreamInfoList"])
+        if not kvs_resp.get("NextToken"):
+            return streams
+        kwargs["NextToken"] = kvs_resp["NextToken"]
 
 
-def check_task_mapping(camera_id):
-    task_mapping_resp: dict = ddb.get_item(
-        TableName=ddb_table,
-        Key={
-            'cameraId': {
-                'S': camera_id
+def check_task_mappings(camera_ids):
+    """
+    Read the workers of several cameras with BatchGetItem, cameras without a mapping get 'NoWorker'
+    """
+    mappings = {camera_id: 'NoWorker' for camera_id in camera_ids}
+    for start in range(0, len(camera_ids), MAX_BATCH_GET_KEYS):
+        request = {
+            ddb_table: {
+                'Keys': [{'cameraId': {'S': camera_id}} for camera_id in camera_ids[start:start + MAX_BATCH_GET_KEYS]],
+                'ProjectionExpression': 'cameraId, currentWorker'
             }
         }
-    )
-    if 'Item' in task_mapping_resp:
-        currentWorker = task_mapping_resp['Item']['currentWorker']['S']
-    else:
-        return 'NoWorker'
-    return currentWorker
+        for attempt in range(MAX_UNPROCESSED_RETRIES + 1):
+            batch_resp = ddb.batch_get_item(RequestItems=request)
+            for item in batch_resp["Responses"].get(ddb_table, []):
+                mappings[item['cameraId']['S']] = item['currentWorker']['S']
+            request = batch_resp.get("UnprocessedKeys")
+            if not request:
+                break
+            time.sleep(0.05 * 2 ** attempt)
+        else:
+            raise Exception(f"DynamoDB did not return the mappings of {len(request[ddb_table]['Keys'])} cameras")
+    return mappings
 
 
-def update_task_mapping(camera_id, task_id):
-    ddb.put_item(
-        TableName=ddb_table,
-        Item={
-            'cameraId': {
-                'S': camera_id
-            },
-            'currentWorker': {
-                'S': task_id
-            }
-        }
-    )
+def update_task_mappings(mappings, worker_rows=None, stopped_workers=()):
+    """
+    Write the workers of several cameras with BatchWriteItem
+    :param `worker_rows` streams, with the epoch milliseconds their video started, assigned to warm pool tasks
+    :param `stopped_workers` tasks whose warm pool assignment row is deleted
+    """
+    requests = [
+        {'PutRequest': {'Item': {'cameraId': {'S': camera_id}, 'currentWorker': {'S': task_id}}}}
+        for camera_id, task_id in mappings.items()
+    ]
+    for task_arn, started_at in (worker_rows or {}).items():
+        requests.append({'PutRequest': {'Item': {
+            'cameraId': {'S': worker_key(task_arn)},
+            'currentWorker': {'S': task_arn},
+            'streams': {'M': {camera_id: {'N': str(started)} for camera_id, started in started_at.items()}}
+        }}})
+    for task_arn in stopped_workers:
+        requests.append({'DeleteRequest': {'Key': {'cameraId': {'S': worker_key(task_arn)}}}})
+    for start in range(0, len(requests), MAX_BATCH_WRITE_ITEMS):
+        request = {ddb_table: requests[start:start + MAX_BATCH_WRITE_ITEMS]}
+        for attempt in range(MAX_UNPROCESSED_RETRIES + 1):
+            request = ddb.batch_write_item(RequestItems=request).get("UnprocessedItems")
+            if not request:
+                break
+            time.sleep(0.05 * 2 ** attempt)
+        else:
+            raise Exception(f"DynamoDB did not write the mappings of {len(request[ddb_table])} cameras")
 
 
 # def list_ecs_task():
@@ -58,10 +121,10 @@ def update_task_mapping(camera_id, task_id):
 #     return task_status_resp['taskArns']
 
 
-def start_ecs_task():
+def run_parser_tasks(count, environment):
     start_task_resp = ecs.run_task(
         launchType='FARGATE',
-        count=1,
+        count=count,
         cluster=fargate_cluster_name,
         networkConfiguration={
             'awsvpcConfiguration': {
@@ -71,17 +134,108 @@ def start_ecs_task():
                 ]
             }
         },
-        taskDefinition=fargate_task_def_arn
+        taskDefinition=fargate_task_def_arn,
+        overrides={
+            'containerOverrides': [{
+                'name': container_name,
+                'environment': [{'name': name, 'value': value} for name, value in environment.items()]
+            }]
+        }
     )
+    return start_task_resp["tasks"]
 
-    task_status = start_task_resp["tasks"][0]["lastStatus"]
+
+def start_ecs_task(camera_ids, started_at=None):
+    # The parser consumes the comma separated streams of CAMERA_NAME
+    environment = {'CAMERA_NAME': ','.join(camera_ids)}
+    if started_at:
+        environment['CAMERA_STARTED_AT'] = ','.join(str(started) for started in started_at)
+    tasks = run_parser_tasks(1, environment)
+
+    task_status = tasks[0]["lastStatus"]
     if task_status == 'PENDING' or 'PROVISIONING':
         print("Launched 1 fargate task")
-        return start_task_resp["tasks"][0]["taskArn"]
+        return tasks[0]["taskArn"]
     else:
         print(f"Launch task failed, current task state: {task_status}")
 
 
+def start_pool_tasks(pool, count):
+    """
+    Launch idle tasks that wait for their streams in the mapping table, without waiting for them to run
+    Each batch of tasks joins the pool as soon as it is launched
+    :returns: ARNs of the launched tasks
+    """
+    task_arns = []
+    while len(task_arns) < count:
+        tasks = run_parser_tasks(min(count - len(task_arns), MAX_RUN_TASK_COUNT), {'WARM_POOL_TABLE': ddb_table})
+        if not tasks:
+            break
+        pool.add([task["taskArn"] for task in tasks])
+        task_arns.extend(task["taskArn"] for task in tasks)
+    print(f"Launched {len(task_arns)} warm pool fargate tasks")
+    return task_arns
+
+
+def running_ecs_tasks(task_arns):
+    running = set()
+    for start in range(0, len(task_arns), MAX_DESCRIBE_TASKS):
+        describe_resp = ecs.describe_tasks(cluster=fargate_cluster_name, tasks=task_arns[start:start + MAX_DESCRIBE_TASKS])
+        running.update(
+            task["taskArn"] for task in describe_resp["tasks"]
+            if task["lastStatus"] != "STOPPED" and task.get("desiredStatus") != "STOPPED"
+        )
+    return running
+
+
+def ecs_task_ages(task_arns):
+    """
+    Seconds since the creation of the tasks that still run, stopped tasks are left out
+    """
+    now = time.time()
+    ages = {}
+    for start in range(0, len(task_arns), MAX_DESCRIBE_TASKS):
+        describe_resp = ecs.describe_tasks(cluster=fargate_cluster_name, tasks=task_arns[start:start + MAX_DESCRIBE_TASKS])
+        for task in describe_resp["tasks"]:
+            if task["lastStatus"] != "STOPPED" and task.get("desiredStatus") != "STOPPED" and task.get("createdAt"):
+                ages[task["taskArn"]] = now - task["createdAt"].timestamp()
+    return ages
+
+
+def read_warm_pool():
+    """
+    Read the idle tasks and recent starts of the warm pool, forgetting idle tasks that stopped
+    """
+    pool_resp = ddb.get_item(TableName=ddb_table, Key={'cameraId': {'S': POOL_KEY}})
+    pool = WarmPool.from_item(
+        pool_resp.get('Item'), min_size=warm_pool_min, max_size=warm_pool_max,
+        window=warm_pool_window, lead_time=warm_pool_lead_time)
+    gone = pool.retain(running_ecs_tasks(pool.idle))
+    if gone:
+        print(f"Removed {len(gone)} stopped tasks from the warm pool")
+    return pool
+
+
+def refill_warm_pool(pool, stopped):
+    """
+    Stop the idle tasks over the target size of the pool or launch the missing ones
+    :param `stopped` list the tasks are appended to as they stop
+    """
+    now = time.time()
+    surplus = pool.trim(now)
+    try:
+        while surplus:
+            stop_ecs_task(surplus[0])
+            stopped.append(surplus.pop(0))
+        deficit = pool.deficit(now)
+        if deficit:
+            start_pool_tasks(pool, deficit)
+    finally:
+        # Tasks left running by a failed call stay in the pool, the next run stops them
+        pool.add(surplus)
+    print(f"Warm pool holds {len(pool.idle)} idle tasks, target {pool.target_size(now)}")
+
+
 def stop_ecs_task(task_arn):
     stop_task_response = ecs.stop_task(
         cluster=fargate_cluster_name,
@@ -95,111 +249,180 @@ def stop_ecs_task(task_arn):
         print(f"Stop task failed, desired task status: {desired_status}")
 
 
-def check_kvs_metric(stream_name):
-    producerByteCount = None
-    consumerByteCount = None
-    three_min_ago = datetime.utcnow() - timedelta(minutes=2)
-    one_min_ago = datetime.utcnow() - timedelta(minutes=1)
-    cw_response = cw.get_metric_data(
-        MetricDataQueries=[
-            {
-                'Id': 'kvsProducerByte',
-                'MetricStat': {
-                    'Metric': {
-                        'Namespace': 'AWS/KinesisVideo',
-                        'MetricName': 'PutMedia.IncomingBytes',
-                        'Dimensions': [
-                            {
-                                'Name': 'StreamName',
-                                'Value': stream_name
-                            },
-                        ]
-                    },
-                    'Period': 60,
-                    'Stat': 'Minimum',
-                    'Unit': 'Bytes'
-                },
-                'Label': 'KvsProducerByte',
-                'ReturnData': True,
-                # 'Period': 60
-            },
-            {
-                'Id': 'kvsConsumerByte',
-                'MetricStat': {
-                    'Metric': {
-                        'Namespace': 'AWS/KinesisVideo',
-                        'MetricName': 'GetMedia.OutgoingBytes',
-                        'Dimensions': [
-                            {
-                                'Name': 'StreamName',
-                                'Value': stream_name
-                            },
-                        ]
+def metric_query(query_id, metric_name, stream_name, stat='Minimum'):
+    return {
+        'Id': query_id,
+        'MetricStat': {
+            'Metric': {
+                'Namespace': 'AWS/KinesisVideo',
+                'MetricName': metric_name,
+                'Dimensions': [
+                    {
+                        'Name': 'StreamName',
+                        'Value': stream_name
                     },
-                    'Period': 60,
-                    'Stat': 'Minimum',
-                    'Unit': 'Bytes'
-                },
-                'Label': 'KvsConsumerByte',
-                'ReturnData': True,
-                # 'Period': 60
+                ]
             },
-        ],
-        StartTime=three_min_ago,
-        EndTime=one_min_ago,
-        ScanBy='TimestampDescending',
-        MaxDatapoints=3
-    )
+            'Period': 60,
+            'Stat': stat,
+            'Unit': 'Bytes'
+        },
+        'ReturnData': True,
+    }
+
+
+def check_kvs_metrics(stream_names, bitrate=False):
+    """
+    Read the producer and consumer byte counts of all streams, packing up to 500 queries in each GetMetricData request
+    :param `bitrate` also read the incoming bytes per second of the last minute, None otherwise
+    :returns: dictionary of stream name to `StreamMetrics`
+    """
+    queries = []
+    for idx, stream_name in enumerate(stream_names):
+        queries.append(metric_query(f'p{idx}', 'PutMedia.IncomingBytes', stream_name))
+        queries.append(metric_query(f'c{idx}', 'GetMedia.OutgoingBytes', stream_name))
+        if bitrate:
+            queries.append(metric_query(f'b{idx}', 'PutMedia.IncomingBytes', stream_name, stat='Sum'))
+
+    three_min_ago = datetime.utcnow() - timedelta(minutes=2)
+    one_min_ago = datetime.utcnow() - timedelta(minutes=1)
+    values = {}
+    timestamps = {}
+    for start in range(0, len(queries), MAX_METRIC_QUERIES):
+        kwargs = {}
+        while True:
+            cw_response = cw.get_metric_data(
+                MetricDataQueries=queries[start:start + MAX_METRIC_QUERIES],
+                StartTime=three_min_ago,
+                EndTime=one_min_ago,
+                ScanBy='TimestampDescending',
+                **kwargs
+            )
+            for message in cw_response.get("Messages", []):
+                if message["Code"] != "200":
+                    raise Exception(f"CloudWatch Error: {message['Value']}")
+            for metric in cw_response["MetricDataResults"]:
+                if metric["StatusCode"] == "InternalError":
+                    raise Exception(f"CloudWatch Error: {metric['Messages'][0]['Value']}")
+                # Pages continue the values of the same queries, newest first
+                values.setdefault(metric["Id"], []).extend(metric["Values"])
+                timestamps.setdefault(metric["Id"], []).extend(metric.get("Timestamps", []))
+            if not cw_response.get("NextToken"):
+                break
+            kwargs["NextToken"] = cw_response["NextToken"]
 
-    if len(cw_response["Messages"]) != 0:
-        cwStatusCode = cw_response["Messages"][0]["Code"]
-        cwErrMsg = cw_response["Messages"][0]["Value"]
-        if cwStatusCode != "200":
-            raise(f"CloudWatch Error: {cwErrMsg}")
-
-    for metric in cw_response["MetricDataResults"]:
-        if metric["Id"] == 'kvsProducerByte':
-            if metric["StatusCode"] != "InternalError":
-                if len(metric["Values"]) == 0:
-                    producerByteCount = 0
-                else:
-                    producerByteCount = metric["Values"][0]
-                print(f"KVS Producer Byte Count: {producerByteCount} for stream {stream_name}")
-            else:
-                cwErrMsg = metric["Messages"][0]["Value"]
-                raise(f"CloudWatch Error: {cwErrMsg}")
-        if metric["Id"] == 'kvsConsumerByte':
-            if metric["StatusCode"] != "InternalError":
-                if len(metric["Values"]) == 0:
-                    consumerByteCount = 0
-                else:
-                    consumerByteCount = metric["Values"][0]
-                print(f"KVS Consumer Byte Count: {consumerByteCount} for stream {stream_name}")
-            else:
-                cwErrMsg = metric["Messages"][0]["Value"]
-                raise(f"CloudWatch Error: {cwErrMsg}")
-    return producerByteCount, consumerByteCount
+    def latest(query_id):
+        # None when CloudWatch did not answer the query, 0 when the stream had no datapoint
+        if query_id not in values:
+            return None
+        return values[query_id][0] if values[query_id] else 0
+
+    def rate(query_id):
+        total = latest(query_id)
+        return total / 60 if total is not None else None
+
+    def since(query_id):
+        # Start of the minute the producer bytes were counted in, the earliest known time of the video
+        if not timestamps.get(query_id):
+            return int(time.time() * 1000)
+        return int(timestamps[query_id][0].timestamp() * 1000)
+
+    return {
+        stream_name: StreamMetrics(
+            latest(f'p{idx}'), latest(f'c{idx}'), rate(f'b{idx}') if bitrate else None, since(f'p{idx}'))
+        for idx, stream_name in enumerate(stream_names)
+    }
+
+
+def single_plan(stream_names, metrics, workers):
+    """
+    One parser task per stream: start a task when there is video in and no worker, stop it when no video in
+    """
+    launch, stop, release = [], [], []
+    for stream_name in stream_names:
+        current_worker = workers[stream_name]
+        ## Start Fargate task if there is video in and no worker present
+        if metrics[stream_name].producer > 0 and metrics[stream_name].consumer == 0:
+            if current_worker == "NoWorker":
+                launch.append([stream_name])
+        ## Stop corresponding Fargate task if no video in
+        if metrics[stream_name].producer == 0:
+            if current_worker != "NoWorker":
+                if current_worker not in stop:
+                    stop.append(current_worker)
+                release.append(stream_name)
+    return Plan(launch, stop, release)
+
+
+def binpack_plan(stream_names, metrics, workers):
+    """
+    Bin-pack the streams with video in onto parser tasks, see `placement.plan_placement`
+    Like in single mode, a stream without a worker is only launched while nothing consumes it
+    """
+    current = {stream_name: worker for stream_name, worker in workers.items() if worker != "NoWorker"}
+    rates = {
+        stream_name: metrics[stream_name].rate or 0
+        for stream_name in stream_names
+        if metrics[stream_name].producer > 0 and (stream_name in current or metrics[stream_name].consumer == 0)
+    }
+    ages = ecs_task_ages(sorted(set(current.values()))) if merge_min_age > 0 and current else {}
+    plan = plan_placement(rates, current, task_capacity, task_max_streams, placement_hysteresis, ages, merge_min_age)
+    running = len(set(current.values())) - len(plan.stop) + len(plan.launch)
+    print(f"Placed {len(rates)} streams with video in on {running} tasks, "
+          f"launching {len(plan.launch)} and stopping {len(plan.stop)} tasks")
+    return plan
+
+
+def apply_plan(plan, metrics, changes, pool=None):
+    """
+    Stop and launch parser tasks, handing streams to idle warm pool tasks when there are some
+    :param `changes` `Changes` each stop and launch is recorded in as soon as it succeeds, so that the tasks of
+        a run that fails half way are still written to the mapping table
+    """
+    for task_arn in plan.stop:
+        stop_ecs_task(task_arn)
+        changes.stopped.append(task_arn)
+    for stream_name in plan.release:
+        changes.updates[stream_name] = "NoWorker"
+    for camera_ids in plan.launch:
+        started_at = {stream_name: metrics[stream_name].since for stream_name in camera_ids}
+        task_arn = pool.take() if pool else None
+        if task_arn:
+            changes.worker_rows[task_arn] = started_at
+            print(f"Assigned {len(camera_ids)} streams to warm pool task {task_arn}")
+        else:
+            task_arn = start_ecs_task(camera_ids, [started_at[stream_name] for stream_name in camera_ids])
+        if pool:
+            pool.record_start(time.time())
+        for stream_name in camera_ids:
+            changes.updates[stream_name] = task_arn if task_arn else "NoWorker"
 
 
 def handler(event, context):
     if subnet1 == '' or subnet2 == '':
         raise Exception("Not enough subnets specified, exiting")
-    for kvs_stream in list_kvs_streams():
-        stream_name = kvs_stream["StreamName"]
-        producerByteCount, consumerByteCount = check_kvs_metric(
-            stream_name)
-        if producerByteCount is not None and consumerByteCount is not None:
-            ## Start Fargate task if there is video in and no worker present
-            if producerByteCount > 0 and consumerByteCount == 0:
-                current_worker = check_task_mapping(stream_name)
-                if current_worker == "NoWorker":
-                    current_worker = start_ecs_task()
-                    update_task_mapping(stream_name, current_worker)
-            ## Stop corresponding Fargate task if no video in
-            if producerByteCount == 0:
-                current_worker = check_task_mapping(stream_name)
-                if current_worker != "NoWorker":
-                    stop_ecs_task(current_worker)
-                    update_task_mapping(stream_name, "NoWorker")
-        else:
-            raise("Error comparing metrics")
+    stream_names = [kvs_stream["StreamName"] for kvs_stream in list_kvs_streams()]
+    metrics = check_kvs_metrics(stream_names, bitrate=placement_mode == "binpack")
+    workers = check_task_mappings(stream_names)
+    for stream_name in stream_names:
+        producerByteCount, consumerByteCount = metrics[stream_name].producer, metrics[stream_name].consumer
+        if producerByteCount is None or consumerByteCount is None:
+            raise Exception(f"Error comparing metrics of stream {stream_name}")
+        print(f"KVS Producer Byte Count: {producerByteCount}, Consumer Byte Count: {consumerByteCount} for stream {stream_name}")
+    if placement_mode == "binpack":
+        plan = binpack_plan(stream_names, metrics, workers)
+    else:
+        plan = single_plan(stream_names, metrics, workers)
+    pool = read_warm_pool() if warm_pool_enabled else None
+    changes = Changes({}, {}, [])
+    try:
+        apply_plan(plan, metrics, changes, pool)
+        # Streams are served first, the pool is refilled with what is left of the run
+        if pool:
+            refill_warm_pool(pool, changes.stopped)
+    finally:
+        # Written even when an ECS call failed, a launched task the table does not know would never be stopped
+        update_task_mappings(changes.updates, changes.worker_rows, changes.stopped)
+        if pool:
+            ddb.put_item(TableName=ddb_table, Item=pool.to_item())
+    print(f"Checked {len(stream_names)} streams, updated {len(changes.updates)} task mappings")
@@ -0,0 +1,92 @@
+from typing import Dict, List, NamedTuple, Optional
+
+
+class Plan(NamedTuple):
+    # Stream sets of the parser tasks to launch
+    launch: List[List[str]]
+    # Parser tasks to stop
+    stop: List[str]
+    # Streams left without a worker by the stopped tasks
+    release: List[str]
+
+
+def first_fit_decreasing(streams, rates, capacity, max_streams):
+    """
+    Pack streams into as few bins as possible, largest bitrate first, a stream larger than the capacity gets its own bin
+    """
+    bins = []
+    for stream in sorted(streams, key=lambda name: (-rates[name], name)):
+        for packed in bins:
+            if packed[0] + rates[stream] <= capacity and len(packed[1]) < max_streams:
+                packed[0] += rates[stream]
+                packed[1].append(stream)
+                break
+        else:
+            bins.append([rates[stream], [stream]])
+    return [sorted(packed[1]) for packed in bins]
+
+
+def plan_placement(rates: Dict[str, float], workers: Dict[str, str], capacity: float,
+                   max_streams: int = 10, hysteresis: float = 0.2, ages: Optional[Dict[str, float]] = None,
+                   min_merge_age: float = 0.0) -> Plan:
+    """
+    Bin-pack the streams with video in onto parser tasks.
+    A task reads its streams once at launch, so moving a stream means replacing the tasks involved.
+    To avoid restarting tasks on every bitrate wobble, a task is only split once it exceeds the capacity by
+    `hysteresis`, and tasks are only merged while the merged task stays `hysteresis` under the capacity.
+    Merging restarts live streams to save money only, so it is limited to tasks that ran for `min_merge_age`
+    and done only when it stops at least one task more than it launches.
+    :param `rates` bitrate in bytes per second of every stream with video in
+    :param `workers` current task of every stream that has one
+    :param `capacity` bitrate in bytes per second one task can parse
+    :param `max_streams` largest number of streams on one task
+    :param `hysteresis` fraction of the capacity between the split and merge thresholds
+    :param `ages` seconds every task has been running, tasks missing from it are too young to merge
+    :param `min_merge_age` seconds a task runs before it may be merged, `ages` is not needed when 0
+    """
+    tasks: Dict[str, List[str]] = {}
+    for stream, task in workers.items():
+        tasks.setdefault(task, []).append(stream)
+
+    launch, stop, release = [], [], []
+    unplaced = [stream for stream in rates if stream not in workers]
+    kept = []
+    for task, streams in sorted(tasks.items()):
+        live = [stream for stream in streams if stream in rates]
+        load = sum(rates[stream] for stream in live)
+        if not live:
+            stop.append(task)
+            release.extend(streams)
+        elif len(live) > 1 and (load > capacity * (1 + hysteresis) or len(live) > max_streams):
+            # Offline streams of a task that is replaced are not relaunched
+            stop.append(task)
+            release.extend(stream for stream in streams if stream not in rates)
+            unplaced.extend(live)
+        else:
+            # Offline streams stay on a running task, which resumes them when their video comes back
+            kept.append((load, task, streams, live))
+
+    # Merge the tasks old enough with the fewest live streams to restart, least loaded first, while the merged task
+    # stays under the low watermark
+    mergeable = [
+        kept_task for kept_task in kept
+        if min_merge_age <= 0 or (ages or {}).get(kept_task[1], 0.0) >= min_merge_age
+    ]
+    group, group_load, group_streams = [], 0.0, 0
+    for load, task, streams, live in sorted(mergeable, key=lambda kept_task: (len(kept_task[3]), kept_task[0])):
+        if group_load + load > capacity * (1 - hysteresis) or group_streams + len(live) > max_streams:
+            break
+        group.append((task, streams, live))
+        group_load += load
+        group_streams += len(live)
+    # The group is replaced by one task, which only saves a task when the group holds two or more
+    if len(group) > 1:
+        merged = []
+        for task, streams, live in group:
+            stop.append(task)
+            release.extend(stream for stream in streams if stream not in rates)
+            merged.extend(live)
+        launch.append(sorted(merged))
+
+    launch.extend(first_fit_decreasing(unplaced, rates, capacity, max_streams))
+    return Plan(launch, stop, release)
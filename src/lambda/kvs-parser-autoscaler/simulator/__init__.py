@@ -0,0 +1,4 @@
+"""
+Offline replay of per-stream KVS byte traces through the autoscaler handler, with in-process fakes for
+KVS, CloudWatch, DynamoDB and ECS and a simulated clock. See `python -m simulator --help`.
+"""
@@ -0,0 +1,51 @@
+"""
+Usage:
+  python -m simulator [--trace trace.csv | --streams 100 --hours 6 --seed 7] [--policy binpack ...]
+                      [--period 120] [--provisioning-delay 90] [--set task_max_streams=5 ...]
+"""
+import argparse
+import json
+
+from simulator.replay import POLICIES, Simulation
+from simulator.traces import Trace, synthetic_trace
+
+
+def parse_setting(text: str):
+    name, value = text.split('=', 1)
+    for cast in (int, float):
+        try:
+            return name, cast(value)
+        except ValueError:
+            pass
+    return name, {'true': True, 'false': False}.get(value, value)
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m simulator', description='Replay KVS byte traces through the autoscaler')
+    parser.add_argument('--trace', help='CSV of minute,stream,producer_bytes rows, a synthetic fleet otherwise')
+    parser.add_argument('--streams', type=int, default=100, help='cameras of the synthetic fleet')
+    parser.add_argument('--hours', type=float, default=6, help='length of the synthetic trace')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--save-trace', help='write the replayed trace to this CSV')
+    parser.add_argument('--policy', action='append', choices=sorted(POLICIES),
+                        help='policies to compare, all of them by default')
+    parser.add_argument('--period', type=int, default=120, help='seconds between autoscaler runs')
+    parser.add_argument('--provisioning-delay', type=float, default=90,
+                        help='seconds between RunTask and the parser consuming its streams')
+    parser.add_argument('--set', action='append', type=parse_setting, default=[], metavar='NAME=VALUE',
+                        help='module setting of the autoscaler, e.g. task_capacity=1000000')
+    args = parser.parse_args()
+
+    trace = Trace.from_csv(args.trace) if args.trace else synthetic_trace(args.streams, args.hours, args.seed)
+    if args.save_trace:
+        trace.to_csv(args.save_trace)
+    reports = [
+        Simulation(trace, policy, period=args.period, provisioning_delay=args.provisioning_delay,
+                   settings=dict(args.set)).run()
+        for policy in args.policy or list(POLICIES)
+    ]
+    print(json.dumps({"streams": len(trace.streams), "minutes": trace.minutes, "reports": reports}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+import contextlib
+import io
+from typing import Callable, Dict, List, Optional
+
+from benchmark.fakes import FakeCloudWatch, FakeDynamoDB, FakeECS, FakeKinesisVideo
+from benchmark.timing import load_autoscaler
+from simulator.traces import Trace
+from warm_pool import worker_key
+
+# Module settings of the autoscaler for each policy, on top of its defaults
+POLICIES = {
+    'single': {'placement_mode': 'single', 'warm_pool_enabled': False},
+    'binpack': {'placement_mode': 'binpack', 'warm_pool_enabled': False},
+    'single+pool': {'placement_mode': 'single', 'warm_pool_enabled': True},
+    'binpack+pool': {'placement_mode': 'binpack', 'warm_pool_enabled': True},
+}
+
+
+def percentile(values: List[float], fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+class SimulatedTime:
+    """
+    Stand-in for the `time` module of the autoscaler, backoff sleeps return at once
+    """
+
+    def __init__(self):
+        self.now = 0.0
+
+    def time(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        pass
+
+
+class SimulatedECS(FakeECS):
+    """
+    ECS cluster whose tasks take `provisioning_delay` seconds to run after RunTask
+    """
+
+    def __init__(self, clock: Callable[[], float], provisioning_delay: float):
+        super().__init__(clock=clock)
+        self.provisioning_delay = provisioning_delay
+        self.launched_at: Dict[str, float] = {}
+        self.stopped_at: Dict[str, float] = {}
+
+    def run_task(self, count=1, overrides=None, **kwargs):
+        resp = super().run_task(count=count, overrides=overrides, **kwargs)
+        for task in resp["tasks"]:
+            self.launched_at[task["taskArn"]] = self.clock()
+        return resp
+
+    def stop_task(self, task, **kwargs):
+        if task in self.running:
+            self.stopped_at[task] = self.clock()
+        return super().stop_task(task, **kwargs)
+
+    def ready_at(self, task_arn: str) -> float:
+        return self.launched_at[task_arn] + self.provisioning_delay
+
+
+class Simulation:
+    """
+    Replay a trace through the autoscaler handler every `period` seconds.
+    A stream counts as consumed in a minute when one of the tasks it is assigned to runs during that minute,
+    and CloudWatch reports its GetMedia bytes accordingly, two minutes late like the handler reads them.
+    :param `policy` name of a policy of `POLICIES`
+    :param `provisioning_delay` seconds between RunTask and the parser consuming its streams
+    :param `poll_interval` seconds a warm pool task takes to notice its assignment
+    :param `short_lived` tasks stopped within this many seconds of their launch count as flapping
+    :param `settings` other module settings of the autoscaler, e.g. {'task_max_streams': 5}
+    """
+
+    def __init__(self, trace: Trace, policy: str = 'single', period: int = 120, provisioning_delay: float = 90,
+                 poll_interval: float = 2, short_lived: float = 600, settings: Optional[dict] = None):
+        self.trace = trace
+        self.policy = policy
+        self.period = period
+        self.provisioning_delay = provisioning_delay
+        self.poll_interval = poll_interval
+        self.short_lived = short_lived
+        self.settings = dict(POLICIES[policy], **(settings or {}))
+        self.clock = SimulatedTime()
+        # Per stream: [task, consuming since, consuming until or None] of every task it was assigned to
+        self.consumption: Dict[str, List[list]] = {stream: [] for stream in trace.streams}
+        self.served: Dict[str, set] = {stream: set() for stream in trace.streams}
+        self.live_restarts = 0
+        self.streams_without_worker: List[int] = []
+
+    def run(self) -> dict:
+        autoscaler = load_autoscaler()
+        patched = dict(self.settings, time=self.clock)
+        saved = {name: getattr(autoscaler, name) for name in list(patched) + ['kvs', 'cw', 'ddb', 'ecs']}
+        metric_streams = {}
+        self.kvs = autoscaler.kvs = FakeKinesisVideo(metric_streams)
+        self.cw = autoscaler.cw = FakeCloudWatch(metric_streams)
+        self.ddb = autoscaler.ddb = FakeDynamoDB()
+        self.ecs = autoscaler.ecs = SimulatedECS(self.clock.time, self.provisioning_delay)
+        for name, value in patched.items():
+            setattr(autoscaler, name, value)
+        try:
+            for minute in range(self.trace.minutes + 1):
+                now = minute * 60
+                self.clock.now = now
+                if minute >= 1:
+                    self._record_minute(minute - 1)
+                if now % self.period == 0 and minute >= 2:
+                    # The handler reads the datapoints of the minute that ended a minute ago
+                    window = minute - 2
+                    for stream in self.trace.streams:
+                        producer = self.trace.bytes_at(stream, window)
+                        metric_streams[stream] = (producer, producer if window in self.served[stream] else 0)
+                    self.cw.clock = lambda: window * 60
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        autoscaler.handler({}, None)
+                    self._sync_tasks(minute)
+                    self.streams_without_worker.append(sum(
+                        1 for stream in self.trace.streams
+                        if self.trace.bytes_at(stream, window) > 0 and self.ddb.worker(stream) == 'NoWorker'
+                    ))
+        finally:
+            for name, value in saved.items():
+                setattr(autoscaler, name, value)
+        return self.report()
+
+    def _sync_tasks(self, minute: int) -> None:
+        now = minute * 60
+        for stream, intervals in self.consumption.items():
+            for interval in intervals:
+                if interval[2] is None and interval[0] in self.ecs.stopped_at:
+                    interval[2] = self.ecs.stopped_at[interval[0]]
+                    # The stream still had video in when its task was stopped
+                    if self.trace.bytes_at(stream, minute) > 0:
+                        self.live_restarts += 1
+        assigned = {
+            (stream, interval[0]) for stream, intervals in self.consumption.items() for interval in intervals
+        }
+        for task_arn, streams in self.ecs.running.items():
+            since = self.ecs.ready_at(task_arn)
+            if not streams:
+                # Warm pool task, consuming once it runs and has polled its assignment
+                row = self.ddb.items.get(worker_key(task_arn))
+                streams = list(row['streams']['M']) if row else []
+                since = max(since, now + self.poll_interval)
+            for stream in streams:
+                if (stream, task_arn) not in assigned:
+                    self.consumption[stream].append([task_arn, since, None])
+
+    def _record_minute(self, minute: int) -> None:
+        start, end = minute * 60, (minute + 1) * 60
+        for stream in self.trace.streams:
+            if self.trace.bytes_at(stream, minute) <= 0:
+                continue
+            if any(since < end and (until is None or until > start) for _, since, until in self.consumption[stream]):
+                self.served[stream].add(minute)
+
+    def report(self) -> dict:
+        end = self.trace.minutes * 60
+        task_seconds = sum(
+            self.ecs.stopped_at.get(task_arn, end) - launched for task_arn, launched in self.ecs.launched_at.items())
+        short_lived = sum(
+            1 for task_arn, stopped in self.ecs.stopped_at.items()
+            if stopped - self.ecs.launched_at[task_arn] < self.short_lived)
+
+        lags = []
+        unserved_sessions = 0
+        video_minutes = unserved_minutes = 0
+        for stream in self.trace.streams:
+            for first, last in self.trace.sessions(stream):
+                start = first * 60
+                starts = [
+                    max(since, start) - start for _, since, until in self.consumption[stream]
+                    if since < last * 60 and (until is None or until > start)
+                ]
+                if starts:
+                    lags.append(min(starts))
+                else:
+                    unserved_sessions += 1
+                video_minutes += last - first
+                unserved_minutes += sum(1 for minute in range(first, last) if minute not in self.served[stream])
+
+        return {
+            "policy": self.policy,
+            "taskMinutes": round(task_seconds / 60, 1),
+            "peakTasks": self._peak_tasks(),
+            "taskLaunches": len(self.ecs.launched_at),
+            "scaleUpLagSecondsP50": percentile(lags, 0.5),
+            "scaleUpLagSecondsP95": percentile(lags, 0.95),
+            "scaleUpLagSecondsMax": max(lags) if lags else None,
+            "liveStreamRestarts": self.live_restarts,
+            "shortLivedTasks": short_lived,
+            "unservedSessions": unserved_sessions,
+            "unservedVideoMinutes": unserved_minutes,
+            "unservedVideoFraction": round(unserved_minutes / video_minutes, 4) if video_minutes else 0.0,
+            "maxStreamsWithoutWorker": max(self.streams_without_worker, default=0),
+        }
+
+    def _peak_tasks(self) -> int:
+        # Stops sort before launches of the same time
+        events = sorted(
+            [(launched, 1) for launched in self.ecs.launched_at.values()] +
+            [(stopped, -1) for stopped in self.ecs.stopped_at.values()])
+        peak = running = 0
+        for _, change in events:
+            running += change
+            peak = max(peak, running)
+        return peak
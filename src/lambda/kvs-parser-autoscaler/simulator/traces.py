@@ -0,0 +1,100 @@
+import csv
+import random
+from typing import Dict, List, Tuple
+
+
+class Trace:
+    """
+    Producer bytes of every stream, per minute of the trace
+    :param `producer` dictionary of stream name to dictionary of minute to PutMedia.IncomingBytes
+    :param `minutes` length of the trace, streams without bytes in a minute are offline
+    """
+
+    def __init__(self, producer: Dict[str, Dict[int, float]], minutes: int):
+        self.producer = producer
+        self.minutes = minutes
+
+    @property
+    def streams(self) -> List[str]:
+        return sorted(self.producer)
+
+    def bytes_at(self, stream: str, minute: int) -> float:
+        return self.producer[stream].get(minute, 0)
+
+    def sessions(self, stream: str) -> List[Tuple[int, int]]:
+        """
+        Minutes, end excluded, during which the stream had video in without interruption
+        """
+        sessions = []
+        start = None
+        for minute in range(self.minutes + 1):
+            live = minute < self.minutes and self.bytes_at(stream, minute) > 0
+            if live and start is None:
+                start = minute
+            elif not live and start is not None:
+                sessions.append((start, minute))
+                start = None
+        return sessions
+
+    @classmethod
+    def from_csv(cls, path: str) -> 'Trace':
+        """
+        Read a trace recorded as `minute,stream,producer_bytes` rows, e.g. exported from the
+        PutMedia.IncomingBytes Sum of each stream with a period of 60 seconds
+        """
+        producer: Dict[str, Dict[int, float]] = {}
+        minutes = 0
+        with open(path, newline='') as fd:
+            for row in csv.DictReader(fd):
+                minute = int(row['minute'])
+                producer.setdefault(row['stream'], {})[minute] = float(row['producer_bytes'])
+                minutes = max(minutes, minute + 1)
+        return cls(producer, minutes)
+
+    def to_csv(self, path: str) -> None:
+        with open(path, 'w', newline='') as fd:
+            writer = csv.writer(fd)
+            writer.writerow(['minute', 'stream', 'producer_bytes'])
+            for stream in self.streams:
+                for minute, value in sorted(self.producer[stream].items()):
+                    writer.writerow([minute, stream, int(value)])
+
+
+# Bitrates in Mbps of the cameras of a synthetic fleet: many low bitrate cameras, a few HD ones
+FLEET_BITRATES = [0.25, 0.5, 0.5, 1, 1, 1.5, 2, 4]
+
+
+def synthetic_trace(streams: int = 100, hours: float = 6, seed: int = 7, always_on: float = 0.3,
+                    mean_on_minutes: float = 45, mean_off_minutes: float = 30, jitter: float = 0.15) -> Trace:
+    """
+    Fleet of cameras alternating between sessions and pauses of exponentially distributed lengths
+    :param `always_on` fraction of the cameras streaming for the whole trace
+    :param `jitter` relative variation of the bitrate of a camera from one minute to the next
+    """
+    rng = random.Random(seed)
+    minutes = int(hours * 60)
+    producer: Dict[str, Dict[int, float]] = {}
+    for idx in range(streams):
+        name = f'camera-{idx:04d}'
+        per_minute = rng.choice(FLEET_BITRATES) * 1000000 / 8 * 60
+        producer[name] = {}
+        live = rng.random() < 0.5
+        if rng.random() < always_on:
+            changes = [minutes]
+            live = True
+        else:
+            changes = []
+            state = live
+            minute = 0.0
+            while minute < minutes:
+                minute += rng.expovariate(1 / (mean_on_minutes if state else mean_off_minutes))
+                changes.append(min(int(minute), minutes))
+                state = not state
+        minute = 0
+        for change in changes:
+            if live:
+                for current in range(minute, change):
+                    producer[name][current] = per_minute * rng.uniform(1 - jitter, 1 + jitter)
+            minute = change
+            live = not live
+    return Trace(producer, minutes)
@@ -0,0 +1,142 @@
+import contextlib
+import io
+
+import pytest
+
+from benchmark.fakes import FakeCloudWatch, FakeDynamoDB, FakeECS, FakeKinesisVideo
+from benchmark.timing import load_autoscaler
+
+
+class FailingECS(FakeECS):
+    """
+    ECS failing every RunTask call after the first `launches`
+    """
+
+    def __init__(self, launches):
+        super().__init__()
+        self.launches = launches
+
+    def run_task(self, **kwargs):
+        if self.calls['run_task'] >= self.launches:
+            raise Exception('RunTask throttled')
+        return super().run_task(**kwargs)
+
+
+@pytest.fixture
+def autoscaler(monkeypatch):
+    module = load_autoscaler()
+    streams = {}
+    monkeypatch.setattr(module, 'kvs', FakeKinesisVideo(streams))
+    monkeypatch.setattr(module, 'cw', FakeCloudWatch(streams))
+    monkeypatch.setattr(module, 'ddb', FakeDynamoDB())
+    monkeypatch.setattr(module, 'ecs', FakeECS())
+    module.streams = streams
+    yield module
+
+
+def test_tasks_launched_before_a_failure_are_recorded(autoscaler, monkeypatch):
+    autoscaler.streams.update({f'camera-{idx}': (1000, 0) for idx in range(3)})
+    monkeypatch.setattr(autoscaler, 'ecs', FailingECS(launches=1))
+
+    with pytest.raises(Exception, match='RunTask throttled'), contextlib.redirect_stdout(io.StringIO()):
+        autoscaler.handler({}, None)
+
+    # The task that runs is in the mapping table, the next run stops it when its stream ends
+    (task_arn, streams), = autoscaler.ecs.running.items()
+    assert autoscaler.ddb.worker(streams[0]) == task_arn
+    assert [autoscaler.ddb.worker(f'camera-{idx}') for idx in range(3)].count('NoWorker') == 2
+
+
+class UnprocessedDynamoDB(FakeDynamoDB):
+    """
+    DynamoDB leaving the last key of the first `throttled` BatchGetItem requests of several keys unprocessed
+    """
+
+    def __init__(self, throttled):
+        super().__init__()
+        self.throttled = throttled
+        self.requested = []
+
+    def batch_get_item(self, RequestItems):
+        (table, request), = RequestItems.items()
+        self.requested.append([key['cameraId']['S'] for key in request['Keys']])
+        if len(request['Keys']) < 2 or self.throttled == 0:
+            return super().batch_get_item(RequestItems)
+        self.throttled -= 1
+        resp = super().batch_get_item({table: dict(request, Keys=request['Keys'][:-1])})
+        resp["UnprocessedKeys"] = {table: dict(request, Keys=request['Keys'][-1:])}
+        return resp
+
+
+class RecordingDynamoDB(FakeDynamoDB):
+    def __init__(self):
+        super().__init__()
+        self.batch_sizes = []
+
+    def batch_write_item(self, RequestItems):
+        (table, requests), = RequestItems.items()
+        self.batch_sizes.append(len(requests))
+        return super().batch_write_item(RequestItems)
+
+
+class PagedCloudWatch(FakeCloudWatch):
+    """
+    CloudWatch answering each GetMetricData request in two pages, half of the queries each
+    """
+
+    def __init__(self, streams):
+        super().__init__(streams)
+        self.request_sizes = []
+
+    def get_metric_data(self, MetricDataQueries, NextToken=None, **kwargs):
+        if NextToken is None:
+            self.request_sizes.append(len(MetricDataQueries))
+        resp = super().get_metric_data(MetricDataQueries, **kwargs)
+        half = len(resp["MetricDataResults"]) // 2
+        if NextToken is None:
+            return dict(resp, MetricDataResults=resp["MetricDataResults"][:half], NextToken='page-2')
+        return dict(resp, MetricDataResults=resp["MetricDataResults"][half:])
+
+
+def test_check_task_mappings_retries_unprocessed_keys(autoscaler, monkeypatch):
+    ddb = UnprocessedDynamoDB(throttled=2)
+    monkeypatch.setattr(autoscaler, 'ddb', ddb)
+    camera_ids = [f'camera-{idx}' for idx in range(150)]
+    for camera_id in camera_ids[::2]:
+        ddb.set_worker(camera_id, f'task-{camera_id}')
+
+    mappings = autoscaler.check_task_mappings(camera_ids)
+
+    # The key left over by each of the first two requests is asked for again on its own
+    assert [len(keys) for keys in ddb.requested] == [100, 1, 50, 1]
+    assert ddb.requested[1] == ['camera-99'] and ddb.requested[3] == ['camera-149']
+    assert mappings == {
+        camera_id: f'task-{camera_id}' if idx % 2 == 0 else 'NoWorker' for idx, camera_id in enumerate(camera_ids)}
+
+
+def test_update_task_mappings_writes_batches_of_25(autoscaler, monkeypatch):
+    ddb = RecordingDynamoDB()
+    monkeypatch.setattr(autoscaler, 'ddb', ddb)
+    mappings = {f'camera-{idx}': f'task-{idx // 3}' for idx in range(55)}
+
+    autoscaler.update_task_mappings(mappings, {'task-pool': {'camera-99': 1000}}, ['task-stopped'])
+
+    assert ddb.batch_sizes == [25, 25, 7]
+    assert all(ddb.worker(camera_id) == task_id for camera_id, task_id in mappings.items())
+    assert ddb.worker(autoscaler.worker_key('task-pool')) == 'task-pool'
+
+
+def test_check_kvs_metrics_pages_and_splits_queries(autoscaler, monkeypatch):
+    streams = {f'camera-{idx}': (1000 + idx, idx) for idx in range(300)}
+    cw = PagedCloudWatch(streams)
+    monkeypatch.setattr(autoscaler, 'cw', cw)
+
+    metrics = autoscaler.check_kvs_metrics(sorted(streams), bitrate=True)
+
+    # 900 queries, three per stream, in two requests of two pages each
+    assert cw.request_sizes == [500, 400]
+    assert cw.calls['get_metric_data'] == 4
+    for stream_name, (producer, consumer) in streams.items():
+        assert metrics[stream_name].producer == producer
+        assert metrics[stream_name].consumer == consumer
+        assert metrics[stream_name].rate == producer / 60
@@ -0,0 +1,86 @@
+from placement import first_fit_decreasing, plan_placement
+
+MBPS = 1000000 / 8
+
+
+def test_first_fit_decreasing_packs_largest_first():
+    rates = {'a': 3 * MBPS, 'b': 2 * MBPS, 'c': 1 * MBPS, 'd': 1 * MBPS, 'e': 5 * MBPS}
+    bins = first_fit_decreasing(list(rates), rates, 4 * MBPS, max_streams=10)
+    # The stream over the capacity gets its own task
+    assert bins == [['e'], ['a', 'c'], ['b', 'd']]
+
+
+def test_first_fit_decreasing_caps_streams_per_task():
+    rates = {f'camera-{idx}': 0.1 * MBPS for idx in range(5)}
+    bins = first_fit_decreasing(list(rates), rates, 4 * MBPS, max_streams=2)
+    assert [len(streams) for streams in bins] == [2, 2, 1]
+
+
+def test_new_streams_are_packed_onto_new_tasks():
+    rates = {'a': 1 * MBPS, 'b': 1 * MBPS, 'c': 1 * MBPS}
+    plan = plan_placement(rates, {}, 4 * MBPS)
+    assert plan.launch == [['a', 'b', 'c']]
+    assert plan.stop == [] and plan.release == []
+
+
+def test_task_without_video_is_stopped():
+    plan = plan_placement({'c': 1 * MBPS}, {'a': 'task-1', 'b': 'task-1', 'c': 'task-2'}, 4 * MBPS)
+    assert plan.stop == ['task-1']
+    assert sorted(plan.release) == ['a', 'b']
+    assert plan.launch == []
+
+
+def test_offline_stream_stays_on_running_task():
+    plan = plan_placement({'a': 2 * MBPS}, {'a': 'task-1', 'b': 'task-1'}, 4 * MBPS)
+    assert plan == ([], [], [])
+
+
+def test_overloaded_task_is_split_only_past_hysteresis():
+    workers = {'a': 'task-1', 'b': 'task-1'}
+    # 4.4 Mbps is over the capacity but within the 20% hysteresis
+    assert plan_placement({'a': 2.2 * MBPS, 'b': 2.2 * MBPS}, workers, 4 * MBPS, hysteresis=0.2).stop == []
+
+    plan = plan_placement({'a': 2.5 * MBPS, 'b': 2.5 * MBPS}, workers, 4 * MBPS, hysteresis=0.2)
+    assert plan.stop == ['task-1']
+    assert plan.launch == [['a'], ['b']]
+
+
+def test_single_stream_over_capacity_is_not_restarted():
+    assert plan_placement({'a': 8 * MBPS}, {'a': 'task-1'}, 4 * MBPS) == ([], [], [])
+
+
+def test_least_loaded_tasks_are_merged_under_low_watermark():
+    rates = {'a': 1 * MBPS, 'b': 1 * MBPS, 'c': 1.5 * MBPS, 'd': 3 * MBPS}
+    workers = {'a': 'task-1', 'b': 'task-2', 'c': 'task-3', 'd': 'task-4'}
+    plan = plan_placement(rates, workers, 4 * MBPS, hysteresis=0.2)
+    # 1 + 1 fits under 3.2 Mbps, adding 1.5 does not
+    assert sorted(plan.stop) == ['task-1', 'task-2']
+    assert plan.launch == [['a', 'b']]
+
+
+def test_tasks_near_capacity_are_not_merged():
+    rates = {'a': 1.7 * MBPS, 'b': 1.7 * MBPS}
+    plan = plan_placement(rates, {'a': 'task-1', 'b': 'task-2'}, 4 * MBPS, hysteresis=0.2)
+    assert plan == ([], [], [])
+
+
+def test_young_tasks_are_not_merged():
+    rates = {'a': 1 * MBPS, 'b': 1 * MBPS, 'c': 1 * MBPS}
+    workers = {'a': 'task-1', 'b': 'task-2', 'c': 'task-3'}
+    ages = {'task-1': 3600, 'task-2': 600, 'task-3': 3600}
+    plan = plan_placement(rates, workers, 4 * MBPS, ages=ages, min_merge_age=1800)
+    assert sorted(plan.stop) == ['task-1', 'task-3']
+    assert plan.launch == [['a', 'c']]
+
+    # A single old task has nothing to be merged with
+    ages['task-3'] = 600
+    assert plan_placement(rates, workers, 4 * MBPS, ages=ages, min_merge_age=1800) == ([], [], [])
+
+
+def test_tasks_with_fewest_streams_are_merged_first():
+    rates = {'a': 0.25 * MBPS, 'b': 0.25 * MBPS, 'c': 0.25 * MBPS, 'd': 1 * MBPS, 'e': 1 * MBPS}
+    workers = {'a': 'task-1', 'b': 'task-1', 'c': 'task-1', 'd': 'task-2', 'e': 'task-3'}
+    plan = plan_placement(rates, workers, 4 * MBPS, max_streams=4)
+    # Merging task-1 would restart three streams, the two single stream tasks save the same task
+    assert sorted(plan.stop) == ['task-2', 'task-3']
+    assert plan.launch == [['d', 'e']]
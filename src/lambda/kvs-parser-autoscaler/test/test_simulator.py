@@ -0,0 +1,61 @@
+from simulator.replay import Simulation, percentile
+from simulator.traces import Trace, synthetic_trace
+
+
+def one_camera_trace():
+    # Video in from minute 10 to minute 40 of an hour
+    return Trace({'camera-1': {minute: 600000 for minute in range(10, 40)}}, minutes=60)
+
+
+def test_sessions():
+    trace = Trace({'camera-1': {0: 1, 1: 1, 5: 1}}, minutes=6)
+    assert trace.sessions('camera-1') == [(0, 2), (5, 6)]
+
+
+def test_single_policy_replay():
+    report = Simulation(one_camera_trace(), 'single', period=120, provisioning_delay=90).run()
+    # Seen at the run of minute 12, two minutes of metric delay, then 90 seconds of provisioning
+    assert report["scaleUpLagSecondsMax"] == 12 * 60 + 90 - 10 * 60
+    # Stopped at the run of minute 42, when minute 40 shows no video in
+    assert report["taskMinutes"] == 42 - 12
+    assert report["taskLaunches"] == 1
+    assert report["liveStreamRestarts"] == 0
+    assert report["unservedSessions"] == 0
+    # Minutes 10 to 12, the task runs from the middle of minute 13
+    assert report["unservedVideoMinutes"] == 3
+
+
+def test_warm_pool_cuts_scale_up_lag():
+    report = Simulation(one_camera_trace(), 'single+pool', period=120, provisioning_delay=90, poll_interval=2).run()
+    # The idle task launched at minute 2 is running and takes the stream as soon as its assignment is polled
+    assert report["scaleUpLagSecondsMax"] == 12 * 60 + 2 - 10 * 60
+    assert report["unservedVideoMinutes"] == 2
+
+
+def test_binpack_restarts_stay_bounded():
+    trace = synthetic_trace(streams=50, hours=6)
+    settings = {'merge_min_age': 3600}
+    single = Simulation(trace, 'single').run()
+    binpack = Simulation(trace, 'binpack', settings=settings).run()
+    unbounded = Simulation(trace, 'binpack', settings={'merge_min_age': 0}).run()
+    video_minutes = sum(last - first for stream in trace.streams for first, last in trace.sessions(stream))
+    # A merge launches a task that cannot be merged again for merge_min_age, so a stream is restarted by merges at
+    # most once per merge_min_age of video
+    assert binpack["liveStreamRestarts"] <= single["liveStreamRestarts"] + video_minutes * 60 / 3600
+    assert binpack["liveStreamRestarts"] < unbounded["liveStreamRestarts"] / 2
+    assert binpack["taskMinutes"] < single["taskMinutes"]
+
+
+def test_simulation_restores_autoscaler():
+    from benchmark.timing import load_autoscaler
+    autoscaler = load_autoscaler()
+    placement_mode, ecs = autoscaler.placement_mode, autoscaler.ecs
+    Simulation(synthetic_trace(streams=5, hours=0.5), 'binpack+pool').run()
+    assert autoscaler.placement_mode == placement_mode
+    assert autoscaler.ecs is ecs
+
+
+def test_percentile():
+    assert percentile([], 0.5) is None
+    assert percentile([3, 1, 2, 4], 0.5) == 3
+    assert percentile([3, 1, 2, 4], 0.95) == 4
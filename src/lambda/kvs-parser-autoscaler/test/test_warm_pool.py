@@ -0,0 +1,54 @@
+from warm_pool import POOL_KEY, WarmPool, worker_key
+
+
+def test_item_round_trip():
+    pool = WarmPool(['task-1', 'task-2'], [100.0, 160.5])
+    item = pool.to_item()
+    assert item['cameraId'] == {'S': POOL_KEY}
+    restored = WarmPool.from_item(item)
+    assert restored.idle == ['task-1', 'task-2']
+    assert restored.starts == [100.0, 160.5]
+    assert WarmPool.from_item(None).idle == []
+
+
+def test_worker_key_cannot_collide_with_a_stream():
+    assert worker_key('arn:aws:ecs:us-east-1:123456789012:task/parser/1').startswith('#')
+
+
+def test_take_hands_out_oldest_idle_task():
+    pool = WarmPool(['task-1', 'task-2'], [])
+    assert pool.take() == 'task-1'
+    assert pool.take() == 'task-2'
+    assert pool.take() is None
+
+
+def test_retain_forgets_stopped_tasks():
+    pool = WarmPool(['task-1', 'task-2', 'task-3'], [])
+    assert pool.retain({'task-1', 'task-3'}) == ['task-2']
+    assert pool.idle == ['task-1', 'task-3']
+
+
+def test_target_size_follows_recent_start_rate():
+    pool = WarmPool([], [], min_size=1, max_size=10, window=600, lead_time=120)
+    assert pool.target_size(now=1000) == 1
+    # 20 starts in the last 10 minutes, 4 expected during the 2 minutes a new task takes
+    pool.starts = [1000 - 30 * idx for idx in range(20)]
+    assert pool.target_size(now=1000) == 4
+    # Starts older than the window are forgotten
+    assert pool.target_size(now=1000 + 1200) == 1
+    assert pool.starts == []
+
+
+def test_target_size_is_capped():
+    pool = WarmPool([], [1000.0] * 500, min_size=1, max_size=10, window=600, lead_time=120)
+    assert pool.target_size(now=1000) == 10
+
+
+def test_deficit_and_trim():
+    pool = WarmPool(['task-1'], [1000 - 30 * idx for idx in range(20)], window=600, lead_time=120)
+    assert pool.deficit(now=1000) == 3
+    pool.add(['task-2', 'task-3', 'task-4', 'task-5', 'task-6'])
+    assert pool.deficit(now=1000) == 0
+    # The newest idle tasks over the target are stopped
+    assert pool.trim(now=1000) == ['task-5', 'task-6']
+    assert pool.idle == ['task-1', 'task-2', 'task-3', 'task-4']
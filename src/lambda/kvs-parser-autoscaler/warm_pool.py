@@ -0,0 +1,87 @@
+import math
+from typing import List, Optional
+
+# Keys of the mapping table rows of the pool and of the pooled tasks. Stream names cannot contain '#',
+# so these rows never collide with a camera.
+POOL_KEY = '#warm-pool'
+WORKER_KEY_PREFIX = '#worker/'
+
+
+def worker_key(task_arn: str) -> str:
+    return WORKER_KEY_PREFIX + task_arn
+
+
+class WarmPool:
+    """
+    Idle parser tasks waiting for streams, sized from the rate streams were started at recently
+    :param `idle` ARNs of the idle tasks, oldest first
+    :param `starts` times, in seconds, parser tasks were started or taken from the pool for streams
+    :param `min_size` smallest number of idle tasks kept
+    :param `max_size` largest number of idle tasks kept
+    :param `window` seconds of start history the pool is sized from
+    :param `lead_time` seconds a new task takes to be ready, the pool covers the starts expected meanwhile
+    """
+
+    def __init__(self, idle: List[str], starts: List[float], min_size: int = 1, max_size: int = 10,
+                 window: float = 1800, lead_time: float = 240):
+        self.idle = list(idle)
+        self.starts = list(starts)
+        self.min_size = min_size
+        self.max_size = max_size
+        self.window = window
+        self.lead_time = lead_time
+
+    @classmethod
+    def from_item(cls, item: Optional[dict], **kwargs) -> 'WarmPool':
+        if not item:
+            return cls([], [], **kwargs)
+        return cls(
+            [value['S'] for value in item.get('idleWorkers', {}).get('L', [])],
+            [float(value['N']) for value in item.get('starts', {}).get('L', [])],
+            **kwargs
+        )
+
+    def to_item(self) -> dict:
+        return {
+            'cameraId': {'S': POOL_KEY},
+            'idleWorkers': {'L': [{'S': task_arn} for task_arn in self.idle]},
+            'starts': {'L': [{'N': str(round(started, 3))} for started in self.starts]}
+        }
+
+    def take(self) -> Optional[str]:
+        """
+        Hand out the oldest idle task, which is the most likely to be running already
+        """
+        return self.idle.pop(0) if self.idle else None
+
+    def add(self, task_arns: List[str]) -> None:
+        self.idle.extend(task_arns)
+
+    def retain(self, running: set) -> List[str]:
+        """
+        Forget the idle tasks that are not running anymore
+        :returns: the forgotten tasks
+        """
+        gone = [task_arn for task_arn in self.idle if task_arn not in running]
+        self.idle = [task_arn for task_arn in self.idle if task_arn in running]
+        return gone
+
+    def record_start(self, now: float) -> None:
+        self.starts.append(now)
+
+    def target_size(self, now: float) -> int:
+        self.starts = [started for started in self.starts if now - started <= self.window]
+        expected = math.ceil(len(self.starts) / self.window * self.lead_time)
+        return max(self.min_size, min(self.max_size, expected))
+
+    def deficit(self, now: float) -> int:
+        return max(0, self.target_size(now) - len(self.idle))
+
+    def trim(self, now: float) -> List[str]:
+        """
+        Remove the newest idle tasks over the target size
+        :returns: the tasks to stop
+        """
+        target = self.target_size(now)
+        surplus, self.idle = self.idle[target:], self.idle[:target]
+        return surplus
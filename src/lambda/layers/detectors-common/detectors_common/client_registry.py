@@ -0,0 +1,135 @@
+from typing import Any, Dict, Optional, Tuple
+import threading
+import boto3
+from botocore.config import Config
+
+from aws_lambda_powertools.logging import Logger
+
+
+# Seconds a call of the function may wait on one AWS request, retries included
+CALL_BUDGET_SECONDS = 30
+# (connect timeout, read timeout) in seconds per service
+SERVICE_TIMEOUTS: Dict[str, Tuple[float, float]] = {}
+DEFAULT_TIMEOUTS = (2, 10)
+# Attempts per request, each one may take its connect and read timeouts: attempts * (connect + read) fits
+# `CALL_BUDGET_SECONDS`
+MAX_ATTEMPTS = 2
+
+logger = Logger(service='detector', child=True)
+
+_session = None
+_clients: Dict[str, Any] = {}
+_lock = threading.Lock()
+_max_pool_connections = 10
+_service_config: Dict[str, Dict[str, Any]] = {}
+
+
+def configure(service: Optional[str] = None, call_budget_seconds: Optional[float] = None,
+              service_timeouts: Optional[Dict[str, Tuple[float, float]]] = None,
+              default_timeouts: Optional[Tuple[float, float]] = None, max_pool_connections: Optional[int] = None,
+              service_config: Optional[Dict[str, Dict[str, Any]]] = None) -> None:
+    """
+    Configure the clients created from now on
+    :param `service` name of the detector function the registry logs under
+    :param `call_budget_seconds` longest time a request may take, retries included
+    :param `service_timeouts` (connect timeout, read timeout) per service name, replacing the previous ones
+    :param `default_timeouts` (connect timeout, read timeout) of the other services
+    :param `max_pool_connections` connections kept per client, size it to the number of concurrent workers
+    :param `service_config` botocore Config arguments per service name, overriding the defaults
+    :raises ValueError: when the timeouts of a service do not fit the call budget
+    """
+    global logger, CALL_BUDGET_SECONDS, SERVICE_TIMEOUTS, DEFAULT_TIMEOUTS, _max_pool_connections
+    budget = CALL_BUDGET_SECONDS if call_budget_seconds is None else call_budget_seconds
+    timeouts = SERVICE_TIMEOUTS if service_timeouts is None else dict(service_timeouts)
+    default = DEFAULT_TIMEOUTS if default_timeouts is None else default_timeouts
+    for service_name, (connect_timeout, read_timeout) in list(timeouts.items()) + [('other services', default)]:
+        if MAX_ATTEMPTS * (connect_timeout + read_timeout) > budget:
+            raise ValueError(f'Timeouts of {service_name} take up to {MAX_ATTEMPTS * (connect_timeout + read_timeout)} '
+                             f'seconds over {MAX_ATTEMPTS} attempts, more than the budget of {budget}')
+    with _lock:
+        if service is not None:
+            logger = Logger(service=service, child=True)
+        CALL_BUDGET_SECONDS, SERVICE_TIMEOUTS, DEFAULT_TIMEOUTS = budget, timeouts, default
+        if max_pool_connections is not None:
+            _max_pool_connections = max_pool_connections
+        if service_config:
+            _service_config.update(service_config)
+
+
+def build_config(service_name: str) -> Config:
+    connect_timeout, read_timeout = SERVICE_TIMEOUTS.get(service_name, DEFAULT_TIMEOUTS)
+    config = {
+        "max_pool_connections": _max_pool_connections,
+        "tcp_keepalive": True,
+        "retries": {"mode": "adaptive", "max_attempts": MAX_ATTEMPTS},
+        "connect_timeout": connect_timeout,
+        "read_timeout": read_timeout,
+    }
+    config.update(_service_config.get(service_name, {}))
+    return Config(**config)
+
+
+def worst_case_seconds(service_name: str) -> float:
+    """
+    Longest time a request of the service can take with its timeouts and retries, backoff excluded
+    """
+    connect_timeout, read_timeout = SERVICE_TIMEOUTS.get(service_name, DEFAULT_TIMEOUTS)
+    return MAX_ATTEMPTS * (connect_timeout + read_timeout)
+
+
+def get_client(service_name: str):
+    """
+    Return the client of a service, creating it on first use
+    Clients are thread safe and shared by every module of the function
+    """
+    client = _clients.get(service_name)
+    if client is None:
+        global _session
+        with _lock:
+            client = _clients.get(service_name)
+            if client is None:
+                if _session is None:
+                    _session = boto3.session.Session()
+                client = _session.client(service_name, config=build_config(service_name))
+                _clients[service_name] = client
+                logger.info(f'Created {service_name} client')
+    return client
+
+
+def register_client(service_name: str, client) -> None:
+    """
+    Use the given client for a service, e.g. a stub in tests and benchmarks
+    """
+    with _lock:
+        _clients[service_name] = client
+
+
+def reset() -> None:
+    """
+    Drop every client, the next calls to `get_client` create new ones
+    """
+    with _lock:
+        _clients.clear()
+
+
+def connection_stats() -> Dict[str, int]:
+    """
+    Count the HTTP connections opened by the clients against the requests sent over them
+    The pools are private to botocore, clients whose pools cannot be read are not counted
+    """
+    new_connections = 0
+    requests = 0
+    for client in list(_clients.values()):
+        try:
+            pools = client._endpoint.http_session._manager.pools
+            for key in pools.keys():
+                pool = pools[key]
+                new_connections += pool.num_connections
+                requests += pool.num_requests
+        except (AttributeError, KeyError):
+            continue
+    return {
+        "awsClients": len(_clients),
+        "awsNewConnections": new_connections,
+        "awsReusedConnections": max(requests - new_connections, 0),
+    }
@@ -0,0 +1,207 @@
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+import functools
+import json
+import math
+import threading
+import time
+import timeit
+
+
+NAMESPACE = 'PPEVideoAnalytics'
+# CloudWatch extracts at most 100 values of one metric from one EMF document
+MAX_VALUES_PER_METRIC = 100
+
+# Dimension names and values of the metrics of one EMF document, besides the service dimension
+DimensionKey = Tuple[Tuple[str, str], ...]
+
+
+def stdout_sink(document: dict) -> None:
+    # Lambda sends stdout to CloudWatch Logs, which extracts the metrics of EMF documents
+    print(json.dumps(document, separators=(',', ':')))
+
+
+class MemorySink:
+    """
+    Keep the emitted EMF documents in memory, for tests and benchmarks
+    """
+
+    def __init__(self):
+        self.documents: List[dict] = []
+
+    def __call__(self, document: dict) -> None:
+        self.documents.append(document)
+
+    def values(self, name: str) -> List[float]:
+        """
+        Every value of a metric across the emitted documents
+        """
+        values = []
+        for document in self.documents:
+            values.extend(document.get(name, []))
+        return values
+
+
+class StageMetrics:
+    """
+    Collect the duration of the stages of an invocation, with byte and person counts, and emit them on `flush`
+    as one CloudWatch Embedded Metric Format document, instead of one log line per stage.
+    Stages of frames processed by concurrent workers are collected together.
+    Values recorded with extra dimensions, e.g. a camera, go to a document of their own, whose metrics are also
+    rolled up under the service dimension alone.
+    :param `service` value of the service dimension, the name of the detector function
+    :param `namespace` CloudWatch namespace of the metrics
+    :param `sink` callable receiving each EMF document, printed to stdout when None
+    :param `enabled` collect nothing and emit nothing when False
+    """
+
+    def __init__(self, service: str, namespace: str = NAMESPACE,
+                 sink: Optional[Callable[[dict], None]] = None, enabled: bool = True):
+        self.service = service
+        self.namespace = namespace
+        self.sink = sink if sink else stdout_sink
+        self.enabled = enabled
+        self._values: Dict[DimensionKey, Dict[str, List[float]]] = {}
+        self._units: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, value: float, unit: str = 'Milliseconds',
+               dimensions: Optional[Dict[str, str]] = None) -> None:
+        """
+        :param `dimensions` dimension names and values of the value, besides the service
+        """
+        if not self.enabled:
+            return
+        key = tuple(sorted(dimensions.items())) if dimensions else ()
+        with self._lock:
+            group = self._values.setdefault(key, {})
+            values = group.get(name)
+            if values is None:
+                group[name] = [value]
+                self._units[name] = unit
+            else:
+                values.append(value)
+
+    def count(self, name: str, value: float, unit: str = 'Count') -> None:
+        self.record(name, value, unit)
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        Time the enclosed block as one run of a stage, in milliseconds
+        """
+        start_time = timeit.default_timer()
+        try:
+            yield
+        finally:
+            self.record(name, (timeit.default_timer() - start_time) * 1000)
+
+    def timed(self, name: str) -> Callable:
+        """
+        Decorator timing every call of a function as one run of a stage
+        """
+        def decorator(fn: Callable) -> Callable:
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                start_time = timeit.default_timer()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.record(name, (timeit.default_timer() - start_time) * 1000)
+            return wrapper
+        return decorator
+
+    def flush(self, properties: Optional[dict] = None) -> List[dict]:
+        """
+        Emit the values collected since the last flush and start over
+        :param `properties` other fields of the document, searchable in CloudWatch Logs Insights but not metrics
+        :returns: the emitted documents, one per set of dimensions unless a metric has more than
+            `MAX_VALUES_PER_METRIC` values
+        """
+        with self._lock:
+            collected, self._values = self._values, {}
+        if not self.enabled or (not collected and not properties):
+            return []
+
+        timestamp = int(time.time() * 1000)
+        documents = []
+        # Documents of the service dimension alone come first, they carry the properties
+        for key in sorted(collected) or [()]:
+            documents.extend(self._documents(timestamp, key, collected.get(key, {}), None if documents else properties))
+        for document in documents:
+            self.sink(document)
+        return documents
+
+    def _documents(self, timestamp: int, key: DimensionKey, collected: Dict[str, List[float]],
+                   properties: Optional[dict]) -> List[dict]:
+        chunks = max([math.ceil(len(values) / MAX_VALUES_PER_METRIC) for values in collected.values()] + [1])
+        dimensions = [["service"] + [name for name, _ in key]]
+        if key:
+            dimensions.append(["service"])
+        documents = []
+        for chunk in range(chunks):
+            document = {
+                "_aws": {
+                    "Timestamp": timestamp,
+                    "CloudWatchMetrics": [{
+                        "Namespace": self.namespace,
+                        "Dimensions": dimensions,
+                        "Metrics": [],
+                    }],
+                },
+                "service": self.service,
+            }
+            document.update(key)
+            metrics = document["_aws"]["CloudWatchMetrics"][0]["Metrics"]
+            for name, values in collected.items():
+                values = values[chunk * MAX_VALUES_PER_METRIC:(chunk + 1) * MAX_VALUES_PER_METRIC]
+                if values:
+                    metrics.append({"Name": name, "Unit": self._units[name]})
+                    document[name] = [round(value, 3) for value in values]
+            if chunk == 0 and properties:
+                for name, value in properties.items():
+                    document.setdefault(name, value)
+            documents.append(document)
+        return documents
+
+
+# Registry shared by every module of the function, flushed by the handler once per invocation.
+# The function names its service with `configure` before the first flush.
+registry = StageMetrics(service='detector')
+
+
+def configure(service: Optional[str] = None, namespace: Optional[str] = None,
+              sink: Optional[Callable[[dict], None]] = None, enabled: Optional[bool] = None) -> None:
+    """
+    Configure the shared registry
+    :param `service` value of the service dimension, the name of the detector function
+    :param `sink` callable receiving each EMF document, e.g. a `MemorySink` in tests and benchmarks
+    """
+    if service is not None:
+        registry.service = service
+    if namespace is not None:
+        registry.namespace = namespace
+    if sink is not None:
+        registry.sink = sink
+    if enabled is not None:
+        registry.enabled = enabled
+
+
+def stage(name: str):
+    return registry.stage(name)
+
+
+def timed(name: str) -> Callable:
+    return registry.timed(name)
+
+
+def count(name: str, value: float, unit: str = 'Count') -> None:
+    registry.count(name, value, unit)
+
+
+def record(name: str, value: float, unit: str = 'Milliseconds', dimensions: Optional[Dict[str, str]] = None) -> None:
+    registry.record(name, value, unit, dimensions)
+
+
+def flush(properties: Optional[dict] = None) -> List[dict]:
+    return registry.flush(properties)
@@ -0,0 +1,43 @@
+from typing import Callable
+import functools
+import os
+
+
+def tracing_disabled() -> bool:
+    # Same switch as the powertools Tracer, read before anything of the X-Ray SDK is imported
+    return os.environ.get("POWERTOOLS_TRACE_DISABLED", "false").lower() in ("1", "true")
+
+
+def _passthrough(fn: Callable) -> Callable:
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        return fn(*args, **kwargs)
+    return wrapper
+
+
+class NoopTracer:
+    """
+    Stand-in for the powertools Tracer when tracing is disabled, with the same decorators.
+    Creating a powertools Tracer imports the X-Ray SDK and a botocore session even when tracing is disabled,
+    a large part of the cold start of the function.
+    """
+
+    def capture_method(self, method: Callable = None, capture_response=None, capture_error=None):
+        if method is None:
+            return _passthrough
+        return _passthrough(method)
+
+    def capture_lambda_handler(self, lambda_handler: Callable = None, capture_response=None, capture_error=None):
+        if lambda_handler is None:
+            return _passthrough
+        return _passthrough(lambda_handler)
+
+
+def get_tracer(service: str):
+    """
+    Return the powertools Tracer of a service, or a `NoopTracer` when POWERTOOLS_TRACE_DISABLED is set
+    """
+    if tracing_disabled():
+        return NoopTracer()
+    from aws_lambda_powertools.tracing import Tracer
+    return Tracer(service=service)
@@ -0,0 +1,95 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import boto3
+import pytest
+
+from detectors_common import client_registry
+
+
+class FirehoseStub(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        body = b'{"RecordId": "record-1", "Encrypted": false}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-amz-json-1.1')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def configured():
+    # Timeouts of the PPE detector, the defaults of the layer are restored afterwards
+    saved = (client_registry.CALL_BUDGET_SECONDS, client_registry.SERVICE_TIMEOUTS, client_registry.DEFAULT_TIMEOUTS)
+    client_registry.configure(
+        service='ppe-detector', call_budget_seconds=7, service_timeouts={'rekognition': (1, 2), 'sns': (1, 2)},
+        default_timeouts=(1, 2), max_pool_connections=16, service_config={'sns': {'read_timeout': 5}})
+    yield client_registry
+    client_registry.configure(
+        call_budget_seconds=saved[0], service_timeouts=saved[1], default_timeouts=saved[2], max_pool_connections=10)
+    client_registry._service_config.clear()
+
+
+def test_build_config(configured):
+    config = client_registry.build_config('rekognition')
+    assert config.max_pool_connections == 16
+    assert config.tcp_keepalive is True
+    assert config.retries == {'mode': 'adaptive', 'max_attempts': client_registry.MAX_ATTEMPTS}
+    assert (config.connect_timeout, config.read_timeout) == (1, 2)
+    assert client_registry.build_config('sns').read_timeout == 5
+    assert (client_registry.build_config('s3').connect_timeout, client_registry.build_config('s3').read_timeout) == (1, 2)
+
+
+def test_requests_fit_the_call_budget(configured):
+    for service_name in list(client_registry.SERVICE_TIMEOUTS) + ['lambda']:
+        assert client_registry.worst_case_seconds(service_name) <= client_registry.CALL_BUDGET_SECONDS
+
+
+def test_timeouts_over_the_call_budget_are_refused(configured):
+    with pytest.raises(ValueError, match='rekognition'):
+        client_registry.configure(service_timeouts={'rekognition': (2, 10)})
+    # Nothing of a refused configuration is applied
+    assert client_registry.SERVICE_TIMEOUTS['rekognition'] == (1, 2)
+
+
+def test_get_client_is_shared(monkeypatch):
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    client_registry.reset()
+    clients = []
+    threads = [threading.Thread(target=lambda: clients.append(client_registry.get_client('s3'))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len({id(client) for client in clients}) == 1
+    assert client_registry.get_client('s3') is clients[0]
+    client_registry.reset()
+
+
+def test_connection_stats_count_reused_connections():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FirehoseStub)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = boto3.client(
+        'firehose', region_name='us-east-1', endpoint_url=f'http://127.0.0.1:{server.server_port}',
+        aws_access_key_id='test', aws_secret_access_key='test',
+        config=client_registry.build_config('firehose'))
+    client_registry.reset()
+    client_registry.register_client('firehose', client)
+    try:
+        for _ in range(5):
+            client.put_record(DeliveryStreamName='ppe-records', Record={'Data': b'{}'})
+        assert client_registry.connection_stats() == {
+            "awsClients": 1,
+            "awsNewConnections": 1,
+            "awsReusedConnections": 4
+        }
+    finally:
+        server.shutdown()
+        client_registry.reset()
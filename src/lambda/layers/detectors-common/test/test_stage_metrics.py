@@ -0,0 +1,137 @@
+import threading
+
+from detectors_common import stage_metrics
+from detectors_common.stage_metrics import MAX_VALUES_PER_METRIC, MemorySink, StageMetrics
+
+
+def test_flush_emits_one_emf_document():
+    sink = MemorySink()
+    metrics = StageMetrics(service='ppe-detector', namespace='Test', sink=sink)
+    with metrics.stage('decode'):
+        pass
+    with metrics.stage('decode'):
+        pass
+    metrics.count('frameBytes', 1024, 'Bytes')
+    metrics.count('persons', 3)
+
+    documents = metrics.flush({"responseCacheHits": 2})
+
+    assert documents == sink.documents
+    assert len(documents) == 1
+    document = documents[0]
+    directive = document["_aws"]["CloudWatchMetrics"][0]
+    assert directive["Namespace"] == 'Test'
+    assert directive["Dimensions"] == [["service"]]
+    assert directive["Metrics"] == [
+        {"Name": "decode", "Unit": "Milliseconds"},
+        {"Name": "frameBytes", "Unit": "Bytes"},
+        {"Name": "persons", "Unit": "Count"},
+    ]
+    assert document["service"] == 'ppe-detector'
+    assert len(document["decode"]) == 2
+    assert document["frameBytes"] == [1024]
+    assert document["persons"] == [3]
+    assert document["responseCacheHits"] == 2
+    assert isinstance(document["_aws"]["Timestamp"], int)
+
+
+def test_flush_starts_over():
+    sink = MemorySink()
+    metrics = StageMetrics(service='ppe-detector', sink=sink)
+    metrics.count('persons', 1)
+    metrics.flush()
+    assert metrics.flush() == []
+    metrics.count('persons', 2)
+    metrics.flush()
+    assert sink.values('persons') == [1, 2]
+
+
+def test_timed_records_failed_calls():
+    sink = MemorySink()
+    metrics = StageMetrics(service='ppe-detector', sink=sink)
+
+    @metrics.timed('upload')
+    def upload(fail):
+        if fail:
+            raise ValueError('upload failed')
+        return 'uploaded'
+
+    assert upload(False) == 'uploaded'
+    try:
+        upload(True)
+    except ValueError:
+        pass
+    metrics.flush()
+    assert len(sink.values('upload')) == 2
+    assert upload.__name__ == 'upload'
+
+
+def test_metrics_over_the_emf_limit_are_split():
+    sink = MemorySink()
+    metrics = StageMetrics(service='ppe-detector', sink=sink)
+    for idx in range(MAX_VALUES_PER_METRIC * 2 + 1):
+        metrics.count('persons', idx)
+    metrics.count('frameBytes', 10, 'Bytes')
+    documents = metrics.flush({"awsClients": 1})
+
+    assert len(documents) == 3
+    assert [len(document["persons"]) for document in documents] == [MAX_VALUES_PER_METRIC, MAX_VALUES_PER_METRIC, 1]
+    assert "frameBytes" in documents[0] and "frameBytes" not in documents[1]
+    assert "awsClients" in documents[0] and "awsClients" not in documents[2]
+    assert sink.values('persons') == list(range(MAX_VALUES_PER_METRIC * 2 + 1))
+
+
+def test_dimensioned_values_get_their_own_document():
+    sink = MemorySink()
+    metrics = StageMetrics(service='ppe-detector', sink=sink)
+    metrics.count('persons', 1)
+    metrics.record('firstFrameLatency', 95.5, 'Seconds', {"cameraId": 'camera-1'})
+    metrics.record('firstFrameLatency', 12, 'Seconds', {"cameraId": 'camera-2'})
+    documents = metrics.flush({"awsClients": 1})
+
+    assert len(documents) == 3
+    assert documents[0]["persons"] == [1] and documents[0]["awsClients"] == 1
+    camera_document = documents[1]
+    directive = camera_document["_aws"]["CloudWatchMetrics"][0]
+    # Per camera, and rolled up for the service
+    assert directive["Dimensions"] == [["service", "cameraId"], ["service"]]
+    assert directive["Metrics"] == [{"Name": "firstFrameLatency", "Unit": "Seconds"}]
+    assert camera_document["cameraId"] == 'camera-1'
+    assert camera_document["firstFrameLatency"] == [95.5]
+    assert "awsClients" not in camera_document
+    assert sink.values('firstFrameLatency') == [95.5, 12]
+
+
+def test_concurrent_stages_are_all_recorded():
+    sink = MemorySink()
+    metrics = StageMetrics(service='ppe-detector', sink=sink)
+
+    def work():
+        for _ in range(50):
+            with metrics.stage('filter'):
+                pass
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    metrics.flush()
+    assert len(sink.values('filter')) == 400
+
+
+def test_disabled_registry_emits_nothing():
+    sink = MemorySink()
+    metrics = StageMetrics(service='ppe-detector', sink=sink, enabled=False)
+    with metrics.stage('decode'):
+        pass
+    assert metrics.flush({"awsClients": 1}) == []
+    assert sink.documents == []
+
+
+def test_shared_registry_stdout_sink(capsys):
+    stage_metrics.configure(service='face-detector', sink=stage_metrics.stdout_sink, enabled=True)
+    stage_metrics.count('persons', 1)
+    stage_metrics.flush()
+    output = capsys.readouterr().out
+    assert '"CloudWatchMetrics"' in output and '"service":"face-detector"' in output
@@ -0,0 +1,29 @@
+from detectors_common import tracing
+
+
+def test_disabled_tracer_keeps_functions(monkeypatch):
+    monkeypatch.setenv('POWERTOOLS_TRACE_DISABLED', 'true')
+    tracer = tracing.get_tracer('ppe-detector')
+    assert isinstance(tracer, tracing.NoopTracer)
+
+    @tracer.capture_method(capture_response=False)
+    def resize(width, height=1):
+        return width * height
+
+    @tracer.capture_lambda_handler
+    def handler(event, context):
+        return {"statusCode": 200, "body": event}
+
+    assert resize(2, height=3) == 6
+    assert resize.__name__ == 'resize'
+    assert resize.__wrapped__(4) == 4
+    assert handler('event', None) == {"statusCode": 200, "body": 'event'}
+    assert handler.__wrapped__('event', None)["statusCode"] == 200
+
+
+def test_tracing_disabled_values(monkeypatch):
+    for value, disabled in (('1', True), ('True', True), ('false', False), ('0', False)):
+        monkeypatch.setenv('POWERTOOLS_TRACE_DISABLED', value)
+        assert tracing.tracing_disabled() is disabled
+    monkeypatch.delenv('POWERTOOLS_TRACE_DISABLED')
+    assert tracing.tracing_disabled() is False
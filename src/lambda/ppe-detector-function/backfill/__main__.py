@@ -0,0 +1,62 @@
+"""
+Run the PPE detector stages over recorded video files or frame directories and write the records the detector
+would have sent to Firehose, as JSON lines.
+
+Usage:
+  python -m backfill VIDEO_OR_DIR [...] [--fps 1] [--workers 4] [--backend rekognition | replay:ppe-result.json]
+                     [--output records.jsonl] [--camera NAME] [--started-at EPOCH_MS] [--source-fps 25]
+"""
+import argparse
+import json
+import os
+import sys
+
+# Outside of Lambda, without X-Ray and per-frame log lines, set before the detector modules create their tracer
+os.environ.setdefault("POWERTOOLS_TRACE_DISABLED", "1")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from backfill.backends import backend_factory
+from backfill.frames import plan_source
+from backfill.pipeline import Settings, run_backfill
+from main.image_ops import encoder
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m backfill', description='Analyse recorded video offline')
+    parser.add_argument('sources', nargs='+', help='video files readable by OpenCV, or directories of PNG/JPEG frames')
+    parser.add_argument('--fps', type=float, default=1, help='frames analysed per second of video, 0 for every frame')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='worker processes')
+    parser.add_argument('--segment-frames', type=int, default=20, help='sampled frames per task of a worker')
+    parser.add_argument('--backend', default='rekognition',
+                        help='detector backend, rekognition or replay:PATH[,PATH...] of canned responses')
+    parser.add_argument('--output', help='file the records are written to, standard output by default')
+    parser.add_argument('--camera', help='camera name of the records, the file name of each source by default')
+    parser.add_argument('--started-at', type=int,
+                        help='epoch milliseconds of the first frame, the modification time of each source by default')
+    parser.add_argument('--source-fps', type=float, help='frame rate of a frame directory, --fps by default')
+    parser.add_argument('--min-confidence', type=int, default=int(os.environ.get("MIN_DETECTION_CONFIDENCE", "80")))
+    parser.add_argument('--detect-helmet', choices=['true', 'false'], default=os.environ.get("DETECT_HELMET", "false"))
+    parser.add_argument('--processed-bucket', default=os.environ.get("PROCESSED_S3_BUCKET", "processed-frames"),
+                        help='bucket of the s3url of the records')
+    parser.add_argument('--preset', choices=sorted(encoder.PRESETS), default=os.environ.get("ENCODER_PRESET", "webp"),
+                        help='encoder preset giving the file extension of the s3url of the records')
+    args = parser.parse_args()
+
+    # Read by the record preparer, in this process and in the workers it starts
+    os.environ["PROCESSED_S3_BUCKET"] = args.processed_bucket
+    segments = []
+    for source in args.sources:
+        segments.extend(plan_source(source, args.fps, args.segment_frames, args.camera, args.started_at,
+                                    args.source_fps))
+    settings = Settings(args.min_confidence, args.detect_helmet, encoder.PRESETS[args.preset].extension)
+
+    if args.output:
+        with open(args.output, 'wb') as output:
+            report = run_backfill(segments, backend_factory(args.backend), output, args.workers, settings)
+    else:
+        report = run_backfill(segments, backend_factory(args.backend), sys.stdout.buffer, args.workers, settings)
+    print(json.dumps(dict(report, sources=len(args.sources), backend=args.backend), indent=2), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
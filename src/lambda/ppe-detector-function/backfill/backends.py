@@ -0,0 +1,49 @@
+import copy
+import functools
+import itertools
+import json
+from typing import Callable, List
+
+import main  # noqa: F401, puts the detectors-common layer on the path
+from detectors_common import client_registry
+
+
+class ReplayBackend:
+    """
+    Stand-in for the Rekognition client replaying canned DetectProtectiveEquipment responses in turn,
+    to try a backfill or measure its throughput without calling Rekognition
+    """
+
+    def __init__(self, responses: List[dict]):
+        if not responses:
+            raise ValueError('ReplayBackend needs at least one response')
+        self._responses = itertools.cycle(responses)
+        self.calls = 0
+
+    @classmethod
+    def from_files(cls, paths: List[str]) -> 'ReplayBackend':
+        responses = []
+        for path in paths:
+            with open(path) as fd:
+                responses.append(json.load(fd))
+        return cls(responses)
+
+    def detect_protective_equipment(self, Image, **kwargs):
+        self.calls += 1
+        return copy.deepcopy(next(self._responses))
+
+
+def backend_factory(spec: str) -> Callable[[], object]:
+    """
+    Factory of the detector backend of the backfill workers, called once in every worker process
+    :param `spec` 'rekognition' for the Rekognition client of the registry, or 'replay:PATH[,PATH...]' for
+        canned responses read from JSON files
+    :returns: picklable callable returning an object with the `detect_protective_equipment` method of the
+        Rekognition client
+    """
+    kind, _, args = spec.partition(':')
+    if kind == 'rekognition':
+        return functools.partial(client_registry.get_client, 'rekognition')
+    if kind == 'replay' and args:
+        return functools.partial(ReplayBackend.from_files, args.split(','))
+    raise ValueError(f'Unknown detector backend {spec}, expected rekognition or replay:PATH')
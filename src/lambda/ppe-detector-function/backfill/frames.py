@@ -0,0 +1,134 @@
+import os
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+
+import cv2
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+# Sampled video frames are sent to Rekognition as JPEG, much faster to encode than the parser's PNG
+JPEG_QUALITY = 90
+
+
+class Segment(NamedTuple):
+    """
+    Consecutive sampled frames of one source, the unit of work of a backfill worker
+    :param `path` video file or frame directory
+    :param `camera` camera name of the records
+    :param `started_at` epoch milliseconds of the first frame of the source
+    :param `source_fps` frame rate of the source
+    :param `indices` source frame numbers to analyse, in increasing order
+    :param `files` image files of a frame directory, None for a video
+    """
+    path: str
+    camera: str
+    started_at: int
+    source_fps: float
+    indices: Tuple[int, ...]
+    files: Optional[Tuple[str, ...]] = None
+
+
+def sample_indices(frame_count: int, source_fps: float, target_fps: float) -> List[int]:
+    """
+    Source frame numbers closest to a sampling of the source at `target_fps`, every frame when it is not lower
+    """
+    if target_fps <= 0 or target_fps >= source_fps:
+        return list(range(frame_count))
+    step = source_fps / target_fps
+    indices = []
+    position = 0.0
+    while round(position) < frame_count:
+        indices.append(int(round(position)))
+        position += step
+    return indices
+
+
+def _split(path: str, camera: str, started_at: int, source_fps: float, indices: List[int],
+           segment_frames: int, files: Optional[Tuple[str, ...]] = None) -> List[Segment]:
+    return [
+        Segment(path, camera, started_at, source_fps, tuple(indices[start:start + segment_frames]), files)
+        for start in range(0, len(indices), segment_frames)
+    ]
+
+
+def plan_source(path: str, target_fps: float, segment_frames: int, camera: Optional[str] = None,
+                started_at: Optional[int] = None, source_fps: Optional[float] = None) -> List[Segment]:
+    """
+    Split a video file or a directory of frames into segments of sampled frames
+    :param `path` video file readable by `cv2.VideoCapture`, or directory of PNG/JPEG frames sorted by name
+    :param `target_fps` frames per second of video to analyse, 0 keeps every frame
+    :param `segment_frames` number of sampled frames per segment
+    :param `camera` camera name of the records, the file or directory name by default
+    :param `started_at` epoch milliseconds of the first frame, the modification time of the source by default
+    :param `source_fps` frame rate of a frame directory, read from the container of a video.
+        A directory defaults to `target_fps`, i.e. every frame is analysed
+    """
+    if camera is None:
+        camera = os.path.splitext(os.path.basename(os.path.normpath(path)))[0]
+    if started_at is None:
+        started_at = int(os.path.getmtime(path) * 1000)
+
+    if os.path.isdir(path):
+        files = tuple(sorted(name for name in os.listdir(path) if name.lower().endswith(IMAGE_EXTENSIONS)))
+        fps = source_fps or target_fps or 1
+        return _split(path, camera, started_at, fps, sample_indices(len(files), fps, target_fps),
+                      segment_frames, files)
+
+    capture = cv2.VideoCapture(path)
+    try:
+        if not capture.isOpened():
+            raise ValueError(f'{path} is neither a frame directory nor a video OpenCV can read')
+        fps = source_fps or capture.get(cv2.CAP_PROP_FPS)
+        frame_count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+    finally:
+        capture.release()
+    if fps <= 0:
+        raise ValueError(f'Frame rate of {path} unknown, set it with source_fps')
+    return _split(path, camera, started_at, fps, sample_indices(frame_count, fps, target_fps), segment_frames)
+
+
+def frame_timestamp(segment: Segment, index: int) -> str:
+    # Epoch milliseconds as a string, like the timestamp metadata the parser writes
+    return str(segment.started_at + int(round(index * 1000 / segment.source_fps)))
+
+
+def _image_size(raw: bytes) -> Tuple[int, int]:
+    # Only the image header is read, the decoder stage decodes the frame if a later stage needs its pixels
+    import io
+    from PIL import Image
+    with Image.open(io.BytesIO(raw)) as image:
+        return image.size
+
+
+def read_segment(segment: Segment) -> Iterator[Tuple[str, bytes, int, int]]:
+    """
+    Read the sampled frames of a segment
+    :returns: iterator of (timestamp, image bytes, width, height), stopping early when a video ends before
+        the frame count of its container
+    """
+    if segment.files is not None:
+        for index in segment.indices:
+            with open(os.path.join(segment.path, segment.files[index]), 'rb') as fd:
+                raw = fd.read()
+            width, height = _image_size(raw)
+            yield frame_timestamp(segment, index), raw, width, height
+        return
+
+    capture = cv2.VideoCapture(segment.path)
+    try:
+        position = segment.indices[0]
+        if position > 0:
+            capture.set(cv2.CAP_PROP_POS_FRAMES, position)
+        for index in segment.indices:
+            # Frames between two samples are only demuxed and decoded, never converted
+            while position < index:
+                if not capture.grab():
+                    return
+                position += 1
+            ok, frame = capture.read()
+            position += 1
+            if not ok:
+                return
+            height, width = frame.shape[:2]
+            raw = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])[1].tobytes()
+            yield frame_timestamp(segment, index), raw, width, height
+    finally:
+        capture.release()
@@ -0,0 +1,118 @@
+import multiprocessing
+import timeit
+from typing import BinaryIO, Callable, List, NamedTuple, Optional
+
+from aws_lambda_powertools.logging import Logger
+
+from backfill.frames import Segment, read_segment
+from main.firehose import record_preparer, record_writer
+from main.image_ops import decoder
+from main.ppedetection import detector, filter
+from main.utils import filename_generator
+from detectors_common import stage_metrics
+
+logger = Logger(service='ppe-backfill')
+
+
+class Settings(NamedTuple):
+    """
+    Detection settings of a backfill, the same as the environment variables of the PPE detector
+    :param `min_confidence` MIN_DETECTION_CONFIDENCE
+    :param `detect_helmet` DETECT_HELMET, "true" or "false"
+    :param `extension` file extension of the processed frames the records point to, from ENCODER_PRESET
+    """
+    min_confidence: int = 80
+    detect_helmet: str = "false"
+    extension: str = '.webp'
+
+
+class SegmentResult(NamedTuple):
+    payloads: List[bytes]
+    frames: int
+    failed: int
+    violations: int
+
+
+# State of a worker process, set by `init_worker`
+_backend = None
+_settings: Optional[Settings] = None
+
+
+def init_worker(backend_factory: Callable[[], object], settings: Settings) -> None:
+    global _backend, _settings
+    # Workers run for the whole backfill, the stage metrics would only pile up in their memory
+    stage_metrics.configure(enabled=False)
+    _backend = backend_factory()
+    _settings = settings
+
+
+def process_segment(segment: Segment) -> SegmentResult:
+    """
+    Run the sampled frames of a segment through the decoder, detector, filter and record preparer stages of
+    the PPE detector. Frames are neither annotated nor uploaded, the records point to where the handler would
+    have put them.
+    :returns: the Firehose payloads of the frames, in order, and the number of frames read and failed
+    """
+    payloads = []
+    frames = failed = violations = 0
+    for timestamp, raw, width, height in read_segment(segment):
+        frames += 1
+        try:
+            img_bytes, _ = decoder.decode_frame(raw, width, height)
+            ppe_result = detector.submit_job(img_bytes, _settings.min_confidence, _backend)
+            filtered_resp = filter.filter_result(ppe_result, _settings.min_confidence, _settings.detect_helmet)
+            filename = filename_generator.generate_filename(timestamp, segment.camera, _settings.extension)
+            record = record_preparer.prepare_record(
+                segment.camera, filename, timestamp, filtered_resp, _settings.detect_helmet)
+        except Exception:
+            logger.exception(f'Failed processing frame {timestamp} of {segment.path}')
+            failed += 1
+            continue
+        if filtered_resp.violation_count >= 1:
+            violations += 1
+        payloads.append(record_writer.encode_record(record))
+    return SegmentResult(payloads, frames, failed, violations)
+
+
+def run_backfill(segments: List[Segment], backend_factory: Callable[[], object], output: BinaryIO,
+                 workers: int = 1, settings: Settings = Settings()) -> dict:
+    """
+    Process segments on a pool of worker processes and write their records as JSON lines, in the order of
+    the segments
+    :param `backend_factory` picklable callable creating the detector backend of a worker,
+        see `backends.backend_factory`
+    :param `output` binary file the records are written to
+    :param `workers` number of worker processes, 1 processes the segments in this process
+    :returns: counters and throughput of the backfill
+    """
+    start = timeit.default_timer()
+    results = []
+
+    def write(result: SegmentResult) -> None:
+        for payload in result.payloads:
+            output.write(payload + b'\n')
+        results.append(result)
+
+    if workers <= 1 or len(segments) <= 1:
+        init_worker(backend_factory, settings)
+        for segment in segments:
+            write(process_segment(segment))
+    else:
+        with multiprocessing.Pool(min(workers, len(segments)), init_worker, (backend_factory, settings)) as pool:
+            # One segment per task, segments are already long enough to amortize the pickling of their records
+            for result in pool.imap(process_segment, segments):
+                write(result)
+    output.flush()
+    elapsed = timeit.default_timer() - start
+
+    frames = sum(result.frames for result in results)
+    return {
+        "segments": len(segments),
+        "workers": workers,
+        "frames": frames,
+        "failedFrames": sum(result.failed for result in results),
+        "records": sum(len(result.payloads) for result in results),
+        "framesWithViolations": sum(result.violations for result in results),
+        "seconds": round(elapsed, 3),
+        "framesPerSecond": round(frames / elapsed, 2) if elapsed > 0 else 0,
+    }
@@ -0,0 +1,82 @@
+"""
+Throughput of the offline backfill with a growing number of worker processes, over a synthetic video made of a
+test frame panning across the picture, with Rekognition replaced by a fake answering after a configurable latency.
+With `--rekognition fixed:0` the workers only spend CPU and the speedup is bounded by the cores of the machine.
+
+Usage: python -m benchmark.bench_backfill [--workers 1 2 4 8] [--seconds 120] [--fps 2] [--segment-frames 10]
+                                          [--rekognition lognormal:180,0.3] [--video my-recording.mp4]
+"""
+import argparse
+import functools
+import json
+import os
+import tempfile
+
+from benchmark.timing import DATA_DIR
+from benchmark.fakes import FakeRekognition, Latency
+
+import cv2
+import numpy as np
+
+from backfill.frames import plan_source
+from backfill.pipeline import run_backfill
+
+RESPONSE_PATH = os.path.join(os.path.dirname(__file__), '../test/output/ppe-result.json')
+
+
+def fake_backend(response_path: str, latency: str, seed: int) -> FakeRekognition:
+    # Module-level factory taking plain arguments, so that it can be sent to the worker processes
+    with open(response_path) as fd:
+        response = json.load(fd)
+    return FakeRekognition([response], Latency(latency, seed + os.getpid()))
+
+
+def write_video(path: str, seconds: float, fps: int = 25) -> None:
+    frame = cv2.imread(os.path.join(DATA_DIR, '1480.png'))
+    height, width = frame.shape[:2]
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    for idx in range(int(seconds * fps)):
+        writer.write(np.roll(frame, idx * 4, axis=1))
+    writer.release()
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m benchmark.bench_backfill')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--video', help='video to backfill, a synthetic 25 fps video otherwise')
+    parser.add_argument('--seconds', type=float, default=120, help='length of the synthetic video')
+    parser.add_argument('--fps', type=float, default=2, help='frames analysed per second of video')
+    parser.add_argument('--segment-frames', type=int, default=10)
+    parser.add_argument('--rekognition', default='lognormal:180,0.3', help='latency of DetectProtectiveEquipment')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    os.environ.setdefault("PROCESSED_S3_BUCKET", "processed-frames")
+    with tempfile.TemporaryDirectory() as workdir:
+        video = args.video
+        if not video:
+            video = os.path.join(workdir, 'camera-1.mp4')
+            write_video(video, args.seconds)
+        segments = plan_source(video, args.fps, args.segment_frames, started_at=1616332635000)
+        factory = functools.partial(fake_backend, RESPONSE_PATH, args.rekognition, args.seed)
+
+        runs = []
+        for workers in args.workers:
+            with open(os.devnull, 'wb') as output:
+                runs.append(run_backfill(segments, factory, output, workers))
+    single = runs[0]["framesPerSecond"]
+    print(json.dumps({
+        "cpus": os.cpu_count(),
+        "frames": runs[0]["frames"],
+        "segments": len(segments),
+        "rekognition": args.rekognition,
+        "runs": [
+            dict(workers=run["workers"], framesPerSecond=run["framesPerSecond"], seconds=run["seconds"],
+                 speedup=round(run["framesPerSecond"] / single, 2))
+            for run in runs
+        ],
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""
+Measure the cold start of the handler in fresh interpreters: the time to import `index`, to create the AWS clients
+and to run the first and second invocation of one frame, with S3, Rekognition, Firehose and SNS replaced by local
+fakes answering at once. One more run under `python -X importtime` lists the slowest imports.
+
+Every mode runs with the settings of HANDLER_ENV, the default mode keeps X-Ray tracing on as deployed.
+
+Usage: python -m benchmark.bench_cold_start [--runs 5] [--top 15] [--env ENCODER_PRESET=webp-opencv ...]
+"""
+import argparse
+import importlib
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import timeit
+
+FUNCTION_DIR = os.path.join(os.path.dirname(__file__), '..')
+SERVICES = ['s3', 'rekognition', 'firehose', 'sns']
+
+IMPORTED_MARKER = '--- index imported ---'
+
+MODES = {
+    "default": {},
+    "tracingDisabled": {"POWERTOOLS_TRACE_DISABLED": "true"},
+}
+
+
+def child() -> None:
+    start = timeit.default_timer()
+    index = importlib.import_module('index')
+    import_ms = (timeit.default_timer() - start) * 1000
+    # Imports after the marker happen during the invocations, `slowest_imports` leaves them out
+    print(IMPORTED_MARKER, file=sys.stderr, flush=True)
+
+    from detectors_common import client_registry
+    start = timeit.default_timer()
+    for service in SERVICES:
+        client_registry.get_client(service)
+    clients_ms = (timeit.default_timer() - start) * 1000
+
+    import logging
+    from benchmark.bench_handler import OUTPUT_DIR, build_events, load_frames
+    from benchmark.fakes import FakeFirehose, FakeRekognition, FakeS3, FakeSNS, Latency
+    from benchmark.timing import DATA_DIR
+    logging.getLogger(index.logger.service).setLevel(logging.WARNING)
+    with open(os.path.join(OUTPUT_DIR, 'ppe-result.json')) as fd:
+        response = json.load(fd)
+    objects, events = build_events(load_frames(DATA_DIR), 2, 1, 1)
+    instant = Latency('fixed:0')
+    client_registry.register_client('s3', FakeS3(objects, instant, instant))
+    client_registry.register_client('rekognition', FakeRekognition([response], instant))
+    client_registry.register_client('firehose', FakeFirehose(instant))
+    client_registry.register_client('sns', FakeSNS(instant))
+
+    calls_ms = []
+    for event in events:
+        start = timeit.default_timer()
+        index.handler(event, None)
+        calls_ms.append((timeit.default_timer() - start) * 1000)
+    print(json.dumps({"importMs": import_ms, "clientsMs": clients_ms,
+                      "firstCallMs": calls_ms[0], "secondCallMs": calls_ms[1]}))
+
+
+def child_env(settings: dict) -> dict:
+    from benchmark.bench_handler import HANDLER_ENV
+    env = dict(os.environ, **HANDLER_ENV)
+    env.pop("POWERTOOLS_TRACE_DISABLED", None)
+    env.update({"LOG_LEVEL": "WARNING", "STAGE_METRICS": "false", "AWS_ACCESS_KEY_ID": "AKID",
+                "AWS_SECRET_ACCESS_KEY": "secret"})
+    env.update(settings)
+    return env
+
+
+def run_child(env: dict, importtime: bool = False) -> subprocess.CompletedProcess:
+    command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + [
+        '-m', 'benchmark.bench_cold_start', '--child']
+    return subprocess.run(command, cwd=FUNCTION_DIR, env=env, capture_output=True, text=True, check=True)
+
+
+def slowest_imports(stderr: str, top: int) -> dict:
+    """
+    Slowest packages imported along with `index`, by the largest cumulative import time of one of their modules,
+    in milliseconds. Packages importing each other count the same modules twice.
+    """
+    cumulative = {}
+    for line in stderr.split(IMPORTED_MARKER)[0].splitlines():
+        match = re.match(r'import time:\s+\d+ \|\s+(\d+) \| *(\S+)$', line)
+        if match:
+            package = match.group(2).split('.')[0]
+            cumulative[package] = max(cumulative.get(package, 0), int(match.group(1)) / 1000)
+    for own in ('index', 'main', 'benchmark', 'site', 'encodings'):
+        cumulative.pop(own, None)
+    slowest = sorted(cumulative.items(), key=lambda item: -item[1])[:top]
+    return {name: round(ms, 1) for name, ms in slowest}
+
+
+def summarise(samples: list) -> dict:
+    return {
+        name: round(statistics.median(sample[name] for sample in samples), 1)
+        for name in ("importMs", "clientsMs", "firstCallMs", "secondCallMs")
+    }
+
+
+def parse_env(text: str):
+    name, _, value = text.partition('=')
+    return name, value
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m benchmark.bench_cold_start')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--runs', type=int, default=5, help='fresh interpreters per mode')
+    parser.add_argument('--top', type=int, default=15, help='number of slowest imports listed')
+    parser.add_argument('--env', action='append', type=parse_env, default=[], metavar='NAME=VALUE',
+                        help='handler setting applied to every mode, e.g. ENCODER_PRESET=webp-opencv')
+    args = parser.parse_args()
+    if args.child:
+        child()
+        return
+
+    results = {}
+    for mode, settings in MODES.items():
+        env = child_env(dict(settings, **dict(args.env)))
+        # Warm the file system cache, the first interpreter reads every library from disk
+        run_child(env)
+        samples = [json.loads(run_child(env).stdout.splitlines()[-1]) for _ in range(args.runs)]
+        results[mode] = dict(summarise(samples), slowestImportsMs=slowest_imports(
+            run_child(env, importtime=True).stderr, args.top))
+    print(json.dumps({"runs": args.runs, "settings": dict(args.env), "modes": results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
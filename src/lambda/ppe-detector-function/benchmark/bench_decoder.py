@@ -0,0 +1,48 @@
+"""
+Compare the legacy imageio decode + PNG re-encode with the single-decode frame path
+
+Usage: python -m benchmark.bench_decoder [frame.png]
+"""
+import json
+import os
+import sys
+
+from benchmark.timing import DATA_DIR, measure
+
+import cv2
+
+from main.image_ops.decoder import decode_frame
+
+
+def legacy_decode(raw_frame: bytes):
+    # imageio is not a dependency of the function anymore, install it to run this benchmark
+    import imageio
+    img = imageio.get_reader(raw_frame, ".png")
+    frame = img.get_data(0)
+    img_str = cv2.imencode('.png', frame)[1].tobytes()
+    return img_str, frame
+
+
+def single_decode(raw_frame: bytes):
+    img_bytes, frame = decode_frame(raw_frame, 0, 0)
+    return img_bytes, frame.array
+
+
+def main(path: str):
+    with open(path, 'rb') as fd:
+        raw_frame = fd.read()
+
+    results = {
+        "frame": os.path.basename(path),
+        "frame_bytes": len(raw_frame),
+        # Bytes for Rekognition plus the array needed for drawing and resizing
+        "legacy_decode_and_reencode": measure(lambda: legacy_decode(raw_frame)),
+        "single_decode": measure(lambda: single_decode(raw_frame)),
+        # Frames that are neither drawn nor resized never pay for the decode
+        "rekognition_bytes_only": measure(lambda: decode_frame(raw_frame, 0, 0), number=1000),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1] if len(sys.argv) > 1 else os.path.join(DATA_DIR, '1480.png'))
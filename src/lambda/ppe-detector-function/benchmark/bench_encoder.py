@@ -0,0 +1,36 @@
+"""
+Measure encode time against output size for every encoder preset at our frame sizes
+
+Usage: python -m benchmark.bench_encoder [frame.png]
+"""
+import json
+import os
+import sys
+
+from benchmark.timing import DATA_DIR, measure
+
+import cv2
+
+from main.image_ops.encoder import PRESETS, encode_image
+
+FRAME_SIZES = [(480, 320), (640, 480), (1280, 720), (1920, 1080)]
+
+
+def main(path: str):
+    source = cv2.cvtColor(cv2.imread(path), cv2.COLOR_BGR2RGB)
+    results = []
+    for width, height in FRAME_SIZES:
+        frame = cv2.resize(source, dsize=(width, height), interpolation=cv2.INTER_LINEAR)
+        for name, preset in PRESETS.items():
+            image_bytes, _ = encode_image(frame, preset)
+            results.append({
+                "size": f'{width}x{height}',
+                "preset": name,
+                "output_bytes": len(image_bytes),
+                "encode": measure(lambda: encode_image(frame, preset), number=3, repeat=3),
+            })
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1] if len(sys.argv) > 1 else os.path.join(DATA_DIR, '1480.png'))
@@ -0,0 +1,129 @@
+"""
+Compare the dict-walking filter and record preparation with the array-based result model on crowded scenes
+
+Usage: python -m benchmark.bench_filter [persons ...]
+"""
+import json
+import os
+import random
+import sys
+
+from benchmark.timing import measure
+
+from main.firehose.record_preparer import prepare_record
+from main.ppedetection.filter import filter_result
+
+os.environ.setdefault("PROCESSED_S3_BUCKET", 'processed-frames')
+
+
+def make_response(person_count: int, seed: int = 0) -> dict:
+    rnd = random.Random(seed)
+    persons = []
+    for person_id in range(person_count):
+        body_parts = []
+        for name in ["FACE", "HEAD", "LEFT_HAND", "RIGHT_HAND"]:
+            detections = []
+            if rnd.random() < 0.6:
+                detections.append({"Confidence": rnd.uniform(50, 100), "Type": "FACE_COVER"})
+            body_parts.append({"Name": name, "Confidence": 99.0, "EquipmentDetections": detections})
+        persons.append({
+            "BodyParts": body_parts,
+            "BoundingBox": {"Width": rnd.random(), "Height": rnd.random(), "Left": rnd.random(), "Top": rnd.random()},
+            "Confidence": 99.0,
+            "Id": person_id
+        })
+    ids = list(range(person_count))
+    rnd.shuffle(ids)
+    return {
+        "Persons": persons,
+        "Summary": {
+            "PersonsWithRequiredEquipment": ids[:person_count // 3],
+            "PersonsWithoutRequiredEquipment": ids[person_count // 3:2 * person_count // 3],
+            "PersonsIndeterminate": ids[2 * person_count // 3:]
+        }
+    }
+
+
+def legacy_filter_result(ppe_res: dict, min_confidence: int, detect_helmet: str) -> dict:
+    incompliant_list = ppe_res["Summary"]["PersonsWithoutRequiredEquipment"]
+    incompliant_list += ppe_res["Summary"]["PersonsIndeterminate"]
+    ppl_without_equipment = []
+    ppl_without_equipment_idx = 0
+    ppl_with_equipment = []
+    if len(incompliant_list) >= 1:
+        for person in ppe_res["Persons"]:
+            if person["Id"] in incompliant_list:
+                ppl_without_equipment.append(person)
+                face_checked = False
+                head_checked = False
+                for bp in person["BodyParts"]:
+                    if bp["Name"] == "FACE":
+                        missing = not bp["EquipmentDetections"] or bp["EquipmentDetections"][0]["Confidence"] <= min_confidence
+                        ppl_without_equipment[ppl_without_equipment_idx]["MISSING_MASK"] = missing
+                        face_checked = True
+                    if detect_helmet == "true" and bp["Name"] == "HEAD":
+                        missing = not bp["EquipmentDetections"] or bp["EquipmentDetections"][0]["Confidence"] <= min_confidence
+                        ppl_without_equipment[ppl_without_equipment_idx]["MISSING_HELMET"] = missing
+                        head_checked = True
+                if not face_checked:
+                    ppl_without_equipment[ppl_without_equipment_idx]["MISSING_MASK"] = True
+                if detect_helmet == "true" and not head_checked:
+                    ppl_without_equipment[ppl_without_equipment_idx]["MISSING_HELMET"] = True
+                ppl_without_equipment_idx += 1
+            else:
+                ppl_with_equipment.append(person)
+    return {
+        "PersonsWithoutRequiredEquipment": ppl_without_equipment,
+        "PersonsWithRequiredEquipment": ppl_with_equipment,
+        "Summary": {
+            "SumPeopleWithRequiredEquipment": len(ppe_res["Persons"]) - len(incompliant_list),
+            "SumPeopleWithoutRequiredEquipment": len(incompliant_list)
+        }
+    }
+
+
+def legacy_prepare_record(filtered_response: dict) -> dict:
+    def to_record(person, missing_mask):
+        return {
+            "id": person["Id"],
+            "missingMask": missing_mask,
+            "boundingBox": {
+                "width": person["BoundingBox"]["Width"],
+                "height": person["BoundingBox"]["Height"],
+                "left": person["BoundingBox"]["Left"],
+                "top": person["BoundingBox"]["Top"]
+            }
+        }
+    return {
+        "personsWithRequiredEquipment": [to_record(p, False) for p in filtered_response["PersonsWithRequiredEquipment"]],
+        "personsWithoutRequiredEquipment": [to_record(p, p["MISSING_MASK"]) for p in filtered_response["PersonsWithoutRequiredEquipment"]],
+        "ppeViolationCount": filtered_response["Summary"]["SumPeopleWithoutRequiredEquipment"]
+    }
+
+
+def legacy_path(ppe_res: dict):
+    # The legacy filter extends the Summary lists in place, give it fresh ones as the handler did
+    fresh = dict(ppe_res, Summary={key: list(value) for key, value in ppe_res["Summary"].items()})
+    return legacy_prepare_record(legacy_filter_result(fresh, 80, "true"))
+
+
+def array_path(ppe_res: dict):
+    # Call the undecorated stages so both paths are measured without the tracer wrappers
+    result = filter_result.__wrapped__(ppe_res, 80, "true")
+    return prepare_record.__wrapped__('camera', 'frame.webp', '0', result, "true")
+
+
+def main(person_counts):
+    results = []
+    for person_count in person_counts:
+        ppe_res = make_response(person_count)
+        results.append({
+            "persons": person_count,
+            "legacy_filter_and_record": measure(lambda: legacy_path(ppe_res), number=20),
+            "array_filter_and_record": measure(lambda: array_path(ppe_res), number=20),
+        })
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main([int(count) for count in sys.argv[1:]] or [1, 10, 50, 200, 1000])
@@ -0,0 +1,237 @@
+"""
+End-to-end replay of PNG frames through the handler, as SQS batches of S3 notifications, with S3, Rekognition,
+Firehose and SNS replaced by local fakes answering after a configurable latency. Reports the stage metrics the
+handler emits, caught by an in-memory sink, the latency of frames and invocations, the frames per second and the
+peak RSS as JSON.
+
+Every replayed frame gets a distinct PNG text chunk, so byte-identical frames do not hit the response cache,
+while their pixels stay those of the source frame.
+
+Usage: python -m benchmark.bench_handler [--frames-dir test/data] [--frames 100] [--batch-size 10]
+                                         [--rekognition lognormal:150,0.3] [--env BATCH_WORKERS=4 ...]
+"""
+import argparse
+import functools
+import importlib
+import json
+import logging
+import os
+import resource
+import struct
+import threading
+import timeit
+import zlib
+from collections import defaultdict
+from typing import Callable, Dict, List
+
+from benchmark.timing import DATA_DIR
+from benchmark.fakes import FakeFirehose, FakeRekognition, FakeS3, FakeSNS, Latency
+
+import cv2
+
+OUTPUT_DIR = os.path.join(os.path.dirname(__file__), '../test/output')
+BUCKET = 'raw-frames'
+
+# Settings the handler reads at import, as deployed by lib/frame-processor-stack.ts
+HANDLER_ENV = {
+    "TARGET_IMAGE_WIDTH": "480",
+    "TARGET_IMAGE_HEIGHT": "320",
+    "MIN_DETECTION_CONFIDENCE": "80",
+    "SNS_TOPIC_ARN": "arn:aws:sns:us-east-1:123456789012:ppe-alarms",
+    "FIREHOSE_STREAM": "ppe-records",
+    "DETECT_HELMET": "false",
+    "PROCESSED_S3_BUCKET": "processed-frames",
+    "AWS_DEFAULT_REGION": "us-east-1",
+    "FIREHOSE_JOURNAL_PATH": "",
+}
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    samples = sorted(samples)
+
+    def at(fraction: float) -> float:
+        return round(samples[min(len(samples) - 1, int(fraction * len(samples)))], 3)
+
+    return {"count": len(samples), "p50_ms": at(0.5), "p95_ms": at(0.95), "p99_ms": at(0.99),
+            "total_ms": round(sum(samples), 1)}
+
+
+class StageTimer:
+    """
+    Time wrapped callables per stage, excluding the time spent in wrapped callables they call unless `inclusive`
+    """
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def wrap(self, name: str, fn: Callable, inclusive: bool = False) -> Callable:
+        @functools.wraps(fn)
+        def timed(*args, **kwargs):
+            stack = self._local.__dict__.setdefault('stack', [])
+            stack.append(0.0)
+            start = timeit.default_timer()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                elapsed = timeit.default_timer() - start
+                nested = stack.pop()
+                if stack:
+                    stack[-1] += elapsed
+                with self._lock:
+                    self.samples[name].append((elapsed if inclusive else elapsed - nested) * 1000)
+        return timed
+
+
+def with_text_chunk(png: bytes, text: str) -> bytes:
+    """
+    Insert a tEXt chunk before the IEND chunk of a PNG, changing its bytes but not its pixels
+    """
+    data = b'frame\x00' + text.encode('latin-1')
+    chunk = struct.pack('>I', len(data)) + b'tEXt' + data + struct.pack('>I', zlib.crc32(b'tEXt' + data))
+    iend = png.rindex(b'IEND') - 4
+    return png[:iend] + chunk + png[iend:]
+
+
+def load_frames(frames_dir: str) -> List[tuple]:
+    frames = []
+    for name in sorted(os.listdir(frames_dir)):
+        if name.lower().endswith('.png'):
+            with open(os.path.join(frames_dir, name), 'rb') as fd:
+                png = fd.read()
+            height, width = cv2.imread(os.path.join(frames_dir, name)).shape[:2]
+            frames.append((png, width, height))
+    if not frames:
+        raise ValueError(f'No PNG frames in {frames_dir}')
+    return frames
+
+
+def build_events(frames: List[tuple], count: int, batch_size: int, cameras: int):
+    objects = {}
+    keys = []
+    start_ms = 1616332635000
+    for idx in range(count):
+        png, width, height = frames[idx % len(frames)]
+        timestamp = start_ms + idx * 1000
+        key = f'camera-{idx % cameras}/{timestamp}.png'
+        objects[key] = (with_text_chunk(png, str(idx)), {
+            "timestamp": str(timestamp), "frame-width": str(width), "frame-height": str(height)})
+        keys.append(key)
+    events = []
+    for start in range(0, count, batch_size):
+        events.append({"Records": [
+            {
+                "messageId": f'message-{idx}',
+                "body": json.dumps({"Records": [{"s3": {"bucket": {"name": BUCKET}, "object": {"key": key}}}]}),
+                "eventSource": "aws:sqs",
+            }
+            for idx, key in enumerate(keys[start:start + batch_size], start)
+        ]})
+    return objects, events
+
+
+def instrument(index, timer: StageTimer) -> None:
+    # Every other stage is timed by the handler itself, through the stage metrics registry
+    index.analyse_frame = timer.wrap('analyse', index.analyse_frame)
+    index.firehose_writer.add = timer.wrap('firehoseAdd', index.firehose_writer.add)
+    index.alarm_notifier.submit = timer.wrap('alarmSubmit', index.alarm_notifier.submit)
+
+
+def emitted_metrics(sink) -> tuple:
+    """
+    Summarise the EMF documents of a run, percentiles of the durations and totals of the counts
+    """
+    durations, counts = {}, {}
+    for document in sink.documents:
+        for metric in document["_aws"]["CloudWatchMetrics"][0]["Metrics"]:
+            target = durations if metric["Unit"] == 'Milliseconds' else counts
+            target.setdefault(metric["Name"], []).extend(document[metric["Name"]])
+    return ({name: percentiles(values) for name, values in durations.items()},
+            {name: sum(values) for name, values in counts.items()})
+
+
+def parse_env(text: str):
+    name, _, value = text.partition('=')
+    return name, value
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m benchmark.bench_handler')
+    parser.add_argument('--frames-dir', default=DATA_DIR)
+    parser.add_argument('--frames', type=int, default=100, help='number of frames replayed')
+    parser.add_argument('--batch-size', type=int, default=10, help='frames per SQS batch')
+    parser.add_argument('--cameras', type=int, default=4)
+    parser.add_argument('--responses', nargs='+', default=[os.path.join(OUTPUT_DIR, 'ppe-result.json')],
+                        help='canned DetectProtectiveEquipment responses, replayed in turn')
+    parser.add_argument('--s3-get', default='lognormal:25,0.4', help='latency of S3 GetObject in ms')
+    parser.add_argument('--s3-put', default='lognormal:35,0.4', help='latency of S3 PutObject in ms')
+    parser.add_argument('--rekognition', default='lognormal:180,0.3', help='latency of DetectProtectiveEquipment')
+    parser.add_argument('--firehose', default='lognormal:30,0.3', help='latency of PutRecordBatch')
+    parser.add_argument('--sns', default='lognormal:30,0.3', help='latency of PublishBatch')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--env', action='append', type=parse_env, default=[], metavar='NAME=VALUE',
+                        help='handler setting, e.g. BATCH_WORKERS=4')
+    args = parser.parse_args()
+
+    for name, value in dict(HANDLER_ENV, **dict(args.env)).items():
+        os.environ[name] = value
+    index = importlib.import_module('index')
+    # The handler logger is created with level INFO, its per-stage lines would be timed along and mixed into the report
+    logging.getLogger(index.logger.service).setLevel(logging.WARNING)
+    from detectors_common import client_registry, stage_metrics
+
+    responses = []
+    for path in args.responses:
+        with open(path) as fd:
+            responses.append(json.load(fd))
+    objects, events = build_events(load_frames(args.frames_dir), args.frames, args.batch_size, args.cameras)
+    s3 = FakeS3(objects, Latency(args.s3_get, args.seed), Latency(args.s3_put, args.seed + 1))
+    rekognition = FakeRekognition(responses, Latency(args.rekognition, args.seed + 2))
+    firehose = FakeFirehose(Latency(args.firehose, args.seed + 3))
+    sns = FakeSNS(Latency(args.sns, args.seed + 4))
+    client_registry.reset()
+    for service, client in (('s3', s3), ('rekognition', rekognition), ('firehose', firehose), ('sns', sns)):
+        client_registry.register_client(service, client)
+
+    sink = stage_metrics.MemorySink()
+    stage_metrics.configure(sink=sink, enabled=True)
+    timer = StageTimer()
+    instrument(index, timer)
+    index.process_frame = timer.wrap('frame', index.process_frame, inclusive=True)
+    handler = timer.wrap('invocation', index.handler.__wrapped__, inclusive=True)
+
+    start = timeit.default_timer()
+    failures = 0
+    for event in events:
+        failures += len(handler(event, None)["batchItemFailures"])
+    elapsed = timeit.default_timer() - start
+
+    end_to_end = {name: percentiles(timer.samples.pop(name)) for name in ('frame', 'invocation')}
+    stages, counts = emitted_metrics(sink)
+    stages.update((name, percentiles(samples)) for name, samples in timer.samples.items())
+    print(json.dumps({
+        "frames": args.frames,
+        "invocations": len(events),
+        "batchSize": args.batch_size,
+        "failedMessages": failures,
+        "latency": {"s3Get": args.s3_get, "s3Put": args.s3_put, "rekognition": args.rekognition,
+                    "firehose": args.firehose, "sns": args.sns},
+        "settings": dict(args.env),
+        "stages": dict(sorted(stages.items())),
+        "counts": dict(sorted(counts.items())),
+        "emfDocuments": len(sink.documents),
+        "frame": end_to_end["frame"],
+        "invocation": end_to_end["invocation"],
+        "framesPerSecond": round(args.frames / elapsed, 2),
+        "rekognitionCalls": rekognition.calls,
+        "uploads": s3.uploaded,
+        "firehoseRecords": firehose.records,
+        "alarms": sns.messages,
+        # ru_maxrss is in kilobytes on Linux
+        "peakRssMb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+"""
+CPU cost of the motion gate per frame (thumbnail and background update), against the
+DetectProtectiveEquipment call it avoids. The decode of the frame is left out: the handler
+decodes every frame anyway to draw on it.
+
+Usage: python -m benchmark.bench_motion_gate [frame.png] [rekognition_latency_ms]
+"""
+import json
+import os
+import sys
+
+from benchmark.timing import DATA_DIR, measure
+
+import cv2
+
+from main.ppedetection.motion_gate import MotionGate, motion_thumbnail
+
+FRAME_SIZES = [(640, 480), (1280, 720), (1920, 1080)]
+
+
+def main(path: str, rekognition_ms: float):
+    source = cv2.cvtColor(cv2.imread(path), cv2.COLOR_BGR2RGB)
+    results = []
+    for width, height in FRAME_SIZES:
+        frame = cv2.resize(source, dsize=(width, height), interpolation=cv2.INTER_LINEAR)
+        gate = MotionGate(clock=lambda: 0.0)
+        gate.lookup('camera-1', motion_thumbnail(frame))
+        gate.store('camera-1', 'result')
+        timing = measure(lambda: gate.lookup('camera-1', motion_thumbnail(frame)), number=50)
+        results.append({
+            "size": f'{width}x{height}',
+            "gate": timing,
+            "thumbnail": measure(lambda: motion_thumbnail(frame), number=50),
+            "rekognition_call_ms": rekognition_ms,
+            "gate_cost_fraction_of_call": round(timing["median_ms"] / rekognition_ms, 5),
+        })
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1] if len(sys.argv) > 1 else os.path.join(DATA_DIR, '1480.png'),
+         float(sys.argv[2]) if len(sys.argv) > 2 else 400)
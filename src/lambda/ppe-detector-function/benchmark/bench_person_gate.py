@@ -0,0 +1,44 @@
+"""
+CPU cost of the local person detector per frame, at several detection widths, against the
+DetectProtectiveEquipment call a frame without anybody in view avoids. The decode of the frame is left out:
+the handler decodes every frame anyway to draw on it.
+
+Usage: python -m benchmark.bench_person_gate [frame.png] [rekognition_latency_ms] [backend]
+"""
+import json
+import os
+import sys
+
+from benchmark.timing import DATA_DIR, measure
+
+import cv2
+
+from main.ppedetection.person_gate import create_detector
+
+FRAME_SIZES = [(640, 480), (1280, 720), (1920, 1080)]
+DETECTION_WIDTHS = [320, 480, 640]
+
+
+def main(path: str, rekognition_ms: float, backend: str):
+    source = cv2.cvtColor(cv2.imread(path), cv2.COLOR_BGR2RGB)
+    results = []
+    for width, height in FRAME_SIZES:
+        frame = cv2.resize(source, dsize=(width, height), interpolation=cv2.INTER_LINEAR)
+        for detection_width in DETECTION_WIDTHS:
+            detector = create_detector(backend, detection_width)
+            timing = measure(lambda: detector.detect(frame), number=5, repeat=3)
+            results.append({
+                "size": f'{width}x{height}',
+                "detectionWidth": detection_width,
+                "candidates": len(detector.detect(frame)),
+                "detect": timing,
+                "rekognition_call_ms": rekognition_ms,
+                "detect_cost_fraction_of_call": round(timing["median_ms"] / rekognition_ms, 5),
+            })
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1] if len(sys.argv) > 1 else os.path.join(DATA_DIR, '1480.png'),
+         float(sys.argv[2]) if len(sys.argv) > 2 else 400,
+         sys.argv[3] if len(sys.argv) > 3 else 'hog')
@@ -0,0 +1,73 @@
+"""
+Compare the cost of timing the stages of a frame with one log line per stage against the stage metrics registry,
+flushed as one EMF document per invocation. The stages themselves do nothing, only the timing overhead is measured.
+
+Usage: python -m benchmark.bench_stage_metrics [frames per invocation ...]
+"""
+import io
+import json
+import sys
+import timeit
+
+from aws_lambda_powertools.logging import Logger
+
+from benchmark.timing import measure
+
+import main  # noqa: F401, puts the detectors-common layer on the path
+from detectors_common.stage_metrics import StageMetrics
+
+# Stages timed once per frame by the handler
+STAGES = ['download', 'prepare', 'decode', 'rekognition', 'filter', 'draw', 'resize', 'encode', 'upload', 'record']
+
+
+def legacy_invocation(logger: Logger, frames: int) -> None:
+    for _ in range(frames):
+        for stage in STAGES:
+            start_time = timeit.default_timer()
+            logger.info(f'{stage} completed after: {timeit.default_timer() - start_time}')
+
+
+def registry_invocation(metrics: StageMetrics, frames: int) -> None:
+    for _ in range(frames):
+        for stage in STAGES:
+            with metrics.stage(stage):
+                pass
+        metrics.count('frameBytes', 250000, 'Bytes')
+        metrics.count('persons', 4)
+    metrics.flush()
+
+
+def run(frame_counts):
+    # Log lines are formatted and written as in Lambda, into a buffer instead of stdout
+    stream = io.StringIO()
+    logger = Logger(service='ppe-detector', level='INFO', stream=stream)
+    metrics = StageMetrics(service='ppe-detector', sink=lambda document: stream.write(json.dumps(document, separators=(',', ':')) + '\n'))
+    results = []
+    for frames in frame_counts:
+        stream.seek(0)
+        stream.truncate()
+        legacy_invocation(logger, frames)
+        legacy_bytes = stream.tell()
+        stream.seek(0)
+        stream.truncate()
+        registry_invocation(metrics, frames)
+        registry_bytes = stream.tell()
+
+        legacy = measure(lambda: legacy_invocation(logger, frames), number=20)
+        registry = measure(lambda: registry_invocation(metrics, frames), number=20)
+        results.append({
+            "frames": frames,
+            "stages": frames * len(STAGES),
+            "logLines": {"legacy": frames * len(STAGES), "registry": 1 + (frames - 1) // 100},
+            "logBytes": {"legacy": legacy_bytes, "registry": registry_bytes},
+            "legacy": legacy,
+            "registry": registry,
+            "speedup": round(legacy["median_ms"] / registry["median_ms"], 1),
+        })
+        stream.seek(0)
+        stream.truncate()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    run([int(count) for count in sys.argv[1:]] or [1, 10, 50])
@@ -0,0 +1,118 @@
+"""
+In-process stand-ins for the S3, Rekognition, Firehose and SNS clients of the handler, answering after a
+latency drawn from a configurable distribution
+"""
+import copy
+import io
+import itertools
+import random
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+
+class Latency:
+    """
+    Latency distribution in milliseconds, parsed from `fixed:MS`, `uniform:LOW,HIGH` or `lognormal:MEDIAN,SIGMA`
+    """
+
+    def __init__(self, spec: str, seed: Optional[int] = None):
+        self.spec = spec
+        kind, _, args = spec.partition(':')
+        values = [float(value) for value in args.split(',') if value]
+        if kind == 'fixed':
+            self._draw = lambda rng: values[0]
+        elif kind == 'uniform':
+            self._draw = lambda rng: rng.uniform(values[0], values[1])
+        elif kind == 'lognormal':
+            self._draw = lambda rng: values[0] * rng.lognormvariate(0, values[1])
+        else:
+            raise ValueError(f'Unknown latency distribution {spec}')
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self) -> float:
+        with self._lock:
+            return self._draw(self._rng) / 1000
+
+    def wait(self) -> None:
+        delay = self.sample()
+        if delay > 0:
+            time.sleep(delay)
+
+
+class FakeS3:
+    """
+    :param `objects` dictionary of key to (body, metadata) served by get_object
+    """
+
+    def __init__(self, objects: Dict[str, Tuple[bytes, Dict[str, str]]], get_latency: Latency, put_latency: Latency):
+        self.objects = objects
+        self.get_latency = get_latency
+        self.put_latency = put_latency
+        self.uploaded = 0
+
+    def get_object(self, Bucket, Key, **kwargs):
+        self.get_latency.wait()
+        body, metadata = self.objects[Key]
+        return {"Body": io.BytesIO(body), "Metadata": dict(metadata), "ContentLength": len(body)}
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.put_latency.wait()
+        self.uploaded += 1
+        return {"ETag": '"fake"'}
+
+
+class FakeRekognition:
+    """
+    Replay canned DetectProtectiveEquipment responses in turn
+    """
+
+    def __init__(self, responses: List[dict], latency: Latency):
+        self._responses = itertools.cycle(responses)
+        self._lock = threading.Lock()
+        self.latency = latency
+        self.calls = 0
+
+    def detect_protective_equipment(self, Image, **kwargs):
+        self.latency.wait()
+        with self._lock:
+            self.calls += 1
+            response = next(self._responses)
+        return copy.deepcopy(response)
+
+
+class FakeFirehose:
+    def __init__(self, latency: Latency):
+        self.latency = latency
+        self.records = 0
+
+    def put_record(self, DeliveryStreamName, Record):
+        self.latency.wait()
+        self.records += 1
+        return {"RecordId": uuid.uuid4().hex, "Encrypted": False}
+
+    def put_record_batch(self, DeliveryStreamName, Records):
+        self.latency.wait()
+        self.records += len(Records)
+        return {"FailedPutCount": 0, "RequestResponses": [{"RecordId": uuid.uuid4().hex} for _ in Records]}
+
+
+class FakeSNS:
+    def __init__(self, latency: Latency):
+        self.latency = latency
+        self.messages = 0
+
+    def publish(self, TopicArn, Message, **kwargs):
+        self.latency.wait()
+        self.messages += 1
+        return {"MessageId": uuid.uuid4().hex}
+
+    def publish_batch(self, TopicArn, PublishBatchRequestEntries):
+        self.latency.wait()
+        self.messages += len(PublishBatchRequestEntries)
+        return {
+            "Successful": [{"Id": entry["Id"], "MessageId": uuid.uuid4().hex} for entry in PublishBatchRequestEntries],
+            "Failed": []
+        }
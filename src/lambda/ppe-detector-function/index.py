@@ -1,13 +1,14 @@
 import os
-import json
-from typing import Any, Dict
+import time
+from typing import Any, Dict, Optional
 from aws_lambda_powertools.logging import Logger
-from aws_lambda_powertools.tracing import Tracer
 from aws_lambda_powertools.utilities.typing import LambdaContext
 
-from main.image_ops import decoder, drawer, resizer
-from main.utils import uploader, filename_generator, frame_downloader
-from main.ppedetection import detector, filter, notifier
+from main.image_ops import decoder, drawer, resizer, encoder
+from main.utils import uploader, filename_generator, frame_downloader, batch_runner
+from detectors_common import client_registry, stage_metrics, tracing
+from main.ppedetection import detector, filter, notifier, similarity_gate, response_cache, motion_gate, budget_scheduler, person_gate
+from main.ppedetection.result_model import FrameResult
 from main.firehose import record_preparer, record_writer
 
 TARGET_IMAGE_WIDTH = int(os.environ["TARGET_IMAGE_WIDTH"])
@@ -16,58 +17,220 @@ MIN_CONFIDENCE = int(os.environ["MIN_DETECTION_CONFIDENCE"])
 SNS_TOPIC_ARN = os.environ["SNS_TOPIC_ARN"]
 DETECT_HELMET = os.environ["DETECT_HELMET"]
 TAREGT_FIREHOSE_STREAM = os.environ["FIREHOSE_STREAM"]
+# Number of frames of one SQS batch processed concurrently, 1 keeps the frames in sequence
+BATCH_WORKERS = int(os.environ.get("BATCH_WORKERS", "1"))
+# Reuse the result of the last analysed frame of a camera for near-identical frames
+SIMILARITY_GATE = os.environ.get("SIMILARITY_GATE", "false")
+SIMILARITY_MAX_DISTANCE = float(os.environ.get("SIMILARITY_MAX_DISTANCE", "2.0"))
+SIMILARITY_MAX_AGE_SECONDS = float(os.environ.get("SIMILARITY_MAX_AGE_SECONDS", "30"))
+SIMILARITY_MAX_CAMERAS = int(os.environ.get("SIMILARITY_MAX_CAMERAS", "128"))
+# Skip the analysis of frames without motion against the background of their camera
+MOTION_GATE = os.environ.get("MOTION_GATE", "false")
+MOTION_MIN_CHANGED_FRACTION = float(os.environ.get("MOTION_MIN_CHANGED_FRACTION", "0.01"))
+MOTION_PIXEL_THRESHOLD = int(os.environ.get("MOTION_PIXEL_THRESHOLD", "25"))
+MOTION_HEARTBEAT_SECONDS = float(os.environ.get("MOTION_HEARTBEAT_SECONDS", "60"))
+# Answer frames in which a local person detector finds nobody with an empty result, without calling Rekognition.
+# This trades recall for calls: HOG misses small, distant, seated or partly hidden persons that Rekognition finds,
+# so a camera's frames are only skipped after PERSON_GATE_MIN_EMPTY_FRAMES empty detections in a row, and a wide
+# shot needs a larger PERSON_GATE_WIDTH
+PERSON_GATE = os.environ.get("PERSON_GATE", "false")
+PERSON_GATE_BACKEND = os.environ.get("PERSON_GATE_BACKEND", "hog")
+PERSON_GATE_WIDTH = int(os.environ.get("PERSON_GATE_WIDTH", "640"))
+PERSON_GATE_THRESHOLD = float(os.environ.get("PERSON_GATE_THRESHOLD", "0"))
+PERSON_GATE_MIN_EMPTY_FRAMES = int(os.environ.get("PERSON_GATE_MIN_EMPTY_FRAMES", "3"))
+# Admit Rekognition calls against a budget per camera and one shared by the cameras of a container. Both are
+# per-container budgets: the stack sets BUDGET_CONTAINER_TPS to the account quota divided by the reserved concurrency
+BUDGET_SCHEDULER = os.environ.get("BUDGET_SCHEDULER", "false")
+BUDGET_CAMERA_TPS = float(os.environ.get("BUDGET_CAMERA_TPS", "0.5"))
+BUDGET_CAMERA_BURST = float(os.environ.get("BUDGET_CAMERA_BURST", "2"))
+BUDGET_CONTAINER_TPS = float(os.environ.get("BUDGET_CONTAINER_TPS", "1"))
+BUDGET_CONTAINER_BURST = float(os.environ.get("BUDGET_CONTAINER_BURST", "5"))
+BUDGET_PRIORITY_SECONDS = float(os.environ.get("BUDGET_PRIORITY_SECONDS", "60"))
+BUDGET_MAX_DEFER_SECONDS = float(os.environ.get("BUDGET_MAX_DEFER_SECONDS", "1"))
+# Serve byte-identical frames from a cache of Rekognition responses, 0 (the default) disables the cache
+RESPONSE_CACHE_SIZE = int(os.environ.get("RESPONSE_CACHE_SIZE", "0"))
+RESPONSE_CACHE_TTL_SECONDS = float(os.environ.get("RESPONSE_CACHE_TTL_SECONDS", "300"))
+RESPONSE_CACHE_SPILL_PATH = os.environ.get("RESPONSE_CACHE_SPILL_PATH")
+# Records Firehose does not accept are kept in this file and sent again on the next flush
+FIREHOSE_JOURNAL_PATH = os.environ.get("FIREHOSE_JOURNAL_PATH", "/tmp/firehose-journal.jsonl")
+FIREHOSE_JOURNAL_MAX_BYTES = int(os.environ.get("FIREHOSE_JOURNAL_MAX_BYTES", str(record_writer.MAX_JOURNAL_BYTES)))
+# Alarms of a camera within this many seconds of its last published alarm are suppressed and counted on the next one
+ALARM_COALESCE_SECONDS = float(os.environ.get("ALARM_COALESCE_SECONDS", "30"))
+# Output format of the processed frames, one of encoder.PRESETS
+OUTPUT_PRESET = encoder.PRESETS[os.environ.get("ENCODER_PRESET", "webp")]
+# Stage timings, byte and person counts of an invocation are emitted as one CloudWatch EMF log line
+STAGE_METRICS = os.environ.get("STAGE_METRICS", "true")
+METRICS_NAMESPACE = os.environ.get("METRICS_NAMESPACE", stage_metrics.NAMESPACE)
 
+# Seconds a frame may wait on one AWS request, retries included, well within the function timeout
+AWS_CALL_BUDGET_SECONDS = 7
+# (connect timeout, read timeout) in seconds per service
+AWS_SERVICE_TIMEOUTS = {
+    'rekognition': (1, 2),
+    's3': (1, 2),
+    'firehose': (1, 2),
+    'sns': (1, 2),
+}
+
+# Clients are created on first use by the registry and shared by every module and batch worker,
+# so size their connection pools for all of the workers
+client_registry.configure(
+    service='ppe-detector', call_budget_seconds=AWS_CALL_BUDGET_SECONDS, service_timeouts=AWS_SERVICE_TIMEOUTS,
+    default_timeouts=(1, 2), max_pool_connections=max(10, BATCH_WORKERS))
+stage_metrics.configure(service='ppe-detector', namespace=METRICS_NAMESPACE, enabled=STAGE_METRICS == "true")
 rek_client = None
 s3_client = None
 firehose_client = None
+sns_client = None
+
+similarity_filter = None
+if SIMILARITY_GATE == "true":
+    similarity_filter = similarity_gate.SimilarityGate(
+        SIMILARITY_MAX_DISTANCE, SIMILARITY_MAX_AGE_SECONDS, SIMILARITY_MAX_CAMERAS)
+
+motion_filter = None
+if MOTION_GATE == "true":
+    motion_filter = motion_gate.MotionGate(
+        MOTION_MIN_CHANGED_FRACTION, MOTION_PIXEL_THRESHOLD, heartbeat=MOTION_HEARTBEAT_SECONDS)
+
+person_filter = None
+if PERSON_GATE == "true":
+    person_filter = person_gate.PersonGate(person_gate.create_detector(
+        PERSON_GATE_BACKEND, PERSON_GATE_WIDTH, PERSON_GATE_THRESHOLD), PERSON_GATE_MIN_EMPTY_FRAMES)
+
+budget = None
+if BUDGET_SCHEDULER == "true":
+    budget = budget_scheduler.BudgetScheduler(
+        BUDGET_CAMERA_TPS, BUDGET_CAMERA_BURST, BUDGET_CONTAINER_TPS, BUDGET_CONTAINER_BURST,
+        priority_window=BUDGET_PRIORITY_SECONDS, max_defer=BUDGET_MAX_DEFER_SECONDS)
+
+detection_cache = None
+if RESPONSE_CACHE_SIZE > 0:
+    detection_cache = response_cache.ResponseCache(
+        RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL_SECONDS, RESPONSE_CACHE_SPILL_PATH)
+
+# Records of all frames of an invocation are delivered together when the handler returns
+firehose_writer = record_writer.BufferedRecordWriter(
+    TAREGT_FIREHOSE_STREAM, firehose_client, journal_path=FIREHOSE_JOURNAL_PATH,
+    journal_max_bytes=FIREHOSE_JOURNAL_MAX_BYTES)
+
+# Violations of a camera within one invocation are folded into one alarm, published before the handler returns
+# unless the camera had an alarm published less than ALARM_COALESCE_SECONDS ago
+alarm_notifier = notifier.AlarmNotifier(SNS_TOPIC_ARN, sns_client, window=ALARM_COALESCE_SECONDS)
 
 logger = Logger(service='ppe-detector', level='INFO')
-tracer = Tracer(service='ppe-detector')
+tracer = tracing.get_tracer('ppe-detector')
+
+
+def analyse_frame(camera_name: str, img_bytes: bytes, frame: decoder.DecodedFrame) -> Optional[FrameResult]:
+    """
+    Get the filtered PPE result of a frame, skipping the Rekognition call when a gate can answer for it
+    :returns: None when the frame does not fit the Rekognition budget
+    """
+    if motion_filter:
+        # Every frame feeds the background model, so the motion gate is consulted first
+        filtered_resp = motion_filter.lookup(camera_name, motion_gate.motion_thumbnail(frame.array))
+        if filtered_resp is not None:
+            return filtered_resp
+
+    signature = None
+    if similarity_filter:
+        signature = similarity_gate.compute_signature(frame.array)
+        filtered_resp = similarity_filter.lookup(camera_name, signature)
+        if filtered_resp is not None:
+            return filtered_resp
+
+    filtered_resp = None
+    if person_filter:
+        # Frames without anybody in view are answered before they take a Rekognition budget token
+        filtered_resp = person_filter.lookup(camera_name, frame.array)
+
+    if filtered_resp is None:
+        if budget and budget.admit(camera_name) == budget_scheduler.DROP:
+            return None
+        ppe_result = detector.submit_job(
+            img_bytes, MIN_CONFIDENCE, rek_client, detection_cache)
+        filtered_resp = filter.filter_result(ppe_result, MIN_CONFIDENCE, DETECT_HELMET)
+
+    if similarity_filter:
+        similarity_filter.store(camera_name, signature, filtered_resp)
+    if motion_filter:
+        motion_filter.store(camera_name, filtered_resp)
+    return filtered_resp
+
+
+def process_frame(src_s3bucket: str, src_s3key: str) -> None:
+    """
+    Run one frame through detection, annotation, upload, Firehose and alarm stages
+    :param `src_s3bucket` bucket of the raw frame
+    :param `src_s3key` key of the raw frame, prefixed by the camera name
+    """
+    frame_bytes, metadata = frame_downloader.download_frame(
+        src_s3bucket, src_s3key, s3_client)
+    camera_name = src_s3key.split("/")[0]
+    timestamp = metadata["timestamp"]
+    frame_width = int(metadata["frame-width"])
+    frame_height = int(metadata["frame-height"])
+    img_bytes, frame = decoder.decode_frame(
+        frame_bytes, frame_width, frame_height)
+    filtered_resp = analyse_frame(camera_name, img_bytes, frame)
+    if filtered_resp is None:
+        logger.info(f'Frame {src_s3key} dropped, camera {camera_name} is over its Rekognition budget')
+        return
+    if "stream-started-at" in metadata:
+        # Only the first frame a parser uploads for a stream carries the time the video of the stream started
+        first_frame_latency = time.time() - int(metadata["stream-started-at"]) / 1000
+        stage_metrics.record('firstFrameLatency', first_frame_latency, 'Seconds', {"cameraId": camera_name})
+        logger.info({"cameraId": camera_name, "firstFrameLatencySeconds": round(first_frame_latency, 3)})
+    ppl_without_PPE = filtered_resp.violation_count
+    image = frame.array
+    if ppl_without_PPE >= 1:
+        for person in filtered_resp.persons_without_required_equipment():
+            image = drawer.draw_bounding_box(
+                person.bounding_box, image)
+    filename = filename_generator.generate_filename(
+        timestamp, camera_name, OUTPUT_PRESET.extension)
+    resized_image = resizer.resize_image(
+        image, TARGET_IMAGE_WIDTH, TARGET_IMAGE_HEIGHT)
+    image_bytes, content_type = encoder.encode_image(resized_image, OUTPUT_PRESET)
+    uploader.upload_s3(image_bytes, filename, ppl_without_PPE, s3_client, content_type)
+
+    record = record_preparer.prepare_record(
+        camera_name, filename, timestamp, filtered_resp, DETECT_HELMET)
+    firehose_writer.add(record)
+
+    if ppl_without_PPE >= 1:
+        alarm_notifier.submit(record)
+        if budget:
+            budget.record_violation(camera_name)
 
 
 @tracer.capture_lambda_handler
 def handler(event: Dict[str, Any], context: LambdaContext):
     logger.info(event)
-    for record in event["Records"]:
-        rec = json.loads(record["body"])
-        try:
-            s3_records = rec["Records"]
-        except KeyError:
-            logger.warn("No records found in ")
-            logger.info(rec)
-            continue
-        for s3e in s3_records:
-            src_s3bucket = s3e["s3"]["bucket"]["name"]
-            src_s3key = s3e["s3"]["object"]["key"]
-            frame_bytes, metadata = frame_downloader.download_frame(
-                src_s3bucket, src_s3key, s3_client)
-            camera_name = src_s3key.split("/")[0]
-            timestamp = metadata["timestamp"]
-            frame_width = int(metadata["frame-width"])
-            frame_height = int(metadata["frame-height"])
-            img_str, image = decoder.decode_frame(
-                frame_bytes, frame_width, frame_height)
-            ppe_result = detector.submit_job(
-                img_str, MIN_CONFIDENCE, rek_client)
-            filtered_resp = filter.filter_result(ppe_result, MIN_CONFIDENCE, DETECT_HELMET)
-            ppl_without_PPE = filtered_resp["Summary"]["SumPeopleWithoutRequiredEquipment"]
-            if ppl_without_PPE >= 1:
-                for person in filtered_resp["PersonsWithoutRequiredEquipment"]:
-                    image = drawer.draw_bounding_box(
-                        person["BoundingBox"], image)
-            filename = filename_generator.generate_filename(
-                timestamp, camera_name)
-            tmp_file = resizer.resize_image(
-                image, filename, TARGET_IMAGE_WIDTH, TARGET_IMAGE_HEIGHT)
-            uploader.upload_s3(tmp_file, ppl_without_PPE, s3_client)
-
-            record = record_preparer.prepare_record(
-                camera_name, filename, timestamp, filtered_resp, DETECT_HELMET)
-            record_writer.write_record(record, TAREGT_FIREHOSE_STREAM, firehose_client)
-
-            if ppl_without_PPE >= 1:
-                sns_status = notifier.notify_alarm(SNS_TOPIC_ARN, record)
+    batch_item_failures = batch_runner.run_batch(
+        event["Records"], process_frame, BATCH_WORKERS)
+    firehose_writer.flush()
+    alarm_notifier.flush()
+    # Counters of the container are sent along the stage metrics, as properties of the same log line
+    stats = client_registry.connection_stats()
+    if similarity_filter:
+        stats.update(similarity_filter.stats())
+    if motion_filter:
+        stats.update(motion_filter.stats())
+    if person_filter:
+        stats.update(person_filter.stats())
+    if budget:
+        stats.update(budget.stats())
+    if detection_cache:
+        detection_cache.save()
+        stats.update(detection_cache.stats())
+    if STAGE_METRICS == "true":
+        stage_metrics.flush(stats)
+    else:
+        logger.info(stats)
     return {
         "statusCode": 200,
-        "body": {"processed": "true"}
+        "body": {"processed": "true"},
+        "batchItemFailures": batch_item_failures
     }
@@ -1,56 +1,46 @@
 import os
-import timeit
 
 from aws_lambda_powertools.logging import Logger
-from aws_lambda_powertools.tracing import Tracer
+
+from main.ppedetection.result_model import FrameResult
+from detectors_common import stage_metrics, tracing
 
 
 logger = Logger(service='ppe-detector', child=True)
-tracer = Tracer(service='ppe-detector')
+tracer = tracing.get_tracer('ppe-detector')
 
 
 @tracer.capture_method(capture_response=False)
-def prepare_record(camera_name: str, filename: str, timestamp: str, filtered_response: dict, detect_helmet: str) -> dict:
+@stage_metrics.timed('record')
+def prepare_record(camera_name: str, filename: str, timestamp: str, filtered_response: FrameResult, detect_helmet: str) -> dict:
     """
     Transform data into JSON format for Firehose input
 
-    @param `filtered_response` dict returned from `filter_result` function
+    @param `filtered_response` result returned from `filter_result` function
     """
 
-    start_time = timeit.default_timer()
-
     pplWithEquipment = []
-    for person in filtered_response["PersonsWithRequiredEquipment"]:
-        ppl_with_equipment = {
-            "id": person["Id"],
-            "missingMask": False,
-            "missingHelmet": False,
-            "boundingBox": {
-                "width": person["BoundingBox"]["Width"],
-                "height": person["BoundingBox"]["Height"],
-                "left": person["BoundingBox"]["Left"],
-                "top": person["BoundingBox"]["Top"]
-            }
-        }
-        if detect_helmet == "true":
-            ppl_with_equipment["missingHelmet"] == False
-        pplWithEquipment.append(ppl_with_equipment)
-
     pplWithoutEquipment = []
-    for person in filtered_response["PersonsWithoutRequiredEquipment"]:
-        ppl_without_equipment = {
-            "id": person["Id"],
-            "missingMask": True if person["MISSING_MASK"] == True else False,
+    for id, (width, height, left, top), violating, missing_mask, missing_helmet in zip(
+            filtered_response.ids.tolist(), filtered_response.boxes.tolist(), filtered_response.violating.tolist(),
+            filtered_response.missing_mask.tolist(), filtered_response.missing_helmet.tolist()):
+        person = {
+            "id": id,
+            "missingMask": missing_mask if violating else False,
             "boundingBox": {
-                "width": person["BoundingBox"]["Width"],
-                "height": person["BoundingBox"]["Height"],
-                "left": person["BoundingBox"]["Left"],
-                "top": person["BoundingBox"]["Top"]
+                "width": width,
+                "height": height,
+                "left": left,
+                "top": top
             }
         }
-        if detect_helmet == "true":
-            ppl_without_equipment["missingHelmet"] == True if person["MISSING_HELMET"] == True else False
-        pplWithoutEquipment.append(ppl_without_equipment)
+        if violating:
+            if detect_helmet == "true":
+                person["missingHelmet"] = missing_helmet
+            pplWithoutEquipment.append(person)
+        else:
+            person["missingHelmet"] = False
+            pplWithEquipment.append(person)
 
     record = {
         "cameraId": camera_name,
@@ -60,11 +50,8 @@ def prepare_record(camera_name: str, filename: str, timestamp: str, filtered_res
             "personsWithRequiredEquipment": pplWithEquipment,
             "personsWithoutRequiredEquipment": pplWithoutEquipment
         },
-        "ppeViolationCount": filtered_response["Summary"]["SumPeopleWithoutRequiredEquipment"],
-        "pplCount": filtered_response["Summary"]["SumPeopleWithoutRequiredEquipment"] + filtered_response["Summary"]["SumPeopleWithRequiredEquipment"]
+        "ppeViolationCount": filtered_response.violation_count,
+        "pplCount": filtered_response.person_count
     }
 
-    logger.info(
-        f'Record preparation completed after: {timeit.default_timer() - start_time}')
-
     return record
@@ -1,35 +1,222 @@
-import boto3
-import timeit
+import botocore
+import os
+import threading
+import time
 import json
+from typing import List, Optional
 from aws_lambda_powertools.logging import Logger
-from aws_lambda_powertools.tracing import Tracer
 
-logger = Logger(service='ppe-detector', child=True)
-tracer = Tracer(service='ppe-detector')
+from detectors_common import client_registry, stage_metrics, tracing
 
-@tracer.capture_method(capture_response=False)
-def write_record(record: dict, stream_name: str, firehose_client: None):
+logger = Logger(service='ppe-detector', child=True)
+tracer = tracing.get_tracer('ppe-detector')
 
-    start_time = timeit.default_timer()
+# Firehose limits for one PutRecordBatch request
+MAX_BATCH_RECORDS = 500
+MAX_BATCH_BYTES = 4 * 1024 * 1024
+# Largest record Firehose accepts, a larger one would fail its whole batch
+MAX_RECORD_BYTES = 1000 * 1024
+# Default size cap of the journal, the oldest records are dropped beyond it
+MAX_JOURNAL_BYTES = 10 * 1024 * 1024
+# Errors worth sending the records again, any other error (AccessDenied, ResourceNotFound, validation...)
+# fails the same way on every attempt
+RETRYABLE_ERRORS = {
+    'ServiceUnavailableException',
+    'ServiceUnavailable',
+    'ThrottlingException',
+    'LimitExceededException',
+    'InternalFailure',
+    'InternalFailureException',
+    'RequestTimeout',
+}
 
-    if firehose_client == None:
-        firehose_client = boto3.client('firehose')
 
+def encode_record(record: dict) -> bytes:
+    """
+    Serialize a record as delivered to Firehose, its timestamp is changed to a number in place
+    """
     # Change timestamp to long format for ElasticSearch to identify as date
     record["ts"] = int(record["ts"])
+    return json.dumps(record).encode('utf-8')
+
+
+class BufferedRecordWriter:
+    """
+    Buffer Firehose records and deliver them with PutRecordBatch
+    :param `stream_name` name of the Firehose delivery stream
+    :param `firehose_client` Firehose client, created when None
+    :param `max_records` number of buffered records that triggers a flush
+    :param `max_bytes` size of the buffered records that triggers a flush
+    :param `journal_path` optional file, e.g. under /tmp, keeping records Firehose did not accept because of
+        throttling or a service error until the next flush
+    :param `journal_max_bytes` size of the journal from which its oldest records are dropped
+    :param `max_attempts` number of times failed entries of a batch are sent before being journaled
+    :param `backoff` seconds to wait before the first resend, doubled on every attempt
+    """
+
+    def __init__(self, stream_name: str, firehose_client=None, max_records: int = MAX_BATCH_RECORDS,
+                 max_bytes: int = MAX_BATCH_BYTES, journal_path: Optional[str] = None, max_attempts: int = 3,
+                 backoff: float = 0.05, journal_max_bytes: int = MAX_JOURNAL_BYTES):
+        self.stream_name = stream_name
+        self._firehose_client = firehose_client
+        self.max_records = min(max_records, MAX_BATCH_RECORDS)
+        self.max_bytes = min(max_bytes, MAX_BATCH_BYTES)
+        self.journal_path = journal_path
+        self.journal_max_bytes = journal_max_bytes
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.delivered = 0
+        self.journaled = 0
+        self.dropped = 0
+        self._buffer: List[bytes] = []
+        self._buffer_bytes = 0
+        self._lock = threading.Lock()
+        self._journal_lock = threading.Lock()
+
+    @property
+    def firehose_client(self):
+        # Resolved on first use so that building the writer at import time opens no connection
+        if self._firehose_client is None:
+            self._firehose_client = client_registry.get_client('firehose')
+        return self._firehose_client
+
+    def add(self, record: dict) -> None:
+        """
+        Buffer a record, flushing the buffer once it reaches the count or size threshold
+        """
+        payload = encode_record(record)
+        if len(payload) > MAX_RECORD_BYTES:
+            logger.error(
+                f'Dropping record of camera {record.get("cameraId")}, {len(payload)} bytes over the Firehose limit')
+            self._count_dropped(1)
+            return
+
+        with self._lock:
+            self._buffer.append(payload)
+            self._buffer_bytes += len(payload)
+            full = len(self._buffer) >= self.max_records or self._buffer_bytes >= self.max_bytes
+        if full:
+            self.flush()
+
+    @tracer.capture_method(capture_response=False)
+    @stage_metrics.timed('firehoseFlush')
+    def flush(self) -> int:
+        """
+        Send the journaled and buffered records
+        :returns: number of records delivered to Firehose
+        """
+        with self._lock:
+            payloads, self._buffer, self._buffer_bytes = self._buffer, [], 0
+        payloads = self._read_journal() + payloads
+        if not payloads:
+            return 0
+
+        delivered = 0
+        for batch in self._batches(payloads):
+            delivered += self._send(batch)
+        self.delivered += delivered
+
+        stage_metrics.count('firehoseRecords', delivered)
+        logger.info(f'{delivered} of {len(payloads)} records put to Firehose')
+        return delivered
+
+    def _batches(self, payloads: List[bytes]) -> List[List[bytes]]:
+        batches = [[]]
+        batch_bytes = 0
+        for payload in payloads:
+            if len(batches[-1]) >= self.max_records or (batches[-1] and batch_bytes + len(payload) > self.max_bytes):
+                batches.append([])
+                batch_bytes = 0
+            batches[-1].append(payload)
+            batch_bytes += len(payload)
+        return batches
+
+    def _send(self, batch: List[bytes]) -> int:
+        pending = batch
+        for attempt in range(self.max_attempts):
+            if attempt > 0:
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+            try:
+                resp = self.firehose_client.put_record_batch(
+                    DeliveryStreamName=self.stream_name,
+                    Records=[{'Data': payload} for payload in pending]
+                )
+            except botocore.exceptions.ClientError as e:
+                code = e.response.get("Error", {}).get("Code")
+                if code not in RETRYABLE_ERRORS:
+                    logger.error(f'Dropping {len(pending)} records, PutRecordBatch failed with {code}: {e}')
+                    self._count_dropped(len(pending))
+                    return len(batch) - len(pending)
+                logger.warning(f'PutRecordBatch of {len(pending)} records failed: {e}')
+                continue
+            except botocore.exceptions.BotoCoreError as e:
+                # Connection errors and timeouts
+                logger.warning(f'PutRecordBatch of {len(pending)} records failed: {e}')
+                continue
+            if resp["FailedPutCount"] == 0:
+                pending = []
+                break
+            # Only resend the entries Firehose reports as failed with an error that may go away
+            failed = [(payload, entry["ErrorCode"]) for payload, entry in zip(pending, resp["RequestResponses"])
+                      if "ErrorCode" in entry]
+            pending = [payload for payload, code in failed if code in RETRYABLE_ERRORS]
+            permanent = sorted({code for _, code in failed if code not in RETRYABLE_ERRORS})
+            if permanent:
+                logger.error(
+                    f'Dropping {len(failed) - len(pending)} records rejected by Firehose with {", ".join(permanent)}')
+                self._count_dropped(len(failed) - len(pending))
+            if not pending:
+                break
+            logger.warning(f'{len(pending)} records rejected by Firehose, attempt {attempt + 1} of {self.max_attempts}')
+
+        delivered = len(batch) - len(pending)
+        if pending:
+            self._write_journal(pending)
+        return delivered
+
+    def _count_dropped(self, count: int) -> None:
+        with self._lock:
+            self.dropped += count
+
+    def _write_journal(self, payloads: List[bytes]) -> None:
+        if not self.journal_path:
+            logger.error(f'Dropping {len(payloads)} records Firehose did not accept')
+            self._count_dropped(len(payloads))
+            return
+        with self._journal_lock:
+            try:
+                with open(self.journal_path, 'rb') as fd:
+                    kept = [line.rstrip(b'\n') for line in fd if line.strip()]
+            except FileNotFoundError:
+                kept = []
+            kept.extend(payloads)
+            # Keep the newest records under the size cap, so that a long outage cannot fill /tmp
+            size = sum(len(payload) + 1 for payload in kept)
+            oldest = 0
+            while size > self.journal_max_bytes and oldest < len(kept):
+                size -= len(kept[oldest]) + 1
+                oldest += 1
+            with open(self.journal_path + '.tmp', 'wb') as fd:
+                for payload in kept[oldest:]:
+                    fd.write(payload + b'\n')
+            os.replace(self.journal_path + '.tmp', self.journal_path)
+        self.journaled += len(payloads)
+        if oldest:
+            logger.error(
+                f'Journal {self.journal_path} over {self.journal_max_bytes} bytes, dropped its {oldest} oldest records')
+            self._count_dropped(oldest)
+        logger.warning(f'{len(payloads)} records spilled to {self.journal_path}')
 
-    payload = json.dumps(record).encode('utf-8')
-    
-    try:
-        firehose_resp = firehose_client.put_record(
-            DeliveryStreamName=stream_name,
-            Record={
-                'Data': payload
-            }
-        )
-
-        recordId = firehose_resp["RecordId"]
-        logger.info(f'Record with id {recordId} put to Firehose after {timeit.default_timer() - start_time}')
-    except Exception as e:
-        logger.error('Failed to put record to Firehose')
-        logger.error(e)
+    def _read_journal(self) -> List[bytes]:
+        if not self.journal_path:
+            return []
+        with self._journal_lock:
+            try:
+                with open(self.journal_path, 'rb') as fd:
+                    payloads = [line.rstrip(b'\n') for line in fd if line.strip()]
+            except FileNotFoundError:
+                return []
+            os.remove(self.journal_path)
+        if payloads:
+            logger.info(f'Replaying {len(payloads)} records from {self.journal_path}')
+        return payloads
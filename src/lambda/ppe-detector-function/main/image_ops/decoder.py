@@ -1,34 +1,62 @@
-from typing import Tuple
+from typing import Optional, Tuple
 import numpy as np
-import imageio
-import timeit
 import cv2
 
 from aws_lambda_powertools.logging import Logger
-from aws_lambda_powertools.tracing import Tracer
+
+from detectors_common import stage_metrics, tracing
 
 
 logger = Logger(service='ppe-detector', child=True)
-tracer = Tracer(service='ppe-detector')
+tracer = tracing.get_tracer('ppe-detector')
+
+# Largest image Rekognition accepts as raw bytes
+MAX_REKOGNITION_IMAGE_BYTES = 5 * 1024 * 1024
+
+
+class DecodedFrame:
+    """
+    Frame received from the parser, decoded into an RGB numpy array only on first access to `array`
+    """
+
+    __slots__ = ('raw', 'width', 'height', '_array')
+
+    def __init__(self, raw: bytes, width: int, height: int):
+        self.raw = raw
+        self.width = width
+        self.height = height
+        self._array: Optional[np.ndarray] = None
+
+    @property
+    def array(self) -> np.ndarray:
+        if self._array is None:
+            with stage_metrics.stage('decode'):
+                frame = cv2.imdecode(np.frombuffer(self.raw, dtype=np.uint8), cv2.IMREAD_COLOR)
+                if frame is None:
+                    raise ValueError('Frame bytes could not be decoded as an image')
+                # Drawing and encoding stages expect RGB channel order
+                self._array = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        return self._array
+
 
 @tracer.capture_method(capture_response=False)
-def decode_frame(raw_frame: bytes, frame_width: int, frame_height: int) -> Tuple[str, np.ndarray]:
+@stage_metrics.timed('prepare')
+def decode_frame(raw_frame: bytes, frame_width: int, frame_height: int) -> Tuple[bytes, DecodedFrame]:
     """
-    Decode the image bytes into string compatible with OpenCV
-    :param raw_frame: frame data in bytes
+    Prepare the image bytes for Rekognition and wrap the frame for lazy decoding
+    :param raw_frame: PNG frame data in bytes, as written by the parser
     :param frame_width width of the frame, obtained from Kinesis payload
     :param frame_height height of the frame, obtained from Kinesis payload
+    :returns: Tuple of image bytes for Rekognition and the lazily decoded frame
     """
 
-    start_time = timeit.default_timer()
-    # frameBuffer = Image.frombytes('RGB', (frame_width, frame_height), raw_frame)
-    # frameBuffer.save("./h264decoded.png", "png")
-    # frame = np.array(frameBuffer)
-    # img_str = cv2.imencode('.jpg', frame)[1].tostring()
+    frame = DecodedFrame(raw_frame, frame_width, frame_height)
 
-    img = imageio.get_reader(raw_frame, ".png")
-    frame: np.ndarray = img.get_data(0)
-    img_str = cv2.imencode('.png', frame)[1].tostring()
+    # Rekognition accepts the parser's PNG as is, only re-encode frames over the size limit
+    img_bytes = raw_frame
+    if len(raw_frame) > MAX_REKOGNITION_IMAGE_BYTES:
+        img_bytes = cv2.imencode('.jpg', cv2.cvtColor(frame.array, cv2.COLOR_RGB2BGR),
+                                 [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()
 
-    logger.info(f'Decoded frame after: {timeit.default_timer() - start_time}')
-    return img_str, frame
+    stage_metrics.count('frameBytes', len(raw_frame), 'Bytes')
+    return img_bytes, frame
@@ -0,0 +1,66 @@
+from typing import Dict, NamedTuple, Tuple
+import io
+import cv2
+import numpy as np
+
+from aws_lambda_powertools.logging import Logger
+
+from detectors_common import stage_metrics, tracing
+
+
+logger = Logger(service='ppe-detector', child=True)
+tracer = tracing.get_tracer('ppe-detector')
+
+
+class EncoderPreset(NamedTuple):
+    """
+    Output format of the processed frames
+    :param `extension` file extension of the frame in S3
+    :param `content_type` MIME type of the frame in S3
+    :param `library` 'pillow' (libwebp with method control) or 'opencv' (libwebp, libjpeg-turbo)
+    :param `quality` encoder quality from 0 to 100
+    :param `method` WebP compression effort from 0 (fast) to 6 (small), Pillow only
+    """
+    extension: str
+    content_type: str
+    library: str
+    quality: int
+    method: int = 4
+
+
+PRESETS: Dict[str, EncoderPreset] = {
+    # Pillow defaults, same output as the frames written to /tmp before
+    "webp": EncoderPreset('.webp', 'image/webp', 'pillow', 80, 4),
+    "webp-fast": EncoderPreset('.webp', 'image/webp', 'pillow', 75, 0),
+    "webp-small": EncoderPreset('.webp', 'image/webp', 'pillow', 70, 6),
+    "webp-opencv": EncoderPreset('.webp', 'image/webp', 'opencv', 80),
+    "jpeg": EncoderPreset('.jpg', 'image/jpeg', 'opencv', 85),
+}
+
+
+@tracer.capture_method(capture_response=False)
+@stage_metrics.timed('encode')
+def encode_image(frame: np.ndarray, preset: EncoderPreset) -> Tuple[bytes, str]:
+    """
+    Encode a frame in memory
+    :param `frame`: RGB frame data in numpy array
+    :param `preset`: output format, one of `PRESETS`
+    :returns: Tuple of the encoded image bytes and its content type
+    """
+
+    if preset.library == 'pillow':
+        # Pillow is only loaded by the presets using it, the OpenCV presets start without it
+        from PIL import Image
+        buffer = io.BytesIO()
+        Image.fromarray(frame).save(buffer, 'webp', quality=preset.quality, method=preset.method)
+        image_bytes = buffer.getvalue()
+    else:
+        if preset.extension == '.jpg':
+            params = [cv2.IMWRITE_JPEG_QUALITY, preset.quality]
+        else:
+            params = [cv2.IMWRITE_WEBP_QUALITY, preset.quality]
+        # OpenCV encoders expect BGR channel order
+        image_bytes = cv2.imencode(preset.extension, cv2.cvtColor(frame, cv2.COLOR_RGB2BGR), params)[1].tobytes()
+
+    stage_metrics.count('encodedBytes', len(image_bytes), 'Bytes')
+    return image_bytes, preset.content_type
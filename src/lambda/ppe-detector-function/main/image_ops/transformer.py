@@ -4,11 +4,12 @@ import cv2
 import numpy as np
 
 from aws_lambda_powertools.logging import Logger
-from aws_lambda_powertools.tracing import Tracer
+
+from detectors_common import tracing
 
 
 logger = Logger(service='ppe-detector', child=True)
-tracer = Tracer(service='ppe-detector')
+tracer = tracing.get_tracer('ppe-detector')
 
 # Transform the frame into jpg file before storing to S3
 @tracer.capture_method(capture_response=False)
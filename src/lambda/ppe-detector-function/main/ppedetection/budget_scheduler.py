@@ -0,0 +1,157 @@
+from collections import OrderedDict
+from typing import Callable, Dict
+import threading
+import time
+
+from aws_lambda_powertools.logging import Logger
+
+
+logger = Logger(service='ppe-detector', child=True)
+
+ANALYSE = "analyse"
+DEFER = "defer"
+DROP = "drop"
+
+
+class TokenBucket:
+    """
+    Tokens refilled at a steady rate up to a burst capacity, the balance may go negative when calls are deferred
+    :param `rate` tokens added per second, 0 or less makes the bucket unlimited
+    :param `capacity` largest number of tokens the bucket holds
+    """
+
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated_at')
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = max(capacity, 1.0)
+        self.tokens = self.capacity
+        self.updated_at = now
+
+    @property
+    def unlimited(self) -> bool:
+        return self.rate <= 0
+
+    def refill(self, now: float) -> None:
+        if not self.unlimited:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, floor: float = 0.0) -> float:
+        """
+        Seconds until a token can be taken while leaving `floor` tokens in the bucket
+        """
+        if self.unlimited:
+            return 0.0
+        return max(0.0, (1.0 + floor - self.tokens) / self.rate)
+
+    def take(self) -> None:
+        if not self.unlimited:
+            self.tokens -= 1.0
+
+
+class BudgetScheduler:
+    """
+    Admit Rekognition calls against a token bucket per camera and one bucket shared by all cameras of the container
+    Cameras with a recent violation are admitted past their own bucket and may use the reserve of the shared one.
+    The buckets live in the memory of one container: with N concurrent containers the function may send N times
+    the container budget, so size it to the account quota divided by the reserved concurrency of the function.
+    A camera whose frames are spread over several containers gets the camera budget in each of them.
+    :param `camera_rate` calls per second allowed to one camera in the container, 0 or less disables the limit
+    :param `camera_burst` calls a camera may send at once after being idle
+    :param `container_rate` calls per second allowed to all cameras of the container, 0 or less disables the limit
+    :param `container_burst` calls all cameras of the container may send at once after being idle
+    :param `reserve` fraction of the shared bucket only cameras with a recent violation may use, at most all but one
+        token of it
+    :param `priority_window` seconds after a violation during which a camera has priority
+    :param `max_defer` longest time a call is held back waiting for tokens before its frame is dropped
+    :param `max_cameras` number of cameras kept, the least recently seen camera is evicted first
+    """
+
+    def __init__(self, camera_rate: float, camera_burst: float, container_rate: float, container_burst: float,
+                 reserve: float = 0.2, priority_window: float = 60.0, max_defer: float = 1.0, max_cameras: int = 128,
+                 clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+        self.camera_rate = camera_rate
+        self.camera_burst = camera_burst
+        # A call without priority takes a token above the reserve, so the reserve leaves one token of the burst
+        capacity = max(container_burst, 1.0)
+        self.reserve = min(reserve * capacity, capacity - 1.0)
+        self.priority_window = priority_window
+        self.max_defer = max_defer
+        self.max_cameras = max_cameras
+        self.clock = clock
+        self.sleep = sleep
+        self.admitted = 0
+        self.deferred = 0
+        self.dropped = 0
+        self.prioritized = 0
+        self.spend: Dict[str, int] = {}
+        self._container = TokenBucket(container_rate, container_burst, clock())
+        self._cameras: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._last_violation: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def admit(self, camera_name: str) -> str:
+        """
+        Decide whether a frame of the camera is analysed, blocking while it is deferred
+        :returns: `ANALYSE` for a call admitted right away, `DEFER` for a call admitted after waiting for tokens,
+            `DROP` for a frame that does not fit the budget
+        """
+        with self._lock:
+            now = self.clock()
+            bucket = self._camera_bucket(camera_name, now)
+            self._container.refill(now)
+            prioritized = now - self._last_violation.get(camera_name, float('-inf')) <= self.priority_window
+
+            wait = self._container.wait_time(0.0 if prioritized else self.reserve)
+            if not prioritized:
+                wait = max(wait, bucket.wait_time())
+            if wait > self.max_defer:
+                self.dropped += 1
+                return DROP
+
+            if not prioritized:
+                bucket.take()
+            self._container.take()
+            self.spend[camera_name] = self.spend.get(camera_name, 0) + 1
+            if prioritized:
+                self.prioritized += 1
+            if wait > 0:
+                self.deferred += 1
+            else:
+                self.admitted += 1
+
+        if wait > 0:
+            self.sleep(wait)
+            return DEFER
+        return ANALYSE
+
+    def record_violation(self, camera_name: str) -> None:
+        """
+        Give the camera priority for the next `priority_window` seconds
+        """
+        with self._lock:
+            self._last_violation[camera_name] = self.clock()
+
+    def _camera_bucket(self, camera_name: str, now: float) -> TokenBucket:
+        bucket = self._cameras.get(camera_name)
+        if bucket is None:
+            bucket = TokenBucket(self.camera_rate, self.camera_burst, now)
+            self._cameras[camera_name] = bucket
+            while len(self._cameras) > self.max_cameras:
+                evicted, _ = self._cameras.popitem(last=False)
+                self._last_violation.pop(evicted, None)
+                self.spend.pop(evicted, None)
+        else:
+            self._cameras.move_to_end(camera_name)
+            bucket.refill(now)
+        return bucket
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "budgetAdmittedCalls": self.admitted,
+            "budgetDeferredCalls": self.deferred,
+            "budgetDroppedFrames": self.dropped,
+            "budgetPriorityCalls": self.prioritized,
+            "budgetCameraSpend": dict(self.spend)
+        }
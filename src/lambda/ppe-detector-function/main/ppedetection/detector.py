@@ -1,35 +1,42 @@
 # Submit detection job to Rekognition PPE
-import timeit
-import boto3
-
 from aws_lambda_powertools.logging import Logger
-from aws_lambda_powertools.tracing import Tracer
+
+from main.ppedetection.response_cache import ResponseCache
+from detectors_common import client_registry, stage_metrics, tracing
 
 
 logger = Logger(service='ppe-detector', child=True)
-tracer = Tracer(service='ppe-detector')
+tracer = tracing.get_tracer('ppe-detector')
+
+REQUIRED_EQUIPMENT_TYPES = [
+    'FACE_COVER',
+    'HEAD_COVER'
+]
 
 @tracer.capture_method(capture_response=False)
-def submit_job(img_str: str, min_confidence: int, rek_client: None) -> dict:
-    start_time = timeit.default_timer()
+def submit_job(img_str: bytes, min_confidence: int, rek_client: None, cache: ResponseCache = None) -> dict:
+    cache_key = None
+    if cache is not None:
+        cache_key = cache.make_key(img_str, min_confidence, REQUIRED_EQUIPMENT_TYPES)
+        ppe_response = cache.get(cache_key)
+        if ppe_response is not None:
+            return ppe_response
 
     if not rek_client:
-        rek_client = boto3.client("rekognition")
-
-    ppe_response = rek_client.detect_protective_equipment(
-        Image={
-            'Bytes': img_str,
-        },
-        SummarizationAttributes={  # Detect whether workers have weared helmet and mask
-            'MinConfidence': min_confidence,
-            'RequiredEquipmentTypes': [
-                'FACE_COVER',
-                'HEAD_COVER'
-            ]
-        }
-    )
-
-    logger.info(
-        f'Rekognition PPE detection completed after: {timeit.default_timer() - start_time}')
-        
+        rek_client = client_registry.get_client("rekognition")
+
+    with stage_metrics.stage('rekognition'):
+        ppe_response = rek_client.detect_protective_equipment(
+            Image={
+                'Bytes': img_str,
+            },
+            SummarizationAttributes={  # Detect whether workers have weared helmet and mask
+                'MinConfidence': min_confidence,
+                'RequiredEquipmentTypes': REQUIRED_EQUIPMENT_TYPES
+            }
+        )
+
+    if cache is not None:
+        cache.put(cache_key, ppe_response)
+
     return ppe_response
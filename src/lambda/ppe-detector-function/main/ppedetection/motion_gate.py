@@ -0,0 +1,100 @@
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+import threading
+import time
+import cv2
+import numpy as np
+
+from aws_lambda_powertools.logging import Logger
+
+
+logger = Logger(service='ppe-detector', child=True)
+
+MOTION_SIZE = (80, 45)
+
+
+def motion_thumbnail(frame: np.ndarray) -> np.ndarray:
+    """
+    Downscale a frame to the small grayscale image the background model works on
+    :param `frame`: RGB frame data in numpy array
+    """
+    # Skipping pixels down to about twice the thumbnail size first keeps the area resize cheap on large frames
+    stride = max(1, min(frame.shape[1] // (2 * MOTION_SIZE[0]), frame.shape[0] // (2 * MOTION_SIZE[1])))
+    small = cv2.resize(frame[::stride, ::stride], MOTION_SIZE, interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(small, cv2.COLOR_RGB2GRAY)
+
+
+class MotionGate:
+    """
+    Skip the analysis of a camera's frames while they do not differ from its running-average background,
+    reusing the result of its last analysed frame
+    :param `min_changed_fraction` fraction of changed pixels from which a frame counts as motion
+    :param `pixel_threshold` gray level difference from the background from which a pixel counts as changed
+    :param `learning_rate` weight of a new frame in the running-average background
+    :param `heartbeat` seconds after which a frame is analysed even without motion
+    :param `max_cameras` number of cameras kept, the least recently seen camera is evicted first
+    """
+
+    def __init__(self, min_changed_fraction: float = 0.01, pixel_threshold: int = 25, learning_rate: float = 0.05,
+                 heartbeat: float = 60.0, max_cameras: int = 128, clock: Callable[[], float] = time.monotonic):
+        self.min_changed_fraction = min_changed_fraction
+        self.pixel_threshold = pixel_threshold
+        self.learning_rate = learning_rate
+        self.heartbeat = heartbeat
+        self.max_cameras = max_cameras
+        self.clock = clock
+        self.skipped = 0
+        self.analysed = 0
+        self.heartbeats = 0
+        # Per camera: background as float32, last analysed result and when it was analysed
+        self._entries: "OrderedDict[str, list]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def lookup(self, camera_name: str, thumbnail: np.ndarray) -> Optional[Any]:
+        """
+        Update the background of the camera with the frame
+        :param `thumbnail` output of `motion_thumbnail` for the frame
+        :returns: result to reuse for the frame, or None when the frame has to be analysed
+        """
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(camera_name)
+            if entry is None:
+                self._entries[camera_name] = [thumbnail.astype(np.float32), None, float('-inf')]
+                while len(self._entries) > self.max_cameras:
+                    self._entries.popitem(last=False)
+                self.analysed += 1
+                return None
+            self._entries.move_to_end(camera_name)
+            background, result, analysed_at = entry
+
+            diff = cv2.absdiff(thumbnail, cv2.convertScaleAbs(background))
+            changed_fraction = cv2.countNonZero(
+                cv2.threshold(diff, self.pixel_threshold, 255, cv2.THRESH_BINARY)[1]) / diff.size
+            cv2.accumulateWeighted(thumbnail, background, self.learning_rate)
+
+            if changed_fraction < self.min_changed_fraction and result is not None:
+                if now - analysed_at < self.heartbeat:
+                    self.skipped += 1
+                    return result
+                self.heartbeats += 1
+            self.analysed += 1
+            return None
+
+    def store(self, camera_name: str, result: Any) -> None:
+        """
+        Remember the result of a frame analysed for the camera
+        """
+        with self._lock:
+            entry = self._entries.get(camera_name)
+            if entry is not None:
+                entry[1] = result
+                entry[2] = self.clock()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "motionGateSkippedFrames": self.skipped,
+            "motionGateAnalysedFrames": self.analysed,
+            "motionGateHeartbeats": self.heartbeats,
+            "motionGateCameras": len(self._entries)
+        }
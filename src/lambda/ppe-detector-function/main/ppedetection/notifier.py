@@ -1,22 +1,140 @@
-import boto3
 import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List
 
 from aws_lambda_powertools.logging import Logger
-from aws_lambda_powertools.tracing import Tracer
+
+from detectors_common import client_registry, stage_metrics, tracing
 
 
 logger = Logger(service='ppe-detector', child=True)
-tracer = Tracer(service='ppe-detector')
-@tracer.capture_method(capture_response=False)
-def notify_alarm(topic_arn, result):
-    sns_client = boto3.client('sns')
-    try:
-        sns_res = sns_client.publish(
-            TopicArn=topic_arn,
-            Message=json.dumps(result)
-        )
-        logger.info(f'Message sent to topic with mesasge ID {sns_res["MessageId"]}.')
-        return True
-    except Exception:
-        logger.exception("Error sending alarm to SNS")
-        return False
+tracer = tracing.get_tracer('ppe-detector')
+
+# Largest number of messages SNS accepts in one PublishBatch request
+MAX_PUBLISH_BATCH_ENTRIES = 10
+
+
+class AlarmNotifier:
+    """
+    Coalesce the PPE violation alarms of one invocation per camera and publish them in batches when it ends.
+    The alarm of a camera published less than `window` seconds ago is suppressed rather than held, and the number of
+    suppressed alarms rides on its next published alarm. Only the time of the last alarm is kept across invocations.
+    :param `topic_arn` ARN of the alarm topic
+    :param `sns_client` SNS client, created when None
+    :param `max_attempts` number of times alarms SNS did not accept are sent before being dropped
+    :param `window` seconds after an alarm of a camera during which its next alarms are suppressed, 0 to publish all
+    :param `max_cameras` number of cameras kept, the least recently alarmed camera is evicted first
+    """
+
+    def __init__(self, topic_arn: str, sns_client=None, max_attempts: int = 2, window: float = 30.0,
+                 max_cameras: int = 128, clock: Callable[[], float] = time.monotonic):
+        self.topic_arn = topic_arn
+        self._sns_client = sns_client
+        self.max_attempts = max_attempts
+        self.window = window
+        self.max_cameras = max_cameras
+        self.clock = clock
+        self.published = 0
+        self.coalesced = 0
+        self.suppressed = 0
+        self.failed = 0
+        # Per camera: the alarm record to send and the number of violating frames folded into it
+        self._pending: Dict[str, list] = {}
+        # Per camera: when its last alarm was published and the number of alarms suppressed since
+        self._windows: "OrderedDict[str, list]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def sns_client(self):
+        # Resolved on first use so that building the notifier at import time opens no connection
+        if self._sns_client is None:
+            self._sns_client = client_registry.get_client('sns')
+        return self._sns_client
+
+    def submit(self, record: dict) -> None:
+        """
+        Queue the record of a frame with violations, keeping the worst and then latest frame per camera
+        """
+        camera_name = record["cameraId"]
+        with self._lock:
+            pending = self._pending.get(camera_name)
+            if pending is None:
+                self._pending[camera_name] = [record, 1]
+                return
+            if record["ppeViolationCount"] >= pending[0]["ppeViolationCount"]:
+                pending[0] = record
+            pending[1] += 1
+            self.coalesced += 1
+
+    @tracer.capture_method(capture_response=False)
+    @stage_metrics.timed('alarmFlush')
+    def flush(self) -> int:
+        """
+        Publish the alarms submitted since the last flush, one per camera
+        :returns: number of alarms published
+        """
+        now = self.clock()
+        with self._lock:
+            alarms, self._pending = self._pending, {}
+            camera_names = []
+            for camera_name in alarms:
+                window = self._windows.get(camera_name)
+                if window is not None and now - window[0] < self.window:
+                    window[1] += 1
+                    self.suppressed += 1
+                else:
+                    camera_names.append(camera_name)
+            suppressed = {camera_name: self._windows[camera_name][1] if camera_name in self._windows else 0
+                          for camera_name in camera_names}
+        if not camera_names:
+            return 0
+
+        for attempt in range(self.max_attempts):
+            failed = []
+            for start in range(0, len(camera_names), MAX_PUBLISH_BATCH_ENTRIES):
+                failed.extend(self._publish(camera_names[start:start + MAX_PUBLISH_BATCH_ENTRIES], alarms, suppressed))
+            camera_names = failed
+            if not camera_names:
+                break
+            logger.warning(f'{len(camera_names)} alarms not accepted by SNS, attempt {attempt + 1} of {self.max_attempts}')
+
+        published = len(suppressed) - len(camera_names)
+        self.published += published
+        with self._lock:
+            for camera_name in set(suppressed).difference(camera_names):
+                # A failed alarm leaves the window of its camera closed, its suppressed count rides on the next one
+                self._windows[camera_name] = [now, 0]
+                self._windows.move_to_end(camera_name)
+            while len(self._windows) > self.max_cameras:
+                self._windows.popitem(last=False)
+        if camera_names:
+            self.failed += len(camera_names)
+            logger.error(f'Dropping the alarms of cameras {", ".join(camera_names)}, SNS did not accept them')
+        logger.info(f'{published} alarms published to SNS, {self.coalesced} violating frames coalesced and '
+                    f'{self.suppressed} alarms suppressed so far')
+        return published
+
+    def _publish(self, camera_names: List[str], alarms: Dict[str, list], suppressed: Dict[str, int]) -> List[str]:
+        """
+        :returns: the cameras whose alarm was not published
+        """
+        entries = []
+        for idx, camera_name in enumerate(camera_names):
+            record, frame_count = alarms[camera_name]
+            entries.append({
+                'Id': str(idx),
+                'Message': json.dumps(dict(record, coalescedFrameCount=frame_count,
+                                           suppressedAlarmCount=suppressed[camera_name]))
+            })
+        try:
+            sns_res = self.sns_client.publish_batch(
+                TopicArn=self.topic_arn,
+                PublishBatchRequestEntries=entries
+            )
+            failed_ids = {entry["Id"] for entry in sns_res.get("Failed", [])}
+        except Exception:
+            logger.exception("Error sending alarms to SNS")
+            failed_ids = {entry["Id"] for entry in entries}
+        return [camera_name for idx, camera_name in enumerate(camera_names) if str(idx) in failed_ids]
@@ -0,0 +1,132 @@
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import threading
+import cv2
+import numpy as np
+
+from aws_lambda_powertools.logging import Logger
+
+from main.ppedetection.result_model import FrameResult
+from detectors_common import stage_metrics
+
+
+logger = Logger(service='ppe-detector', child=True)
+
+# Candidate person as (width, height, left, top, score), the box relative to the frame size
+Candidate = Tuple[float, float, float, float, float]
+
+
+class PersonDetector(ABC):
+    """
+    Local detector of the persons of a frame, run by the person gate before Rekognition
+    :param `width` width the frame is resized to before detection
+    :param `threshold` detection score from which a candidate counts, lower values find more persons
+    """
+
+    def __init__(self, width: int = 640, threshold: float = 0.0):
+        self.width = width
+        self.threshold = threshold
+
+    def resize(self, frame: np.ndarray) -> np.ndarray:
+        height = max(1, round(frame.shape[0] * self.width / frame.shape[1]))
+        return cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA)
+
+    @abstractmethod
+    def detect(self, frame: np.ndarray) -> List[Candidate]:
+        """
+        :param `frame`: RGB frame data in numpy array
+        :returns: the candidate persons of the frame
+        """
+
+
+class HogPersonDetector(PersonDetector):
+    """
+    OpenCV's HOG + linear SVM people detector, trained on upright pedestrians of at least 64x128 pixels
+    at the detection width
+    :param `scale` factor between the image pyramid levels, higher values are faster and find fewer persons
+    :param `win_stride` step of the detection window in pixels
+    """
+
+    def __init__(self, width: int = 640, threshold: float = 0.0, scale: float = 1.05, win_stride: int = 8):
+        super().__init__(width, threshold)
+        self.scale = scale
+        self.win_stride = win_stride
+        # One descriptor per batch worker thread
+        self._local = threading.local()
+
+    @property
+    def hog(self):
+        if not hasattr(self._local, 'hog'):
+            self._local.hog = cv2.HOGDescriptor()
+            self._local.hog.setSVMDetector(cv2.HOGDescriptor_getDefaultPeopleDetector())
+        return self._local.hog
+
+    def detect(self, frame: np.ndarray) -> List[Candidate]:
+        gray = cv2.cvtColor(self.resize(frame), cv2.COLOR_RGB2GRAY)
+        rects, weights = self.hog.detectMultiScale(
+            gray, hitThreshold=self.threshold, winStride=(self.win_stride, self.win_stride), padding=(8, 8),
+            scale=self.scale)
+        height, width = gray.shape
+        return [
+            (w / width, h / height, x / width, y / height, float(score))
+            for (x, y, w, h), score in zip(np.reshape(rects, (-1, 4)).tolist(), np.ravel(weights).tolist())
+        ]
+
+
+# Person detectors by the name of PERSON_GATE_BACKEND, all taking the width and threshold arguments
+BACKENDS = {
+    "hog": HogPersonDetector,
+}
+
+
+def create_detector(backend: str, width: int = 640, threshold: float = 0.0) -> PersonDetector:
+    if backend not in BACKENDS:
+        raise ValueError(f'Unknown person detector {backend}, expected one of {", ".join(sorted(BACKENDS))}')
+    return BACKENDS[backend](width, threshold)
+
+
+class PersonGate:
+    """
+    Answer frames in which the local detector finds nobody with an empty result, without calling Rekognition.
+    The local detector misses persons Rekognition finds (small, distant, seated or partly hidden ones), so a camera's
+    frames are only answered locally once the detector found nobody in `min_empty_frames` frames in a row
+    :param `detector` local person detector, one of `BACKENDS`
+    :param `min_empty_frames` consecutive frames without candidate from which a frame of the camera is skipped
+    :param `max_cameras` number of cameras kept, the least recently seen camera is evicted first
+    """
+
+    def __init__(self, detector: PersonDetector, min_empty_frames: int = 3, max_cameras: int = 128):
+        self.detector = detector
+        self.min_empty_frames = min_empty_frames
+        self.max_cameras = max_cameras
+        self.skipped = 0
+        self.passed = 0
+        # Per camera: frames in a row in which the detector found nobody
+        self._empty_frames: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def lookup(self, camera_name: str, frame: np.ndarray) -> Optional[FrameResult]:
+        """
+        :param `frame`: RGB frame data in numpy array
+        :returns: empty result for a frame without candidate person, or None when the frame has to be analysed
+        """
+        with stage_metrics.stage('personGate'):
+            candidates = self.detector.detect(frame)
+        with self._lock:
+            empty_frames = 0 if candidates else self._empty_frames.get(camera_name, 0) + 1
+            self._empty_frames[camera_name] = empty_frames
+            self._empty_frames.move_to_end(camera_name)
+            while len(self._empty_frames) > self.max_cameras:
+                self._empty_frames.popitem(last=False)
+            if empty_frames < self.min_empty_frames:
+                self.passed += 1
+                return None
+            self.skipped += 1
+        return FrameResult.empty()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "personGateSkippedCalls": self.skipped,
+            "personGatePassedFrames": self.passed
+        }
@@ -0,0 +1,101 @@
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Optional
+import hashlib
+import json
+import os
+import threading
+import time
+
+from aws_lambda_powertools.logging import Logger
+
+
+logger = Logger(service='ppe-detector', child=True)
+
+
+class ResponseCache:
+    """
+    LRU cache of Rekognition PPE responses keyed by the image content and detection parameters
+    :param `max_entries` number of responses kept, the least recently used one is evicted first
+    :param `ttl` seconds during which a cached response is served
+    :param `spill_path` optional file, e.g. under /tmp, the cache is loaded from and saved to
+    """
+
+    def __init__(self, max_entries: int, ttl: float, spill_path: Optional[str] = None,
+                 clock: Callable[[], float] = time.time):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.spill_path = spill_path
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        # Responses are kept serialized so that callers always get their own copy
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        if spill_path:
+            self.load()
+
+    @staticmethod
+    def make_key(img_bytes: bytes, min_confidence: int, required_equipment: Iterable[str]) -> str:
+        digest = hashlib.sha256(img_bytes)
+        digest.update(f'|{min_confidence}|{",".join(sorted(required_equipment))}'.encode('utf-8'))
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.clock() - entry[0] <= self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return json.loads(entry[1])
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: str, response: dict) -> None:
+        payload = json.dumps(response)
+        with self._lock:
+            self._entries[key] = (self.clock(), payload)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def load(self) -> None:
+        """
+        Load the unexpired responses of the spill file, if there is one
+        """
+        try:
+            with open(self.spill_path, 'r') as fd:
+                spilled = json.load(fd)
+        except FileNotFoundError:
+            return
+        except ValueError:
+            logger.warning(f'Ignoring unreadable response cache file {self.spill_path}')
+            return
+        now = self.clock()
+        with self._lock:
+            for key, stored_at, payload in spilled[-self.max_entries:]:
+                if now - stored_at <= self.ttl:
+                    self._entries[key] = (stored_at, payload)
+
+    def save(self) -> None:
+        """
+        Write the cached responses to the spill file, replacing it atomically
+        """
+        if not self.spill_path:
+            return
+        with self._lock:
+            spilled = [[key, stored_at, payload] for key, (stored_at, payload) in self._entries.items()]
+        tmp_path = self.spill_path + '.tmp'
+        with open(tmp_path, 'w') as fd:
+            json.dump(spilled, fd)
+        os.replace(tmp_path, self.spill_path)
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "responseCacheHits": self.hits,
+            "responseCacheMisses": self.misses,
+            "responseCacheHitRate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "responseCacheEntries": len(self._entries)
+        }
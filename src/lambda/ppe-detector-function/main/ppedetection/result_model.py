@@ -0,0 +1,131 @@
+from typing import Dict, List
+import numpy as np
+
+
+# Confidence recorded for a body part without any detected equipment
+NO_EQUIPMENT = -1.0
+
+
+class PersonRecord:
+    """
+    One detected person, with a bounding box relative to the frame size
+    """
+
+    __slots__ = ('id', 'width', 'height', 'left', 'top', 'missing_mask', 'missing_helmet')
+
+    def __init__(self, id: int, width: float, height: float, left: float, top: float,
+                 missing_mask: bool, missing_helmet: bool):
+        self.id = id
+        self.width = width
+        self.height = height
+        self.left = left
+        self.top = top
+        self.missing_mask = missing_mask
+        self.missing_helmet = missing_helmet
+
+    @property
+    def bounding_box(self) -> Dict[str, float]:
+        return {"Width": self.width, "Height": self.height, "Left": self.left, "Top": self.top}
+
+
+class FrameResult:
+    """
+    PPE result of one frame, held as numpy arrays with one row per detected person
+    :param `ids` Rekognition person ids
+    :param `boxes` bounding boxes as (width, height, left, top) rows
+    :param `face_confidence` confidence of the face cover, `NO_EQUIPMENT` when none was detected
+    :param `head_confidence` confidence of the head cover, `NO_EQUIPMENT` when none was detected
+    :param `violating` whether Rekognition reported the person without required equipment or indeterminate
+    :param `missing_mask` whether the face cover is missing or under the confidence threshold
+    :param `missing_helmet` whether the head cover is missing or under the confidence threshold, if helmets are checked
+    """
+
+    __slots__ = ('ids', 'boxes', 'face_confidence', 'head_confidence', 'violating', 'missing_mask', 'missing_helmet')
+
+    def __init__(self, ids: np.ndarray, boxes: np.ndarray, face_confidence: np.ndarray, head_confidence: np.ndarray,
+                 violating: np.ndarray, missing_mask: np.ndarray, missing_helmet: np.ndarray):
+        self.ids = ids
+        self.boxes = boxes
+        self.face_confidence = face_confidence
+        self.head_confidence = head_confidence
+        self.violating = violating
+        self.missing_mask = missing_mask
+        self.missing_helmet = missing_helmet
+
+    @classmethod
+    def from_response(cls, ppe_res: dict, min_confidence: int, detect_helmet: str) -> 'FrameResult':
+        """
+        Build the arrays from a Rekognition DetectProtectiveEquipment response in one pass over its persons
+        """
+        persons = ppe_res["Persons"]
+        summary = ppe_res["Summary"]
+        incompliant_ids = set(summary["PersonsWithoutRequiredEquipment"])
+        incompliant_ids.update(summary["PersonsIndeterminate"])
+
+        ids = []
+        boxes = []
+        face_confidence = []
+        head_confidence = []
+        violating = []
+        for person in persons:
+            face = head = NO_EQUIPMENT
+            for bp in person["BodyParts"]:
+                if bp["EquipmentDetections"]:
+                    if bp["Name"] == "FACE":
+                        face = bp["EquipmentDetections"][0]["Confidence"]
+                    elif bp["Name"] == "HEAD":
+                        head = bp["EquipmentDetections"][0]["Confidence"]
+            box = person["BoundingBox"]
+            ids.append(person["Id"])
+            boxes.append((box["Width"], box["Height"], box["Left"], box["Top"]))
+            face_confidence.append(face)
+            head_confidence.append(head)
+            violating.append(person["Id"] in incompliant_ids)
+
+        count = len(ids)
+        face_confidence = np.array(face_confidence, dtype=np.float64)
+        head_confidence = np.array(head_confidence, dtype=np.float64)
+        missing_mask = face_confidence <= min_confidence
+        if detect_helmet == "true":
+            missing_helmet = head_confidence <= min_confidence
+        else:
+            missing_helmet = np.zeros(count, dtype=bool)
+        ids = np.array(ids, dtype=np.int64)
+        boxes = np.array(boxes, dtype=np.float64).reshape(count, 4)
+        violating = np.array(violating, dtype=bool)
+
+        return cls(ids, boxes, face_confidence, head_confidence, violating, missing_mask, missing_helmet)
+
+    @classmethod
+    def empty(cls) -> 'FrameResult':
+        """
+        Result of a frame without any person
+        """
+        return cls.from_response(
+            {"Persons": [], "Summary": {"PersonsWithoutRequiredEquipment": [], "PersonsIndeterminate": []}}, 0, "false")
+
+    @property
+    def person_count(self) -> int:
+        return len(self.ids)
+
+    @property
+    def violation_count(self) -> int:
+        return int(np.count_nonzero(self.violating))
+
+    @property
+    def compliant_count(self) -> int:
+        return self.person_count - self.violation_count
+
+    def persons_without_required_equipment(self) -> List[PersonRecord]:
+        return self._persons(self.violating)
+
+    def persons_with_required_equipment(self) -> List[PersonRecord]:
+        return self._persons(~self.violating)
+
+    def _persons(self, selected: np.ndarray) -> List[PersonRecord]:
+        return [
+            PersonRecord(id, width, height, left, top, missing_mask, missing_helmet)
+            for id, (width, height, left, top), missing_mask, missing_helmet in zip(
+                self.ids[selected].tolist(), self.boxes[selected].tolist(),
+                self.missing_mask[selected].tolist(), self.missing_helmet[selected].tolist())
+        ]
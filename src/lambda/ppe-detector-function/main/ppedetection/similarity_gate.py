@@ -0,0 +1,82 @@
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+import threading
+import time
+import cv2
+import numpy as np
+
+from aws_lambda_powertools.logging import Logger
+
+
+logger = Logger(service='ppe-detector', child=True)
+
+SIGNATURE_SIZE = (32, 18)
+
+
+def compute_signature(frame: np.ndarray) -> np.ndarray:
+    """
+    Compute a cheap signature of a frame: a small grayscale thumbnail
+    :param `frame`: RGB frame data in numpy array
+    """
+    gray = cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY)
+    return cv2.resize(gray, SIGNATURE_SIZE, interpolation=cv2.INTER_AREA).astype(np.float32)
+
+
+def signature_distance(signature: np.ndarray, other: np.ndarray) -> float:
+    """
+    Mean absolute difference between two signatures, from 0 (identical) to 255
+    """
+    return float(np.mean(np.abs(signature - other)))
+
+
+class SimilarityGate:
+    """
+    Reuse the filtered result of the last analysed frame of a camera while its new frames stay near-identical to it
+    :param `max_distance` largest signature distance for which a frame counts as a duplicate
+    :param `max_age` seconds after which the result of an analysed frame is no longer reused
+    :param `max_cameras` number of cameras kept, the least recently seen camera is evicted first
+    """
+
+    def __init__(self, max_distance: float, max_age: float, max_cameras: int = 128,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_distance = max_distance
+        self.max_age = max_age
+        self.max_cameras = max_cameras
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def lookup(self, camera_name: str, signature: np.ndarray) -> Optional[Any]:
+        """
+        Return the result to reuse for the frame, or None when the frame has to be analysed
+        """
+        with self._lock:
+            entry = self._entries.get(camera_name)
+            if entry is not None:
+                self._entries.move_to_end(camera_name)
+                last_signature, result, analysed_at = entry
+                if self.clock() - analysed_at <= self.max_age \
+                        and signature_distance(signature, last_signature) <= self.max_distance:
+                    self.hits += 1
+                    return result
+            self.misses += 1
+            return None
+
+    def store(self, camera_name: str, signature: np.ndarray, result: Any) -> None:
+        """
+        Remember the result of a frame analysed for the camera
+        """
+        with self._lock:
+            self._entries[camera_name] = (signature, result, self.clock())
+            self._entries.move_to_end(camera_name)
+            while len(self._entries) > self.max_cameras:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "similarityGateSavedCalls": self.hits,
+            "similarityGateAnalysedFrames": self.misses,
+            "similarityGateCameras": len(self._entries)
+        }
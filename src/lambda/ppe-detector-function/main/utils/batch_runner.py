@@ -0,0 +1,65 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Tuple
+import json
+
+from aws_lambda_powertools.logging import Logger
+
+from detectors_common import stage_metrics
+
+
+logger = Logger(service='ppe-detector', child=True)
+
+
+def extract_frames(sqs_record: dict) -> List[Tuple[str, str]]:
+    """
+    Extract the (bucket, key) pairs of the frames referenced by an SQS message
+    :param `sqs_record` SQS record carrying an S3 event notification as its body
+    """
+    try:
+        s3_records = json.loads(sqs_record["body"])["Records"]
+    except (KeyError, ValueError):
+        logger.warning(f'No records found in message {sqs_record.get("messageId")}')
+        logger.info(sqs_record.get("body"))
+        return []
+    return [(s3e["s3"]["bucket"]["name"], s3e["s3"]["object"]["key"]) for s3e in s3_records]
+
+
+@stage_metrics.timed('batch')
+def run_batch(records: List[dict], process_frame: Callable[[str, str], Any], max_workers: int) -> List[Dict[str, str]]:
+    """
+    Process every frame of an SQS batch independently, on a bounded worker pool
+    :param `records` the "Records" list of the SQS event
+    :param `process_frame` callable taking the bucket name and key of one frame
+    :param `max_workers` maximum number of frames processed concurrently, 1 processes them in sequence
+    :returns: `batchItemFailures` entries for the messages having at least one failed frame
+    """
+
+    jobs = []
+    for record in records:
+        for bucket, key in extract_frames(record):
+            jobs.append((record["messageId"], bucket, key))
+
+    def run_job(job: Tuple[str, str, str]) -> bool:
+        message_id, bucket, key = job
+        try:
+            process_frame(bucket, key)
+            return True
+        except Exception:
+            logger.exception(f'Failed processing frame s3://{bucket}/{key} from message {message_id}')
+            return False
+
+    if max_workers <= 1 or len(jobs) <= 1:
+        results = [run_job(job) for job in jobs]
+    else:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(jobs))) as executor:
+            results = list(executor.map(run_job, jobs))
+
+    failed_ids = []
+    for (message_id, _, _), succeeded in zip(jobs, results):
+        if not succeeded and message_id not in failed_ids:
+            failed_ids.append(message_id)
+
+    stage_metrics.count('frames', len(jobs))
+    logger.info(
+        f'Processed {len(jobs)} frames from {len(records)} messages with {len(failed_ids)} failed messages')
+    return [{"itemIdentifier": message_id} for message_id in failed_ids]
@@ -0,0 +1,51 @@
+import cv2
+import numpy as np
+
+from backfill.frames import plan_source, read_segment, sample_indices
+
+
+def write_video(path, frames=50, fps=25):
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*'mp4v'), fps, (64, 48))
+    for idx in range(frames):
+        # The grey level of a frame tells which frame was read
+        writer.write(np.full((48, 64, 3), idx * 5, dtype=np.uint8))
+    writer.release()
+
+
+def test_sample_indices():
+    assert sample_indices(10, 25, 10) == [0, 2, 5, 8]
+    assert sample_indices(3, 25, 0) == [0, 1, 2]
+    assert sample_indices(3, 10, 25) == [0, 1, 2]
+
+
+def test_video_segments_read_the_sampled_frames(tmp_path):
+    path = tmp_path / 'camera-1.mp4'
+    write_video(path)
+    segments = plan_source(str(path), 5, 3, started_at=1616332635000)
+
+    assert [segment.indices for segment in segments] == [(0, 5, 10), (15, 20, 25), (30, 35, 40), (45,)]
+    assert segments[0].camera == 'camera-1'
+    frames = [frame for segment in segments for frame in read_segment(segment)]
+    assert [timestamp for timestamp, _, _, _ in frames][:3] == ['1616332635000', '1616332635200', '1616332635400']
+    assert all((width, height) == (64, 48) for _, _, width, height in frames)
+    # Segments seek to their first frame, and read the same frames as one pass over the whole video
+    capture = cv2.VideoCapture(str(path))
+    expected = [capture.read()[1].mean() for _ in range(50)][::5]
+    capture.release()
+    levels = [cv2.imdecode(np.frombuffer(raw, np.uint8), cv2.IMREAD_COLOR).mean() for _, raw, _, _ in frames]
+    assert len(levels) == 10
+    assert np.allclose(levels, expected, atol=1)
+    assert expected[1] - expected[0] > 2
+
+
+def test_frame_directory(tmp_path):
+    for idx in range(4):
+        cv2.imwrite(str(tmp_path / f'{idx:04d}.png'), np.full((48, 64, 3), idx, dtype=np.uint8))
+    (tmp_path / 'notes.txt').write_text('not a frame')
+    segments = plan_source(str(tmp_path), 1, 10, camera='gate', started_at=0, source_fps=2)
+
+    assert len(segments) == 1
+    assert segments[0].indices == (0, 2)
+    frames = list(read_segment(segments[0]))
+    assert [(timestamp, width, height) for timestamp, _, width, height in frames] == [('0', 64, 48), ('1000', 64, 48)]
+    assert frames[1][1] == (tmp_path / '0002.png').read_bytes()
@@ -0,0 +1,71 @@
+import functools
+import io
+import json
+import os
+
+import cv2
+import numpy as np
+
+from backfill.backends import ReplayBackend, backend_factory
+from backfill.frames import plan_source
+from backfill.pipeline import Settings, run_backfill
+
+RESPONSE_PATH = os.path.join(os.path.dirname(__file__), '../output/ppe-result.json')
+
+
+class FailingBackend:
+    def detect_protective_equipment(self, Image, **kwargs):
+        raise RuntimeError('throttled')
+
+
+def frame_directory(path, count):
+    for idx in range(count):
+        cv2.imwrite(str(path / f'{idx:04d}.png'), np.full((48, 64, 3), idx, dtype=np.uint8))
+    return str(path)
+
+
+def test_records_match_the_firehose_format(tmp_path):
+    os.environ["PROCESSED_S3_BUCKET"] = 'processed-frames'
+    segments = plan_source(frame_directory(tmp_path, 5), 0, 2, camera='camera-1', started_at=1610094473985)
+    output = io.BytesIO()
+    report = run_backfill(segments, backend_factory(f'replay:{RESPONSE_PATH}'), output, workers=1,
+                          settings=Settings(70, "true", '.webp'))
+
+    lines = output.getvalue().splitlines()
+    assert report["frames"] == report["records"] == len(lines) == 5
+    assert report["failedFrames"] == 0
+    record = json.loads(lines[0])
+    assert record["ts"] == 1610094473985
+    assert record["cameraId"] == 'camera-1'
+    assert record["s3url"] == 'processed-frames/camera-1-2021-01-08-08:27:53:985000.webp'
+    assert record["pplCount"] == 4
+    assert record["ppeViolationCount"] >= 1
+    assert report["framesWithViolations"] == 5
+
+
+def test_worker_pool_keeps_the_order_of_the_segments(tmp_path):
+    os.environ["PROCESSED_S3_BUCKET"] = 'processed-frames'
+    segments = plan_source(frame_directory(tmp_path, 9), 0, 2, camera='camera-1', started_at=0)
+    factory = backend_factory(f'replay:{RESPONSE_PATH}')
+    sequential, pooled = io.BytesIO(), io.BytesIO()
+    run_backfill(segments, factory, sequential, workers=1)
+    report = run_backfill(segments, factory, pooled, workers=3)
+
+    assert report["records"] == 9
+    assert pooled.getvalue() == sequential.getvalue()
+    assert [json.loads(line)["ts"] for line in pooled.getvalue().splitlines()] == list(range(0, 9000, 1000))
+
+
+def test_failed_frames_are_counted(tmp_path):
+    segments = plan_source(frame_directory(tmp_path, 3), 0, 10, started_at=0)
+    output = io.BytesIO()
+    report = run_backfill(segments, FailingBackend, output)
+    assert report["failedFrames"] == 3
+    assert output.getvalue() == b''
+
+
+def test_replay_backend():
+    backend = ReplayBackend([{"Persons": [1]}, {"Persons": []}])
+    assert [backend.detect_protective_equipment(Image={})["Persons"] for _ in range(3)] == [[1], [], [1]]
+    assert backend.calls == 3
+    assert isinstance(backend_factory('rekognition'), functools.partial)
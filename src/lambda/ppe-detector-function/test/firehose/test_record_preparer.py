@@ -0,0 +1,40 @@
+import json
+import os
+
+from main.firehose.record_preparer import prepare_record
+from main.ppedetection.filter import filter_result
+
+
+def test_prepare_record():
+    os.environ["PROCESSED_S3_BUCKET"] = 'processed-frames'
+    src_dirname = os.path.dirname(__file__)
+    src_filename = os.path.join(src_dirname, '../output/ppe-result.json')
+    with open(src_filename, 'r') as fd:
+        ppe_res = json.load(fd)
+    ppe_res["Summary"]["PersonsIndeterminate"] = [3]
+    filtered_res = filter_result(ppe_res, 70, "true")
+
+    record = prepare_record('test-laptop-1', 'test-laptop-1-2021-01-08-08:27:53:985000.webp',
+                            '1610094473985', filtered_res, "true")
+
+    assert record["s3url"] == 'processed-frames/test-laptop-1-2021-01-08-08:27:53:985000.webp'
+    assert record["ppeViolationCount"] == 3
+    assert record["pplCount"] == 4
+    without_equipment = record["ppeResult"]["personsWithoutRequiredEquipment"]
+    assert [person["id"] for person in without_equipment] == [0, 2, 3]
+    assert without_equipment[0]["missingMask"] == False
+    assert without_equipment[0]["missingHelmet"] == True
+    assert without_equipment[0]["boundingBox"]["width"] == 0.432467520236969
+    with_equipment = record["ppeResult"]["personsWithRequiredEquipment"]
+    assert with_equipment == [{
+        "id": 1,
+        "missingMask": False,
+        "missingHelmet": False,
+        "boundingBox": {
+            "width": ppe_res["Persons"][1]["BoundingBox"]["Width"],
+            "height": ppe_res["Persons"][1]["BoundingBox"]["Height"],
+            "left": ppe_res["Persons"][1]["BoundingBox"]["Left"],
+            "top": ppe_res["Persons"][1]["BoundingBox"]["Top"]
+        }
+    }]
+    json.dumps(record)
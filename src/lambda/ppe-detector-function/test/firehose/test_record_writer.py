@@ -0,0 +1,123 @@
+import json
+
+import botocore
+
+from main.firehose.record_writer import BufferedRecordWriter
+
+
+class FakeFirehose:
+    """
+    Accepts batches, rejecting the entries listed in `reject` once and raising for the first `throttle` calls
+    """
+
+    def __init__(self, reject=(), throttle=0):
+        self.reject = set(reject)
+        self.throttle = throttle
+        self.calls = []
+        self.delivered = []
+
+    def put_record_batch(self, DeliveryStreamName, Records):
+        self.calls.append(len(Records))
+        if self.throttle > 0:
+            self.throttle -= 1
+            raise botocore.exceptions.ClientError(
+                {"Error": {"Code": "ServiceUnavailableException", "Message": "Slow down."}}, 'PutRecordBatch')
+        responses = []
+        for entry in Records:
+            record = json.loads(entry['Data'])
+            if record["cameraId"] in self.reject:
+                self.reject.discard(record["cameraId"])
+                responses.append({"ErrorCode": "ServiceUnavailableException", "ErrorMessage": "Slow down."})
+            else:
+                self.delivered.append(record)
+                responses.append({"RecordId": str(len(self.delivered))})
+        failed = sum(1 for response in responses if "ErrorCode" in response)
+        return {"FailedPutCount": failed, "RequestResponses": responses}
+
+
+def make_record(camera_name):
+    return {"cameraId": camera_name, "ts": '1610094473985'}
+
+
+def test_flush_by_count_and_resend_failed_entries():
+    firehose_client = FakeFirehose(reject=['camera-2'])
+    writer = BufferedRecordWriter('stream', firehose_client, max_records=3, backoff=0)
+    for camera_name in ['camera-1', 'camera-2', 'camera-3', 'camera-4']:
+        writer.add(make_record(camera_name))
+    # The third record triggered a flush, only the rejected entry was sent again
+    assert firehose_client.calls == [3, 1]
+    assert writer.flush() == 1
+    assert sorted(record["cameraId"] for record in firehose_client.delivered) == [
+        'camera-1', 'camera-2', 'camera-3', 'camera-4']
+    assert firehose_client.delivered[0]["ts"] == 1610094473985
+
+
+def test_flush_by_size():
+    firehose_client = FakeFirehose()
+    writer = BufferedRecordWriter('stream', firehose_client, max_bytes=80)
+    writer.add(make_record('camera-1'))
+    assert firehose_client.calls == []
+    writer.add(make_record('camera-2'))
+    assert firehose_client.calls == [1, 1]
+
+
+def test_spill_throttled_records_to_journal(tmp_path):
+    journal_path = str(tmp_path / 'firehose-journal.jsonl')
+    firehose_client = FakeFirehose(throttle=2)
+    writer = BufferedRecordWriter('stream', firehose_client, journal_path=journal_path, max_attempts=2, backoff=0)
+    writer.add(make_record('camera-1'))
+    assert writer.flush() == 0
+    assert writer.journaled == 1
+
+    # A new writer, e.g. after a restart, replays the journal before its own records
+    writer = BufferedRecordWriter('stream', firehose_client, journal_path=journal_path)
+    writer.add(make_record('camera-2'))
+    assert writer.flush() == 2
+    assert [record["cameraId"] for record in firehose_client.delivered] == ['camera-1', 'camera-2']
+    assert writer.flush() == 0
+
+
+class DenyingFirehose(FakeFirehose):
+    def __init__(self, code):
+        super().__init__()
+        self.code = code
+
+    def put_record_batch(self, DeliveryStreamName, Records):
+        self.calls.append(len(Records))
+        raise botocore.exceptions.ClientError({"Error": {"Code": self.code, "Message": "Denied"}}, 'PutRecordBatch')
+
+
+def test_permanent_errors_are_dropped_not_journaled(tmp_path):
+    journal_path = str(tmp_path / 'firehose-journal.jsonl')
+    firehose_client = DenyingFirehose('AccessDeniedException')
+    writer = BufferedRecordWriter('stream', firehose_client, journal_path=journal_path, backoff=0)
+    writer.add(make_record('camera-1'))
+    assert writer.flush() == 0
+    assert firehose_client.calls == [1]
+    assert writer.dropped == 1
+    assert writer.journaled == 0
+    assert not (tmp_path / 'firehose-journal.jsonl').exists()
+
+
+def test_oversized_records_are_dropped():
+    firehose_client = FakeFirehose()
+    writer = BufferedRecordWriter('stream', firehose_client)
+    writer.add(dict(make_record('camera-1'), padding='x' * 1100 * 1024))
+    writer.add(make_record('camera-2'))
+    assert writer.flush() == 1
+    assert writer.dropped == 1
+
+
+def test_journal_keeps_the_newest_records_under_its_cap(tmp_path):
+    journal_path = str(tmp_path / 'firehose-journal.jsonl')
+    firehose_client = FakeFirehose(throttle=100)
+    record_bytes = len(json.dumps(dict(make_record('camera-1'), ts=1610094473985)).encode('utf-8')) + 1
+    writer = BufferedRecordWriter('stream', firehose_client, journal_path=journal_path, max_attempts=1, backoff=0,
+                                  journal_max_bytes=3 * record_bytes)
+    for idx in range(5):
+        writer.add(make_record(f'camera-{idx}'))
+        writer.flush()
+
+    with open(journal_path) as fd:
+        assert [json.loads(line)["cameraId"] for line in fd] == ['camera-2', 'camera-3', 'camera-4']
+    assert writer.dropped == 2
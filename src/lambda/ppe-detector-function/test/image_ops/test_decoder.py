@@ -7,14 +7,17 @@ from main.image_ops.decoder import decode_frame
 # @pytest.mark.run(order=2)
 def test_decode():
     src_dirname = os.path.dirname(__file__)
-    src_filename = os.path.join(src_dirname, '../data/java-frame.png')
+    src_filename = os.path.join(src_dirname, '../data/1480.png')
     src_file = open(src_filename, 'rb')
     frameData = src_file.read()
     src_file.close()
-    img_str, frame = decode_frame(frameData, 640, 480)
+    img_bytes, frame = decode_frame(frameData, 770, 433)
+    # The parser's PNG is passed to Rekognition without re-encoding
+    assert img_bytes is frameData
     dst_dirname = os.path.dirname(__file__)
     dst_filename = os.path.join(dst_dirname, '../output/java-frame-decoded.png')
-    cv2.imwrite(dst_filename, frame)
-    
+    cv2.imwrite(dst_filename, cv2.cvtColor(frame.array, cv2.COLOR_RGB2BGR))
 
-    assert len(frame.shape) == 3
+    assert len(frame.array.shape) == 3
+    assert frame.array.shape[:2] == (433, 770)
+    assert frame.array is frame.array
@@ -0,0 +1,102 @@
+import json
+
+from main.ppedetection.notifier import AlarmNotifier
+
+
+class FakeSNS:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.batches = []
+
+    def publish_batch(self, TopicArn, PublishBatchRequestEntries):
+        self.batches.append([json.loads(entry['Message']) for entry in PublishBatchRequestEntries])
+        if self.fail:
+            return {"Successful": [], "Failed": [{"Id": entry['Id'], "Code": "InternalError", "SenderFault": False}
+                                                 for entry in PublishBatchRequestEntries]}
+        return {"Successful": [{"Id": entry['Id'], "MessageId": entry['Id']} for entry in PublishBatchRequestEntries],
+                "Failed": []}
+
+
+def make_record(camera_name, ts, violations):
+    return {"cameraId": camera_name, "ts": ts, "ppeViolationCount": violations}
+
+
+def test_coalesce_alarms_per_camera():
+    sns_client = FakeSNS()
+    alarm_notifier = AlarmNotifier('topic', sns_client, window=0)
+    alarm_notifier.submit(make_record('camera-1', 1, 1))
+    alarm_notifier.submit(make_record('camera-1', 2, 2))
+    alarm_notifier.submit(make_record('camera-1', 3, 1))
+    alarm_notifier.submit(make_record('camera-2', 1, 1))
+    assert alarm_notifier.flush() == 2
+    # One message per camera, carrying its worst frame
+    assert len(sns_client.batches) == 1
+    alarms = {alarm["cameraId"]: alarm for alarm in sns_client.batches[0]}
+    assert alarms['camera-1']["ts"] == 2
+    assert alarms['camera-1']["coalescedFrameCount"] == 3
+    assert alarm_notifier.coalesced == 2
+
+    # The next invocation publishes its own alarms, nothing is held back for it
+    assert alarm_notifier.flush() == 0
+    alarm_notifier.submit(make_record('camera-1', 5, 1))
+    assert alarm_notifier.flush() == 1
+    assert sns_client.batches[-1] == [{"cameraId": 'camera-1', "ts": 5, "ppeViolationCount": 1, "coalescedFrameCount": 1,
+                                       "suppressedAlarmCount": 0}]
+
+
+def test_suppress_alarms_within_the_window():
+    now = [100.0]
+    sns_client = FakeSNS()
+    alarm_notifier = AlarmNotifier('topic', sns_client, window=30, clock=lambda: now[0])
+
+    # Two invocations inside the window publish once
+    alarm_notifier.submit(make_record('camera-1', 1, 1))
+    assert alarm_notifier.flush() == 1
+    now[0] = 110.0
+    alarm_notifier.submit(make_record('camera-1', 2, 1))
+    assert alarm_notifier.flush() == 0
+    now[0] = 120.0
+    alarm_notifier.submit(make_record('camera-1', 3, 1))
+    alarm_notifier.submit(make_record('camera-2', 3, 1))
+    assert alarm_notifier.flush() == 1
+    assert len(sns_client.batches) == 2
+    assert sns_client.batches[1][0]["cameraId"] == 'camera-2'
+    assert alarm_notifier.suppressed == 2
+
+    # The first alarm after the window carries the number of suppressed ones
+    now[0] = 131.0
+    alarm_notifier.submit(make_record('camera-1', 4, 1))
+    assert alarm_notifier.flush() == 1
+    assert sns_client.batches[-1][0]["ts"] == 4
+    assert sns_client.batches[-1][0]["suppressedAlarmCount"] == 2
+
+
+def test_failed_alarms_leave_the_window_closed():
+    sns_client = FakeSNS(fail=True)
+    alarm_notifier = AlarmNotifier('topic', sns_client, max_attempts=1, window=30)
+    alarm_notifier.submit(make_record('camera-1', 1, 1))
+    assert alarm_notifier.flush() == 0
+    sns_client.fail = False
+    alarm_notifier.submit(make_record('camera-1', 2, 1))
+    assert alarm_notifier.flush() == 1
+
+
+def test_publish_in_batches_of_ten():
+    sns_client = FakeSNS()
+    alarm_notifier = AlarmNotifier('topic', sns_client)
+    for camera_idx in range(25):
+        alarm_notifier.submit(make_record(f'camera-{camera_idx}', 1, 1))
+    assert alarm_notifier.flush() == 25
+    assert [len(batch) for batch in sns_client.batches] == [10, 10, 5]
+
+
+def test_failed_alarms_are_resent_within_the_flush():
+    sns_client = FakeSNS(fail=True)
+    alarm_notifier = AlarmNotifier('topic', sns_client, max_attempts=2)
+    alarm_notifier.submit(make_record('camera-1', 1, 1))
+    assert alarm_notifier.flush() == 0
+    assert len(sns_client.batches) == 2
+    assert alarm_notifier.failed == 1
+    # Dropped rather than carried over to a later invocation
+    sns_client.fail = False
+    assert alarm_notifier.flush() == 0
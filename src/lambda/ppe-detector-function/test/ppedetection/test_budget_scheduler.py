@@ -0,0 +1,89 @@
+from main.ppedetection.budget_scheduler import BudgetScheduler, ANALYSE, DEFER, DROP
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.slept = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+def make_scheduler(clock, **kwargs):
+    params = dict(camera_rate=1.0, camera_burst=2, container_rate=10.0, container_burst=10, reserve=0.2,
+                  priority_window=60, max_defer=0.5)
+    params.update(kwargs)
+    return BudgetScheduler(clock=clock, sleep=clock.sleep, **params)
+
+
+def test_camera_bucket_defers_then_drops():
+    clock = FakeClock()
+    scheduler = make_scheduler(clock)
+    assert [scheduler.admit('camera-1') for _ in range(2)] == [ANALYSE, ANALYSE]
+    # Bucket empty: the next token comes in 1 s, longer than max_defer
+    assert scheduler.admit('camera-1') == DROP
+
+    clock.now += 0.6
+    assert scheduler.admit('camera-1') == DEFER
+    assert clock.slept == [0.4]
+    assert scheduler.stats()["budgetCameraSpend"] == {'camera-1': 3}
+
+
+def test_flickering_camera_does_not_starve_the_others():
+    clock = FakeClock()
+    scheduler = make_scheduler(clock, container_rate=3.0, container_burst=3, max_defer=0.0)
+    admitted = {'flicker': 0, 'camera-2': 0, 'camera-3': 0}
+    for _ in range(100):
+        clock.now += 0.1
+        for camera_name in admitted:
+            if scheduler.admit(camera_name) != DROP:
+                admitted[camera_name] += 1
+    # Each camera gets its 1 call per second, the shared bucket never runs dry
+    assert admitted['flicker'] <= 12
+    assert admitted['camera-2'] >= 9 and admitted['camera-3'] >= 9
+
+
+def test_burst_of_one_still_admits_cameras_without_priority():
+    clock = FakeClock()
+    scheduler = make_scheduler(clock, container_rate=1.0, container_burst=1, max_defer=1.0)
+    assert scheduler.admit('camera-1') == ANALYSE
+    assert scheduler.admit('camera-2') == DEFER
+    assert clock.slept == [1.0]
+
+
+def test_cameras_with_violations_get_priority():
+    clock = FakeClock()
+    scheduler = make_scheduler(clock, camera_rate=1.0, camera_burst=1, container_rate=1.0, container_burst=5,
+                               reserve=0.4, max_defer=0.0)
+    scheduler.record_violation('camera-1')
+    # Past its own bucket, and into the reserve of the shared bucket the other cameras cannot use
+    assert [scheduler.admit('camera-1') for _ in range(4)] == [ANALYSE] * 4
+    assert scheduler.admit('camera-2') == DROP
+    assert scheduler.admit('camera-1') == ANALYSE
+    assert scheduler.admit('camera-1') == DROP
+
+    clock.now = 61.0
+    assert [scheduler.admit('camera-1') for _ in range(2)] == [ANALYSE, DROP]
+    stats = scheduler.stats()
+    assert stats["budgetPriorityCalls"] == 5
+    assert stats["budgetDroppedFrames"] == 3
+
+
+def test_unlimited_buckets_admit_everything():
+    clock = FakeClock()
+    scheduler = make_scheduler(clock, camera_rate=0, container_rate=0)
+    assert all(scheduler.admit('camera-1') == ANALYSE for _ in range(100))
+    assert clock.slept == []
+
+
+def test_evicts_least_recent_camera():
+    clock = FakeClock()
+    scheduler = make_scheduler(clock, max_cameras=2)
+    for camera_name in ['camera-1', 'camera-2', 'camera-3']:
+        scheduler.admit(camera_name)
+    assert set(scheduler.stats()["budgetCameraSpend"]) == {'camera-2', 'camera-3'}
@@ -3,17 +3,32 @@ import os
 from main.ppedetection.filter import filter_result
 
 
-def test_filter_result():
+def load_response():
     src_dirname = os.path.dirname(__file__)
-    src_filename = os.path.join(src_dirname, '../data/ppe-result.json')
+    src_filename = os.path.join(src_dirname, '../output/ppe-result.json')
     with open(src_filename, 'r') as fd:
-        ppe_res = json.load(fd)
-    filtered_res = filter_result(ppe_res, 70)
-    dst_dirname = os.path.dirname(__file__)
-    dst_filename = os.path.join(dst_dirname, '../output/filtered-ppe-result.json')
-    with open(dst_filename, 'w') as fd:
-        json.dump(filtered_res,fd)
-    print(filtered_res["PersonsWithoutRequiredEquipment"][0])
-    assert filtered_res["Summary"]["SumPeopleWithoutRequiredEquipment"] == 4
-    assert filtered_res["PersonsWithoutRequiredEquipment"][0]["MISSING_MASK"] == False
-    assert filtered_res["PersonsWithoutRequiredEquipment"][0]["MISSING_HELMET"] == True
+        return json.load(fd)
+
+
+def test_filter_result():
+    ppe_res = load_response()
+    filtered_res = filter_result(ppe_res, 70, "true")
+    persons = filtered_res.persons_without_required_equipment()
+    assert filtered_res.violation_count == 4
+    assert filtered_res.compliant_count == 0
+    assert [person.id for person in persons] == [0, 1, 2, 3]
+    assert persons[0].missing_mask == False
+    assert persons[0].missing_helmet == True
+    assert persons[2].missing_mask == True
+    assert persons[0].bounding_box["Width"] == 0.432467520236969
+    # The Rekognition response is not modified
+    assert ppe_res["Summary"]["PersonsWithoutRequiredEquipment"] == [0, 2]
+
+
+def test_filter_result_without_helmet_check():
+    ppe_res = load_response()
+    ppe_res["Summary"]["PersonsIndeterminate"] = []
+    filtered_res = filter_result(ppe_res, 70, "false")
+    assert filtered_res.violation_count == 2
+    assert [person.id for person in filtered_res.persons_with_required_equipment()] == [1, 3]
+    assert not filtered_res.missing_helmet.any()
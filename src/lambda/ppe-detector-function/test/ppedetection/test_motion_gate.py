@@ -0,0 +1,75 @@
+import os
+import cv2
+import numpy as np
+
+from main.ppedetection.motion_gate import MotionGate, motion_thumbnail
+
+
+def load_frame():
+    src_dirname = os.path.dirname(__file__)
+    src_filename = os.path.join(src_dirname, '../data/1480.png')
+    return cv2.cvtColor(cv2.imread(src_filename), cv2.COLOR_BGR2RGB)
+
+
+def test_skip_frames_without_motion():
+    now = [0.0]
+    gate = MotionGate(min_changed_fraction=0.01, heartbeat=60, clock=lambda: now[0])
+    frame = load_frame()
+    result = {"Summary": {"SumPeopleWithoutRequiredEquipment": 0}}
+
+    assert gate.lookup('camera-1', motion_thumbnail(frame)) is None
+    # Nothing to reuse before a frame of the camera was analysed
+    assert gate.lookup('camera-1', motion_thumbnail(frame)) is None
+    gate.store('camera-1', result)
+
+    # Sensor noise is not motion
+    noise = np.random.default_rng(0).integers(-3, 4, frame.shape)
+    noisy_frame = np.clip(frame.astype(int) + noise, 0, 255).astype(np.uint8)
+    assert gate.lookup('camera-1', motion_thumbnail(noisy_frame)) is result
+
+    # Someone walking into the picture is
+    moved_frame = frame.copy()
+    moved_frame[100:300, 200:320] = 255 - moved_frame[100:300, 200:320]
+    assert gate.lookup('camera-1', motion_thumbnail(moved_frame)) is None
+
+    assert gate.stats()["motionGateSkippedFrames"] == 1
+    assert gate.stats()["motionGateAnalysedFrames"] == 3
+
+
+def test_heartbeat_forces_analysis():
+    now = [0.0]
+    gate = MotionGate(heartbeat=60, clock=lambda: now[0])
+    thumbnail = motion_thumbnail(load_frame())
+    gate.lookup('camera-1', thumbnail)
+    gate.store('camera-1', 'result')
+
+    now[0] = 59.0
+    assert gate.lookup('camera-1', thumbnail) == 'result'
+    now[0] = 60.0
+    assert gate.lookup('camera-1', thumbnail) is None
+    gate.store('camera-1', 'heartbeat result')
+    assert gate.lookup('camera-1', thumbnail) == 'heartbeat result'
+    assert gate.stats()["motionGateHeartbeats"] == 1
+
+
+def test_background_absorbs_a_static_change():
+    gate = MotionGate(learning_rate=0.2, clock=lambda: 0.0)
+    frame = load_frame()
+    gate.lookup('camera-1', motion_thumbnail(frame))
+    gate.store('camera-1', 'result')
+
+    # A pallet left in the bay counts as motion until the background has learnt it
+    changed = frame.copy()
+    changed[200:400, 400:600] = 0
+    thumbnail = motion_thumbnail(changed)
+    decisions = [gate.lookup('camera-1', thumbnail) for _ in range(30)]
+    assert decisions[0] is None
+    assert decisions[-1] == 'result'
+
+
+def test_evicts_least_recent_camera():
+    gate = MotionGate(max_cameras=2, clock=lambda: 0.0)
+    thumbnail = motion_thumbnail(load_frame())
+    for camera_name in ['camera-1', 'camera-2', 'camera-3']:
+        gate.lookup(camera_name, thumbnail)
+    assert gate.stats()["motionGateCameras"] == 2
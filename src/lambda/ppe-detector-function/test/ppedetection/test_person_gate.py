@@ -0,0 +1,81 @@
+import os
+import cv2
+import numpy as np
+import pytest
+
+from main.ppedetection.person_gate import HogPersonDetector, PersonDetector, PersonGate, create_detector
+
+
+class FixedDetector(PersonDetector):
+    def __init__(self, candidates):
+        super().__init__()
+        self.candidates = candidates
+        self.frames = []
+
+    def detect(self, frame):
+        self.frames.append(self.resize(frame).shape)
+        return self.candidates
+
+
+def test_frames_without_candidates_get_an_empty_result():
+    detector = FixedDetector([])
+    gate = PersonGate(detector, min_empty_frames=1)
+    frame = np.zeros((480, 1280, 3), dtype=np.uint8)
+
+    result = gate.lookup('camera-1', frame)
+    assert result.person_count == 0
+    assert result.violation_count == 0
+    assert result.persons_without_required_equipment() == []
+    assert detector.frames == [(240, 640, 3)]
+
+    detector.candidates = [(0.2, 0.6, 0.1, 0.2, 0.8)]
+    assert gate.lookup('camera-1', frame) is None
+    assert gate.stats() == {"personGateSkippedCalls": 1, "personGatePassedFrames": 1}
+
+
+def test_frames_are_skipped_after_consecutive_empty_frames():
+    detector = FixedDetector([])
+    gate = PersonGate(detector, min_empty_frames=3)
+    frame = np.zeros((480, 640, 3), dtype=np.uint8)
+
+    # The first empty frames are still analysed, in case the detector missed somebody
+    assert [gate.lookup('camera-1', frame) is None for _ in range(4)] == [True, True, False, False]
+    assert gate.lookup('camera-2', frame) is None
+
+    # A candidate starts the count again
+    detector.candidates = [(0.2, 0.6, 0.1, 0.2, 0.8)]
+    assert gate.lookup('camera-1', frame) is None
+    detector.candidates = []
+    assert gate.lookup('camera-1', frame) is None
+    assert gate.stats() == {"personGateSkippedCalls": 2, "personGatePassedFrames": 5}
+
+
+def test_detectors_implement_detect():
+    class NoDetection(PersonDetector):
+        pass
+
+    with pytest.raises(TypeError):
+        NoDetection()
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        create_detector('onnx')
+
+
+hog_detector = pytest.mark.skipif(
+    not hasattr(cv2, 'HOGDescriptor'), reason='OpenCV built without the HOG people detector')
+
+
+@hog_detector
+def test_hog_finds_the_persons_of_a_frame():
+    frame = cv2.imread(os.path.join(os.path.dirname(__file__), '../data/1480.png'))
+    detector = create_detector('hog')
+    assert len(detector.detect(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))) > 0
+
+
+@hog_detector
+def test_hog_finds_nobody_in_an_empty_scene():
+    detector = create_detector('hog', width=320)
+    assert isinstance(detector, HogPersonDetector)
+    assert detector.detect(np.full((433, 770, 3), 120, dtype=np.uint8)) == []
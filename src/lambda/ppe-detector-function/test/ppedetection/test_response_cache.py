@@ -0,0 +1,64 @@
+import json
+import os
+
+from main.ppedetection.detector import submit_job
+from main.ppedetection.response_cache import ResponseCache
+
+
+def load_response():
+    src_dirname = os.path.dirname(__file__)
+    src_filename = os.path.join(src_dirname, '../output/ppe-result.json')
+    with open(src_filename, 'r') as fd:
+        return json.load(fd)
+
+
+class FakeRekognition:
+    def __init__(self, response):
+        self.response = response
+        self.calls = 0
+
+    def detect_protective_equipment(self, **kwargs):
+        self.calls += 1
+        return self.response
+
+
+def test_key_covers_image_and_parameters():
+    key = ResponseCache.make_key(b'frame', 80, ['FACE_COVER', 'HEAD_COVER'])
+    assert key == ResponseCache.make_key(b'frame', 80, ['HEAD_COVER', 'FACE_COVER'])
+    assert key != ResponseCache.make_key(b'other-frame', 80, ['FACE_COVER', 'HEAD_COVER'])
+    assert key != ResponseCache.make_key(b'frame', 70, ['FACE_COVER', 'HEAD_COVER'])
+    assert key != ResponseCache.make_key(b'frame', 80, ['FACE_COVER'])
+
+
+def test_submit_job_serves_identical_frames_from_cache():
+    rek_client = FakeRekognition(load_response())
+    cache = ResponseCache(max_entries=8, ttl=300)
+    first = submit_job(b'frame', 80, rek_client, cache)
+    # Callers get their own copy, mutating it does not alter the cache
+    first["Summary"]["PersonsIndeterminate"].append(99)
+    second = submit_job(b'frame', 80, rek_client, cache)
+    assert rek_client.calls == 1
+    assert 99 not in second["Summary"]["PersonsIndeterminate"]
+    submit_job(b'frame', 70, rek_client, cache)
+    assert rek_client.calls == 2
+    assert cache.stats()["responseCacheHitRate"] == round(1 / 3, 4)
+
+
+def test_lru_eviction_and_ttl():
+    now = [0.0]
+    cache = ResponseCache(max_entries=2, ttl=60, clock=lambda: now[0])
+    cache.put('a', {"Id": 'a'})
+    cache.put('b', {"Id": 'b'})
+    assert cache.get('a') == {"Id": 'a'}
+    cache.put('c', {"Id": 'c'})
+    assert cache.get('b') is None
+    now[0] = 61.0
+    assert cache.get('a') is None
+
+
+def test_spill_file_survives_new_cache(tmp_path):
+    spill_path = str(tmp_path / 'ppe-response-cache.json')
+    cache = ResponseCache(max_entries=8, ttl=300, spill_path=spill_path)
+    cache.put('a', {"Id": 'a'})
+    cache.save()
+    assert ResponseCache(max_entries=8, ttl=300, spill_path=spill_path).get('a') == {"Id": 'a'}
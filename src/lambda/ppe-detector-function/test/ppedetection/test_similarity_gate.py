@@ -0,0 +1,49 @@
+import os
+import cv2
+
+from main.ppedetection.similarity_gate import SimilarityGate, compute_signature
+
+
+def load_frame():
+    src_dirname = os.path.dirname(__file__)
+    src_filename = os.path.join(src_dirname, '../data/1480.png')
+    return cv2.cvtColor(cv2.imread(src_filename), cv2.COLOR_BGR2RGB)
+
+
+def test_reuse_result_of_near_identical_frame():
+    now = [0.0]
+    gate = SimilarityGate(max_distance=2.0, max_age=30, clock=lambda: now[0])
+    frame = load_frame()
+    signature = compute_signature(frame)
+    result = {"Summary": {"SumPeopleWithoutRequiredEquipment": 1}}
+
+    assert gate.lookup('camera-1', signature) is None
+    gate.store('camera-1', signature, result)
+
+    # Sensor noise does not count as a new scene
+    noisy_frame = cv2.add(frame, 1)
+    assert gate.lookup('camera-1', compute_signature(noisy_frame)) is result
+    # Other cameras keep their own state
+    assert gate.lookup('camera-2', signature) is None
+
+    # A different scene has to be analysed
+    changed_frame = frame.copy()
+    changed_frame[:, :frame.shape[1] // 2] = 0
+    assert gate.lookup('camera-1', compute_signature(changed_frame)) is None
+
+    # Results are not reused past their maximum age
+    now[0] = 31.0
+    assert gate.lookup('camera-1', signature) is None
+
+    assert gate.stats()["similarityGateSavedCalls"] == 1
+    assert gate.stats()["similarityGateAnalysedFrames"] == 4
+
+
+def test_evict_least_recently_seen_camera():
+    gate = SimilarityGate(max_distance=2.0, max_age=30, max_cameras=2)
+    signature = compute_signature(load_frame())
+    for camera_name in ['camera-1', 'camera-2', 'camera-3']:
+        gate.store(camera_name, signature, {})
+    assert gate.lookup('camera-1', signature) is None
+    assert gate.lookup('camera-3', signature) == {}
+    assert gate.stats()["similarityGateCameras"] == 2
@@ -0,0 +1,44 @@
+import json
+
+from main.utils.batch_runner import extract_frames, run_batch
+
+
+def make_record(message_id, keys):
+    body = {
+        "Records": [
+            {"s3": {"bucket": {"name": "raw-frames"}, "object": {"key": key}}} for key in keys
+        ]
+    }
+    return {"messageId": message_id, "body": json.dumps(body)}
+
+
+def test_extract_frames():
+    record = make_record('msg-1', ['camera-1/1.png', 'camera-1/2.png'])
+    assert extract_frames(record) == [('raw-frames', 'camera-1/1.png'), ('raw-frames', 'camera-1/2.png')]
+    assert extract_frames({"messageId": 'msg-2', "body": '{"Event": "s3:TestEvent"}'}) == []
+
+
+def test_run_batch_reports_failed_messages():
+    records = [
+        make_record('msg-1', ['camera-1/1.png']),
+        make_record('msg-2', ['camera-2/1.png', 'camera-2/bad.png']),
+        make_record('msg-3', ['camera-3/1.png']),
+    ]
+    processed = []
+
+    def process_frame(bucket, key):
+        if key.endswith('bad.png'):
+            raise ValueError('corrupted frame')
+        processed.append(key)
+
+    failures = run_batch(records, process_frame, 4)
+    assert failures == [{"itemIdentifier": 'msg-2'}]
+    assert sorted(processed) == ['camera-1/1.png', 'camera-2/1.png', 'camera-3/1.png']
+
+
+def test_run_batch_in_sequence():
+    records = [make_record('msg-1', ['camera-1/1.png', 'camera-1/2.png'])]
+    processed = []
+    failures = run_batch(records, lambda bucket, key: processed.append(key), 1)
+    assert failures == []
+    assert processed == ['camera-1/1.png', 'camera-1/2.png']